@@ -136,6 +136,41 @@ DATABASES = {
 
 
 
+# Cache
+# Local memory cache is per gunicorn worker: every worker builds its own copy of the cached
+# catalog. Invalidation does not depend on it, catalog changes bump a version row in the
+# database (medicalstore.catalog_cache) that every worker, celery task and command reads.
+# Point CACHE_URL at a shared cache (e.g. redis://host:6379/1, needs the redis package) so the
+# workers share one copy.
+
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+# Seconds a user's cart / wishlist product ids stay cached between requests (0 = per request only).
+# Needs a shared CACHE_URL, invalidation on cart / wishlist changes only reaches the shared cache.
+SHOPPING_STATE_CACHE_TIMEOUT = env.int('SHOPPING_STATE_CACHE_TIMEOUT', default=0)
+
+# Products shown in the related products strip of the product detail page.
+# Changing it takes effect after `manage.py rebuild_related_products`.
+RELATED_PRODUCTS_LIMIT = env.int('RELATED_PRODUCTS_LIMIT', default=8)
+
+# "Frequently bought together" products kept per product, from `manage.py build_recommendations`.
+CO_PURCHASE_LIMIT = env.int('CO_PURCHASE_LIMIT', default=6)
+
+# Part of every catalog page ETag, change it on deploys that change the page markup
+# so browsers don't keep revalidating the old HTML as current.
+PAGE_ETAG_VERSION = env('PAGE_ETAG_VERSION', default='1')
+
+# Automatic featured tags (`manage.py update_featured_tags`). Manually set "Discount" tags are kept.
+BESTSELLER_WINDOW_DAYS = env.int('BESTSELLER_WINDOW_DAYS', default=30)
+BESTSELLER_COUNT = env.int('BESTSELLER_COUNT', default=10)
+NEW_PRODUCT_DAYS = env.int('NEW_PRODUCT_DAYS', default=30)
+
+
+
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
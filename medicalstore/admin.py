@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import *
+from .export_utils import export_actions
 
 # Register your models here.
 class CustomUserAdmin(UserAdmin):
@@ -48,10 +49,11 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('product_name', 'category', 'available_stock', 'product_price', 'discount', 'featured_option', 'rating', 'created_at')
+    list_display = ('product_name', 'category', 'available_stock', 'product_price', 'discount', 'selling_price', 'featured_option', 'rating', 'created_at')
     search_fields = ('product_name', 'category__category_name')
     list_filter = ('category', 'featured_option', 'created_at')
     ordering = ('-created_at',)
+    actions = export_actions('products')
 
 
 
@@ -106,9 +108,10 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('order_number', 'user', 'status', 'delivery_status', 'order_payment_status', 'created_at', 'updated_at')
     search_fields = ('order_number', 'user__name', 'user__email')
-    list_filter = ('status', 'delivery_status', 'order_payment_status', 'created_at')
+    list_filter = ('status', 'delivery_status', 'order_payment_status', ('stock_shortfall', admin.EmptyFieldListFilter), 'created_at')
     inlines = [OrderItemInline]
     ordering = ('-created_at',)
+    actions = export_actions('orders')
 
 
 
@@ -145,8 +148,24 @@ class OrderItemAdmin(admin.ModelAdmin):
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('razorpay_payment_id', 'order', 'method', 'amount', 'currency', 'status', 'captured', 'created_at')
     search_fields = ('razorpay_payment_id', 'order__order_number', 'method')
-    list_filter = ('method', 'status', 'captured')
+    list_filter = ('method', 'status', 'captured', 'created_at')
     ordering = ('-created_at',)
+    actions = export_actions('payments')
+
+
+# --------------------------
+# FEATURED TAG RUNS
+# --------------------------
+@admin.register(FeaturedTagRun)
+class FeaturedTagRunAdmin(admin.ModelAdmin):
+    list_display = ('started_at', 'days_rolled_up', 'rollup_seconds', 'tagging_seconds', 'bestsellers', 'new_products', 'untagged')
+    ordering = ('-started_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # --------------------------
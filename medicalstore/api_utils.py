@@ -0,0 +1,226 @@
+import hashlib
+import json
+from functools import wraps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from .catalog_cache import catalog_state
+from .media_utils import url_for_name
+from .pagination_utils import encode_cursor, keyset_products
+
+
+API_VERSION = 'v1'
+API_PAGE_SIZE = 24
+API_MAX_PAGE_SIZE = 200
+# rows fetched per database round trip and serialized per streamed chunk
+STREAM_CHUNK_SIZE = 100
+
+# values() projections, only the columns the JSON needs are read
+CATEGORY_FIELDS = (
+    'id', 'category_name', 'category_image', 'category_image_renditions', 'category_image_altername',
+    'category_background_color', 'updated_at',
+)
+PRODUCT_LIST_FIELDS = (
+    'id', 'category_id', 'product_name', 'product_short_desc', 'product_main_image', 'product_main_image_renditions',
+    'product_image_altername', 'product_price', 'discount', 'selling_price', 'available_stock', 'featured_option',
+    'rating', 'created_at', 'updated_at',
+)
+GALLERY_FIELDS = ('product_image1', 'product_image2', 'product_image3', 'product_image4')
+RATING_FIELDS = ('rating1', 'rating2', 'rating3', 'rating4', 'rating5', 'rating_count', 'rating_sum')
+PRODUCT_DETAIL_FIELDS = (
+    PRODUCT_LIST_FIELDS + ('product_desc', 'category__category_name') + GALLERY_FIELDS
+    + tuple(f'ratingsummary__{field}' for field in RATING_FIELDS)
+)
+
+
+
+def api_validators(request):
+    """(ETag, Last-Modified) of an API response, from the catalog version and newest change. One query per request."""
+    validators = getattr(request, '_api_validators', None)
+    if validators is None:
+        version, modified = catalog_state()
+        etag = hashlib.md5(f'{API_VERSION}|{request.get_full_path()}|{version}|{modified.isoformat()}'.encode()).hexdigest()
+        validators = (etag, modified)
+        request._api_validators = validators
+    return validators
+
+
+
+def api_etag(request, *args, **kwargs):
+    return api_validators(request)[0]
+
+
+
+def api_last_modified(request, *args, **kwargs):
+    return api_validators(request)[1]
+
+
+
+def catalog_api(view):
+    """
+    Read-only catalog endpoint: GET / HEAD only, ETag / Last-Modified from the catalog version,
+    unchanged responses are answered with a 304 before any catalog query runs.
+    Responses are the same for every user, so shared caches may keep them but must revalidate.
+    """
+    view = condition(etag_func=api_etag, last_modified_func=api_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            response = api_error("Method not allowed.", status=405)
+            response['Allow'] = 'GET, HEAD'
+            return response
+        response = view(request, *args, **kwargs)
+        patch_cache_control(response, public=True, no_cache=True)
+        return response
+
+    return wrapper
+
+
+
+def api_error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+
+def image_data(name, record=None, alt=''):
+    """Original URL plus the stored WebP / JPEG renditions and placeholder of an image, None without image."""
+    if not name:
+        return None
+    record = record or {}
+    data = {'url': url_for_name(name), 'alt': alt}
+    if record.get('source') == name and record.get('jpeg'):
+        data['placeholder'] = record['placeholder']
+        for fmt in ('webp', 'jpeg'):
+            # entries are [width, name, url], records built before URLs were stored have no url
+            data[fmt] = [
+                {'width': entry[0], 'url': entry[2] if len(entry) > 2 else url_for_name(entry[1])}
+                for entry in record[fmt]
+            ]
+    return data
+
+
+
+def category_data(row):
+    return {
+        'id': row['id'],
+        'name': row['category_name'],
+        'background_color': row['category_background_color'],
+        'image': image_data(row['category_image'], row['category_image_renditions'], row['category_image_altername']),
+        'updated_at': row['updated_at'],
+    }
+
+
+
+def product_data(row):
+    return {
+        'id': row['id'],
+        'category_id': row['category_id'],
+        'name': row['product_name'],
+        'short_description': row['product_short_desc'],
+        'price': row['product_price'],
+        'discount': row['discount'],
+        'selling_price': row['selling_price'],
+        'in_stock': row['available_stock'] > 0,
+        'featured': row['featured_option'],
+        'rating': row['rating'],
+        'image': image_data(row['product_main_image'], row['product_main_image_renditions'], row['product_image_altername']),
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+
+
+
+def rating_data(counts):
+    """Rating summary of a product from its RatingSummary columns, zeros when nobody reviewed it yet."""
+    count = counts.get('rating_count') or 0
+    total = counts.get('rating_sum') or 0
+    stars = {str(star): counts.get(f'rating{star}') or 0 for star in range(1, 6)}
+    return {
+        'count': count,
+        'average': round(total / count, 2) if count else 0,
+        'histogram': stars,
+        'percentages': {star: round(value / count * 100, 1) if count else 0 for star, value in stars.items()},
+    }
+
+
+
+def product_detail_data(row):
+    data = product_data(row)
+    data['description'] = row['product_desc']
+    data['category_name'] = row['category__category_name']
+    data['gallery'] = [
+        image_data(row[field], alt=row['product_image_altername']) for field in GALLERY_FIELDS if row[field]
+    ]
+    data['ratings'] = rating_data({field: row[f'ratingsummary__{field}'] for field in RATING_FIELDS})
+    return data
+
+
+
+def _dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+
+
+
+def stream_results(rows, serialize, meta):
+    """
+    Yield {"results": [...], **meta()} in chunks of STREAM_CHUNK_SIZE serialized rows.
+    meta is called after the last row, so it can report what the iteration found (e.g. the next cursor).
+    """
+    yield '{"results":['
+    separator = ''
+    chunk = []
+    for row in rows:
+        chunk.append(_dumps(serialize(row)))
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    tail = _dumps(meta())
+    yield ']' + (',' + tail[1:] if tail != '{}' else '}')
+
+
+
+def stream_json(rows, serialize, meta=dict):
+    return StreamingHttpResponse(stream_results(rows, serialize, meta), content_type='application/json')
+
+
+
+def product_listing_response(products, sort_option, cursor=None, limit=API_PAGE_SIZE):
+    """
+    Keyset paginated product listing streamed as JSON, one row more than the page is read
+    to know whether a next page exists. {"results": [...], "next_cursor": ...}
+    """
+    rows = (
+        keyset_products(products, sort_option, cursor)
+        .values(*PRODUCT_LIST_FIELDS)[:limit + 1]
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    state = {'last': None, 'more': False}
+
+    def page_rows():
+        for count, row in enumerate(rows):
+            if count == limit:
+                state['more'] = True
+                break
+            state['last'] = row
+            yield row
+
+    def meta():
+        next_cursor = encode_cursor(sort_option, state['last']) if state['more'] else None
+        return {'sort': sort_option, 'next_cursor': next_cursor}
+
+    return stream_json(page_rows(), product_data, meta)
+
+
+
+def parse_limit(value):
+    """Page size from the query string, clamped to 1..API_MAX_PAGE_SIZE. None when not a number."""
+    if not value:
+        return API_PAGE_SIZE
+    if not value.isdigit():
+        return None
+    return min(max(int(value), 1), API_MAX_PAGE_SIZE)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MedicalstoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'medicalstore'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,15 @@
+from django.conf import settings
+
+
+# Backends whose contents only the process holding them sees. Anything written to them can't
+# be invalidated (or read) by the other gunicorn workers, celery or management commands.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+
+def is_shared_cache(alias='default'):
+    """Whether every process reads and writes the same cache (CACHE_URL pointing at redis, memcached...)."""
+    return settings.CACHES[alias]['BACKEND'] not in LOCAL_CACHE_BACKENDS
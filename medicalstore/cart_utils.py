@@ -0,0 +1,108 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery
+from .models import Cart, Cart_Item, Product
+from .reservation_utils import available_quantities, held_subquery
+from .shopping_state import cache_timeout as shopping_state_cache_timeout, invalidate_header_counts, invalidate_shopping_state
+
+
+# Every cart line change is one UPDATE / INSERT / DELETE. The (cart, product) unique
+# constraint makes a concurrent second insert fail instead of adding a duplicate line,
+# and quantity changes are conditional increments evaluated by the database, so
+# parallel requests can neither lose an update nor push a line past the product's available
+# units (stock less the units held by unpaid checkouts, see reservation_utils).
+# The statements filter on cart_id directly (no joins), MySQL runs them as single
+# statement UPDATEs instead of selecting the ids first.
+
+
+
+def _available():
+    stock = Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('available_stock')[:1])
+    return stock - held_subquery(OuterRef('product_id'))
+
+
+
+def get_cart(user):
+    """The user's cart, created on first use. The unique user constraint makes this race free."""
+    cart, _ = Cart.objects.get_or_create(user=user)
+    return cart
+
+
+
+def get_cart_id(user):
+    return Cart.objects.filter(user=user).values_list('id', flat=True).first()
+
+
+
+def cart_changed(user_id):
+    # queryset writes send no post_save, so the shopping state cache is invalidated here
+    if shopping_state_cache_timeout():
+        invalidate_shopping_state(user_id, wishlist=False)
+    invalidate_header_counts(user_id)
+
+
+
+def _increment(cart_id, product_id, quantity):
+    return Cart_Item.objects.filter(
+        cart_id=cart_id, product_id=product_id, quantity__lte=_available() - quantity,
+    ).update(quantity=F('quantity') + quantity)
+
+
+
+def add_cart_item(cart, product, quantity):
+    """
+    Add quantity units of product to the cart: increments an existing line or inserts a new one.
+    Returns the cart line, or None when the cart would hold more than the available units.
+    """
+    if quantity < 1:
+        return None
+
+    added = _increment(cart.id, product.id, quantity)
+    if not added and quantity <= available_quantities([product.id]).get(product.id, 0):
+        try:
+            with transaction.atomic():
+                Cart_Item.objects.create(cart=cart, product=product, quantity=quantity)
+            added = True
+        except IntegrityError:
+            # a parallel request inserted the line first, add to it instead
+            added = _increment(cart.id, product.id, quantity)
+
+    if not added:
+        return None
+    cart_changed(cart.user_id)
+    return Cart_Item.objects.select_related('product').get(cart=cart, product=product)
+
+
+
+def increase_cart_item(user, product_id):
+    """One more unit, only while the line stays within the available units. Returns True when changed."""
+    cart_id = get_cart_id(user)
+    changed = bool(cart_id) and _increment(cart_id, product_id, 1) > 0
+    if changed:
+        cart_changed(user.pk)
+    return changed
+
+
+
+def decrease_cart_item(user, product_id):
+    """One unit less, a line never goes below one. Returns True when changed."""
+    cart_id = get_cart_id(user)
+    changed = bool(cart_id) and Cart_Item.objects.filter(
+        cart_id=cart_id, product_id=product_id, quantity__gt=1,
+    ).update(quantity=F('quantity') - 1) > 0
+    if changed:
+        cart_changed(user.pk)
+    return changed
+
+
+
+def remove_cart_item(user, product_id):
+    """Delete the product's line. Returns True when there was one."""
+    deleted, _ = Cart_Item.objects.filter(cart__user=user, product_id=product_id).delete()
+    if deleted:
+        invalidate_header_counts(user.pk)
+    return bool(deleted)
+
+
+
+def get_cart_item(user, product_id):
+    return Cart_Item.objects.select_related('product').filter(cart__user=user, product_id=product_id).first()
@@ -0,0 +1,145 @@
+import time
+from django.core.cache import cache
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+from .models import CatalogVersion, Category, Product
+
+
+CATALOG_VERSION_ID = 1
+CATALOG_CACHE_TIMEOUT = 60 * 60
+STALE_CACHE_TIMEOUT = 60 * 60 * 24
+REBUILD_LOCK_TIMEOUT = 30
+REBUILD_WAIT = 2
+STATS_KEY = 'catalog:stats:{}'
+STATS = ('hit', 'miss', 'stale', 'rebuild')
+
+_MISSING = object()
+
+
+
+def featured_products():
+    return Product.objects.filter(
+                    Q(featured_option='Discount') |
+                    Q(featured_option='New') |
+                    Q(featured_option='Bestseller')
+                )
+
+
+
+def _version_row():
+    # start from the clock, so entries cached for a previous database are never served
+    row, _ = CatalogVersion.objects.get_or_create(
+        pk=CATALOG_VERSION_ID, defaults={'version': time.time_ns(), 'modified': timezone.now()},
+    )
+    return row
+
+
+
+def get_catalog_version():
+    """The catalog version, one primary key read."""
+    version = CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID).values_list('version', flat=True).first()
+    return _version_row().version if version is None else version
+
+
+
+def _newest(model):
+    return Subquery(model.objects.order_by('-updated_at').values('updated_at')[:1])
+
+
+
+def catalog_state():
+    """
+    (version, last modified) of the catalog, for ETags and Last-Modified, in one query: the
+    version row and the newest product / category updated_at (read from their indexes). A write
+    that stamps updated_at without bumping the version still changes the validators.
+    """
+    state = (
+        CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID)
+        .annotate(products=_newest(Product), categories=_newest(Category))
+        .values_list('version', 'modified', 'products', 'categories')
+        .first()
+    )
+    if state is None:
+        _version_row()
+        return catalog_state()
+    version, *modified = state
+    return version, max(moment for moment in modified if moment)
+
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog entry at once, old entries simply expire. The version
+    lives in the database, so a bump from any process (celery, a command) reaches every worker.
+    """
+    now = timezone.now()
+    if not CatalogVersion.objects.filter(pk=CATALOG_VERSION_ID).update(version=F('version') + 1, modified=now):
+        _version_row()
+
+
+
+def _count(stat):
+    key = STATS_KEY.format(stat)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+
+def catalog_cache_stats():
+    return {stat: cache.get(STATS_KEY.format(stat), 0) for stat in STATS}
+
+
+
+def get_or_build(name, builder):
+    """
+    Cached value of builder() for the current catalog version.
+    Only one worker rebuilds after an invalidation (lock via cache.add), the others keep
+    serving the previous version's value until the new one is stored.
+    """
+    key = f'catalog:{get_catalog_version()}:{name}'
+    stale_key = f'catalog:stale:{name}'
+
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count('hit')
+        return value
+
+    _count('miss')
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, REBUILD_LOCK_TIMEOUT):
+        try:
+            value = builder()
+            cache.set(key, value, CATALOG_CACHE_TIMEOUT)
+            cache.set(stale_key, value, STALE_CACHE_TIMEOUT)
+            _count('rebuild')
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    value = cache.get(stale_key, _MISSING)
+    if value is not _MISSING:
+        _count('stale')
+        return value
+
+    # cold start, nothing to fall back on - give the rebuilding worker a moment
+    deadline = time.monotonic() + REBUILD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _count('hit')
+            return value
+    return builder()
+
+
+
+def get_categories():
+    """All categories ordered by name."""
+    return get_or_build('categories', lambda: list(Category.objects.all().order_by('category_name')))
+
+
+
+def get_featured_products():
+    return get_or_build('featured_products', lambda: list(featured_products()))
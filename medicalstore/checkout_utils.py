@@ -0,0 +1,206 @@
+import logging
+import time
+from django.db import OperationalError, transaction
+from django.utils import timezone
+from .catalog_cache import bump_catalog_version
+from .models import Cart_Item, Order, OrderItem, Payment, Product, ShippingAddress
+from .related_utils import refresh_category
+from .reservation_utils import commit_holds, place_holds, release_holds
+from .shopping_state import invalidate_header_counts
+
+
+# Checkout is one transaction: the order, its shipping address and items are written and
+# the units are reserved with stock holds (see reservation_utils), so two parallel checkouts
+# can never get the same unit and a failed checkout leaves nothing behind. The product
+# rows are locked in id order as the last statements of the transaction, so the locks are
+# held briefly and always taken in the same order. Stock drops when the payment is captured.
+
+logger = logging.getLogger(__name__)
+
+DEADLOCK_RETRIES = 3
+DEADLOCK_BACKOFF = 0.05  # seconds, doubled on every retry
+DEADLOCK_ERRORS = {1205, 1213}  # MySQL: lock wait timeout, deadlock found
+
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_names):
+        self.product_names = product_names
+        super().__init__(f"Not enough stock for: {', '.join(product_names)}")
+
+
+
+def is_deadlock(error):
+    return bool(error.args) and error.args[0] in DEADLOCK_ERRORS
+
+
+
+def order_lines(items):
+    """{product_id: quantity} of cart lines or order items."""
+    lines = {}
+    for item in items:
+        lines[item.product_id] = lines.get(item.product_id, 0) + item.quantity
+    return lines
+
+
+
+def stock_changed(product_ids, crossed_zero=()):
+    """
+    Queryset updates send no post_save: drop the cached catalog pages and re-rank the
+    categories of products that went out of (or back into) stock, once committed.
+    """
+    def refresh():
+        bump_catalog_version()
+        category_ids = set(Product.objects.filter(pk__in=crossed_zero).values_list('category_id', flat=True))
+        for category_id in category_ids:
+            refresh_category(category_id)
+
+    if product_ids:
+        transaction.on_commit(refresh)
+
+
+
+def _place_order(user, cart_items, lines, pricing, shipping, order_number, receipt):
+    order = Order.objects.create(
+        user=user,
+        order_number=order_number,
+        delivery_charge=pricing.delivery_charge,
+        amount=pricing.final_amount,
+        currency="INR",
+        receipt=receipt,
+        cart_item_ids=[cart_item.id for cart_item in cart_items],
+        status="created",
+    )
+    ShippingAddress.objects.create(order=order, **shipping)
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product_id=cart_item.product_id,
+            product_name=cart_item.product.product_name,
+            category_name=cart_item.product.category.category_name,
+            quantity=cart_item.quantity,
+            unit_price=cart_item.product.selling_price,
+        )
+        for cart_item in cart_items
+    ])
+
+    short = place_holds(order, lines)
+    if short:
+        names = {cart_item.product_id: cart_item.product.product_name for cart_item in cart_items}
+        raise OutOfStock([names[product_id] for product_id in short])
+    return order
+
+
+
+def place_order(user, cart_items, pricing, shipping, order_number, receipt, on_placed=None):
+    """
+    Create the order for the cart lines (with category loaded) and take their stock, all or nothing.
+    Raises OutOfStock without writing anything. on_placed(order) runs once the order is
+    committed, outside the transaction: the place for the payment gateway call.
+    """
+    cart_items = list(cart_items)
+    lines = order_lines(cart_items)
+    for attempt in range(DEADLOCK_RETRIES + 1):
+        try:
+            with transaction.atomic():
+                order = _place_order(user, cart_items, lines, pricing, shipping, order_number, receipt)
+                if on_placed:
+                    transaction.on_commit(lambda: on_placed(order))
+            return order
+        except OperationalError as error:
+            if not is_deadlock(error) or attempt == DEADLOCK_RETRIES:
+                raise
+            time.sleep(DEADLOCK_BACKOFF * 2 ** attempt)
+
+
+
+def release_order(order, status="failed"):
+    """
+    Close an unpaid order and release its stock holds. Conditional on the order still
+    being 'created', so a second release (callback and expiry racing) does nothing.
+    Returns True when this call released it.
+    """
+    with transaction.atomic():
+        released = Order.objects.filter(pk=order.pk, status="created").update(
+            status=status, order_payment_status="failed", delivery_status="failed", updated_at=timezone.now(),
+        )
+        if released:
+            release_holds([order.pk])
+    if released:
+        order.status, order.order_payment_status, order.delivery_status = status, "failed", "failed"
+    return bool(released)
+
+
+
+def capture_order(order):
+    """
+    Mark a captured order paid and take its units out of stock, committing its holds.
+    Also applies to an order released meanwhile (payment captured after the hold expired):
+    units no longer available are recorded in stock_shortfall and logged, the order needs
+    a partial refund or a restock.
+    Returns False when the order was already paid, so a repeated callback changes nothing.
+    """
+    with transaction.atomic():
+        captured = Order.objects.filter(pk=order.pk).exclude(status="paid").update(
+            status="paid", order_payment_status="paid", delivery_status="confirmed", updated_at=timezone.now(),
+        )
+        if captured:
+            lines = order_lines(OrderItem.objects.filter(order_id=order.pk, product__isnull=False).only('product_id', 'quantity'))
+            short, out_of_stock = commit_holds(order.pk, lines)
+            if short:
+                Order.objects.filter(pk=order.pk).update(stock_shortfall=short)
+                order.stock_shortfall = short
+                logger.error("Order %s was paid for units no longer in stock %s, refund or restock it", order.pk, short)
+            stock_changed(list(lines), out_of_stock)
+    if captured:
+        order.status, order.order_payment_status, order.delivery_status = "paid", "paid", "confirmed"
+    return bool(captured)
+
+
+
+def payment_fields(payment_data):
+    """Payment columns from a Razorpay payment entity."""
+    return {
+        "razorpay_payment_id": payment_data["id"],
+        "method": payment_data.get("method"),
+        "email": payment_data.get("email"),
+        "contact": payment_data.get("contact"),
+        "bank": payment_data.get("bank"),
+        "wallet": payment_data.get("wallet"),
+        "vpa": payment_data.get("vpa"),
+        "international": payment_data.get("international", False),
+        "amount": payment_data.get("amount", 0),
+        "currency": payment_data.get("currency", "INR"),
+        "status": payment_data.get("status"),
+        "captured": payment_data.get("captured", False),
+        "fee": payment_data.get("fee") or 0,
+        "tax": payment_data.get("tax") or 0,
+        "error_code": payment_data.get("error_code"),
+        "error_description": payment_data.get("error_description"),
+        "raw_response": payment_data,
+    }
+
+
+
+def save_payment(order, payment_data):
+    """
+    Store the order's payment from a Razorpay payment entity, keeping the checkout
+    signature of an existing row. A captured payment is never replaced by another
+    attempt (a late payment.failed of an earlier try).
+    """
+    current = Payment.objects.filter(order=order).values('razorpay_payment_id', 'captured').first()
+    if current and current['captured'] and current['razorpay_payment_id'] != payment_data["id"]:
+        return None
+    fields = payment_fields(payment_data)
+    payment, _ = Payment.objects.update_or_create(
+        order=order, defaults=fields, create_defaults={**fields, "razorpay_signature": ""},
+    )
+    return payment
+
+
+
+def clear_ordered_items(order):
+    """Take the purchased lines out of the cart (the whole cart or a single product checkout)."""
+    cart_item_ids = order.cart_item_ids or []
+    if cart_item_ids and Cart_Item.objects.filter(id__in=cart_item_ids).delete()[0] and order.user_id:
+        invalidate_header_counts(order.user_id)
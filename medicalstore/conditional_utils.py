@@ -0,0 +1,83 @@
+import hashlib
+from functools import wraps
+from django.conf import settings
+from django.contrib import messages
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from .catalog_cache import catalog_state
+from .shopping_state import get_shopping_state
+
+
+_MISSING = object()
+
+
+
+def page_validators(request):
+    """
+    (ETag, Last-Modified) of a catalog page for this request, or None when it must be rendered.
+    Everything comes from the database, so writes from any worker, celery task or command
+    change them: the catalog version and newest change (one query) and, for a signed in user,
+    the cart / wishlist state the page would render anyway (loaded once per request).
+    """
+    validators = getattr(request, '_page_validators', _MISSING)
+    if validators is not _MISSING:
+        return validators
+
+    validators = None
+    # a pending flash message is shown by the next render, never answer it with a 304
+    if not len(messages.get_messages(request)):
+        version, modified = catalog_state()
+        parts = [
+            getattr(settings, 'PAGE_ETAG_VERSION', ''),
+            request.get_full_path(),
+            version,
+            modified.isoformat(),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        ]
+        user = request.user
+        if user.is_authenticated:
+            state = get_shopping_state(request)
+            parts += [
+                user.pk, user.name, user.user_profile_picture.name,
+                sorted(state.cart_quantities.items()), sorted(state.wishlist_product_ids),
+            ]
+            # the cart has no date of its own, the ETag alone decides
+            modified = None
+
+        etag = hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+        validators = (etag, modified)
+
+    request._page_validators = validators
+    return validators
+
+
+
+def page_etag(request, *args, **kwargs):
+    validators = page_validators(request)
+    return validators[0] if validators else None
+
+
+
+def page_last_modified(request, *args, **kwargs):
+    validators = page_validators(request)
+    return validators[1] if validators else None
+
+
+
+def conditional_page(view):
+    """
+    ETag / Last-Modified for catalog pages, unchanged pages get a 304.
+    Browsers (and shared caches for anonymous pages) always revalidate.
+    """
+    view = condition(etag_func=page_etag, last_modified_func=page_last_modified)(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, no_cache=True)
+        return response
+
+    return wrapper
@@ -1,14 +1,14 @@
-from .models import Cart_Item, Wishlist_Cart_Item
+from .shopping_state import get_header_counts
 
 def common_data(request):
 
     if request.user.is_authenticated:
-    
-        cart_items = Cart_Item.objects.filter(cart__user=request.user)
 
-        cart_items_count = sum(item.quantity for item in cart_items) if cart_items else 0
+        # one query per request, no SQL on a hit when the cache is shared
+        header_counts = get_header_counts(request)
 
-        wishlist_items_count = Wishlist_Cart_Item.objects.filter(wishlistcart__user=request.user).count()
+        cart_items_count = header_counts['cart']
+        wishlist_items_count = header_counts['wishlist']
     
     else:
 
@@ -0,0 +1,17 @@
+from django.db import connections, router
+
+
+def bulk_upsert(model, objs, unique_fields, update_fields, batch_size=500):
+    """
+    INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE through bulk_create.
+    MySQL picks the conflicting unique key itself and rejects unique_fields, other backends need it.
+    """
+    connection = connections[router.db_for_write(model)]
+    target = unique_fields if connection.features.supports_update_conflicts_with_target else None
+    return model.objects.bulk_create(
+        objs,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=target,
+        update_fields=update_fields,
+    )
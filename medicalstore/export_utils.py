@@ -0,0 +1,186 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time as dt_time, timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .models import Order, OrderItem, Payment, Product
+from .media_utils import url_for_name
+
+
+EXPORT_CHUNK_SIZE = 2000
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+PRODUCT_FIELDS = (
+    'id', 'product_name', 'category__category_name', 'product_price', 'discount', 'selling_price',
+    'available_stock', 'featured_option', 'rating', 'product_short_desc', 'product_desc',
+    'product_main_image', 'created_at', 'updated_at',
+)
+ORDER_FIELDS = (
+    'id', 'order_number', 'razorpay_order_id', 'user_id', 'user__email', 'amount', 'delivery_charge', 'currency',
+    'status', 'order_payment_status', 'delivery_status', 'created_at', 'updated_at',
+    'shipped_date', 'out_for_delivery_date', 'delivery_date',
+)
+SHIPPING_FIELDS = ('firstname', 'lastname', 'email', 'phone', 'address', 'city', 'state', 'pincode')
+ORDER_ITEM_FIELDS = ('product_id', 'product_name', 'category_name', 'quantity', 'unit_price')
+PAYMENT_FIELDS = (
+    'id', 'razorpay_payment_id', 'order__order_number', 'order__razorpay_order_id', 'method', 'amount', 'currency',
+    'status', 'captured', 'fee', 'tax', 'international', 'bank', 'wallet', 'vpa', 'email', 'contact',
+    'error_code', 'error_description', 'created_at',
+)
+
+
+
+def date_range(queryset, since=None, until=None):
+    """Rows created on or after since and up to and including until (dates, local time)."""
+    if since:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(since, dt_time.min)))
+    if until:
+        queryset = queryset.filter(created_at__lt=timezone.make_aware(datetime.combine(until + timedelta(days=1), dt_time.min)))
+    return queryset
+
+
+
+def keyset_pages(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield pages of values() rows in primary key order, each page one 'pk > last' query.
+    Memory stays bounded by the page on every backend (MySQL buffers a whole result set
+    client side, also for iterator()).
+    """
+    last_pk = None
+    while True:
+        page_queryset = queryset.order_by('pk')
+        if last_pk is not None:
+            page_queryset = page_queryset.filter(pk__gt=last_pk)
+        page = list(page_queryset.values(*fields)[:chunk_size].iterator(chunk_size=chunk_size))
+        if not page:
+            return
+        yield page
+        if len(page) < chunk_size:
+            return
+        last_pk = page[-1]['id']
+
+
+
+def product_records(queryset, nested, chunk_size=EXPORT_CHUNK_SIZE):
+    for page in keyset_pages(queryset, PRODUCT_FIELDS, chunk_size):
+        for row in page:
+            row['product_main_image'] = url_for_name(row['product_main_image'])
+        yield page
+
+
+
+def order_records(queryset, nested, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Orders with their shipping address and items. Nested: one record per order with 'items'.
+    Flat (CSV): one record per order item, the order columns repeated on each.
+    """
+    fields = ORDER_FIELDS + tuple(f'shippingaddress__{field}' for field in SHIPPING_FIELDS)
+    for page in keyset_pages(queryset, fields, chunk_size):
+        items = {}
+        order_items = OrderItem.objects.filter(order_id__in=[row['id'] for row in page]).order_by('order_id', 'id')
+        for item in order_items.values('order_id', *ORDER_ITEM_FIELDS).iterator(chunk_size=chunk_size):
+            items.setdefault(item.pop('order_id'), []).append(item)
+
+        records = []
+        for row in page:
+            shipping = {field: row.pop(f'shippingaddress__{field}') for field in SHIPPING_FIELDS}
+            if nested:
+                row['shipping_address'] = shipping if shipping['firstname'] is not None else None
+                row['items'] = items.get(row['id'], [])
+                records.append(row)
+                continue
+            row.update({f'shipping_{field}': value for field, value in shipping.items()})
+            for item in items.get(row['id'], [{}]):
+                records.append({**row, **{f'item_{field}': item.get(field) for field in ORDER_ITEM_FIELDS}})
+        yield records
+
+
+
+def payment_records(queryset, nested, chunk_size=EXPORT_CHUNK_SIZE):
+    yield from keyset_pages(queryset, PAYMENT_FIELDS, chunk_size)
+
+
+
+# export name -> (model, records(queryset, nested, chunk_size), CSV header)
+EXPORTS = {
+    'products': (Product, product_records, PRODUCT_FIELDS),
+    'orders': (
+        Order, order_records,
+        ORDER_FIELDS + tuple(f'shipping_{field}' for field in SHIPPING_FIELDS)
+        + tuple(f'item_{field}' for field in ORDER_ITEM_FIELDS),
+    ),
+    'payments': (Payment, payment_records, PAYMENT_FIELDS),
+}
+
+
+
+class _Line:
+    """File-like target for csv.writer that hands back what was written."""
+    def write(self, value):
+        return value
+
+
+
+def render(name, queryset, fmt, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export as text, one chunk per page of rows."""
+    _, records, header = EXPORTS[name]
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(header)
+        for page in records(queryset, False, chunk_size):
+            yield ''.join(writer.writerow([row.get(field) for field in header]) for row in page)
+    else:
+        encoder = DjangoJSONEncoder()
+        for page in records(queryset, True, chunk_size):
+            yield ''.join(json.dumps(row, default=encoder.default) + '\n' for row in page)
+
+
+
+def encode(chunks, compress=False):
+    """UTF-8 bytes of the text chunks, gzip compressed on the fly when asked."""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+
+def export_filename(name, fmt, compress=False):
+    return f"{name}-{timezone.localtime():%Y%m%d-%H%M%S}.{fmt}{'.gz' if compress else ''}"
+
+
+
+def export_response(name, queryset, fmt, compress=False):
+    response = StreamingHttpResponse(
+        encode(render(name, queryset, fmt), compress),
+        content_type='application/gzip' if compress else f'{CONTENT_TYPES[fmt]}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(name, fmt, compress)}"'
+    return response
+
+
+
+def export_action(name, fmt, compress=False):
+    """Admin action streaming the selected rows (or all filtered rows with 'select all')."""
+    def action(modeladmin, request, queryset):
+        return export_response(name, queryset, fmt, compress)
+
+    label = {'csv': 'CSV', 'jsonl': 'JSON Lines'}[fmt]
+    action.__name__ = f"export_{fmt}{'_gzip' if compress else ''}"
+    action.short_description = f"Export selected {name} as {label}{' (gzip)' if compress else ''}"
+    action.allowed_permissions = ('view',)
+    return action
+
+
+
+def export_actions(name):
+    return [export_action(name, fmt, compress) for fmt in FORMATS for compress in (False, True)]
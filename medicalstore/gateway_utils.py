@@ -0,0 +1,283 @@
+import hashlib
+import hmac
+import itertools
+import threading
+import time
+from abc import ABC, abstractmethod
+import razorpay
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# One gateway client per process: a pooled keep-alive requests.Session with connect / read
+# timeouts, so requests reuse TLS connections and a slow gateway cannot hold a worker for
+# long. GET calls (fetches) are retried a few times on connection errors and 429 / 5xx
+# answers, POSTs only when the connection failed before anything was sent. Every call counts
+# its latency and errors in the cache, see the payment_gateway_stats command. The counters
+# are only summed over all processes with a shared CACHE_URL, a local memory cache keeps
+# one set per process.
+
+GATEWAY_TIMEOUT = (3.05, 10)  # seconds: connect, read
+GATEWAY_RETRIES = 2
+GATEWAY_RETRY_BACKOFF = 0.3
+GATEWAY_POOL_SIZE = 10
+SLOW_CALL_SECONDS = 2
+
+STATS_KEY = 'gateway:stats:{}:{}'
+STATS = ('calls', 'errors', 'slow', 'ms')
+CALLS = ('create_order', 'fetch_payment', 'list_payments', 'list_orders', 'order_payments')
+
+
+
+class PaymentGatewayError(Exception):
+    """The gateway could not be reached or rejected the call."""
+
+
+
+def _count(call, stat, amount=1):
+    key = STATS_KEY.format(call, stat)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+
+
+def record_call(call, seconds, failed=False):
+    _count(call, 'calls')
+    _count(call, 'ms', round(seconds * 1000))
+    if failed:
+        _count(call, 'errors')
+    if seconds >= SLOW_CALL_SECONDS:
+        _count(call, 'slow')
+
+
+
+def gateway_stats():
+    """{call: {calls, errors, slow, ms}} of the gateway calls counted in this cache (every process only when it is shared)."""
+    keys = [STATS_KEY.format(call, stat) for call in CALLS for stat in STATS]
+    values = cache.get_many(keys)
+    return {
+        call: {stat: values.get(STATS_KEY.format(call, stat), 0) for stat in STATS}
+        for call in CALLS
+    }
+
+
+
+def reset_gateway_stats():
+    cache.delete_many([STATS_KEY.format(call, stat) for call in CALLS for stat in STATS])
+
+
+
+class PaymentGateway(ABC):
+    """What the shop needs from a payment gateway. Amounts are in paise."""
+
+    @abstractmethod
+    def create_order(self, data):
+        """Create a gateway order, returns it as a dict with at least 'id'."""
+
+    @abstractmethod
+    def fetch_payment(self, payment_id):
+        """The payment entity as a dict."""
+
+    @abstractmethod
+    def list_payments(self, since, until, count=100, skip=0):
+        """One page of the payments created between since and until (unix seconds), newest first."""
+
+    @abstractmethod
+    def list_orders(self, since, until, count=100, skip=0):
+        """One page of the orders created between since and until (unix seconds), newest first."""
+
+    @abstractmethod
+    def order_payments(self, order_id):
+        """Every payment attempt of an order."""
+
+    @abstractmethod
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        """Whether the checkout callback's signature is genuine (no network call)."""
+
+
+
+class _TimeoutSession(requests.Session):
+    # razorpay.Client passes no timeout, requests would wait forever
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+
+class RazorpayGateway(PaymentGateway):
+
+    def __init__(self, key_id=None, key_secret=None, timeout=None, retries=None, pool_size=None):
+        self.key_secret = key_secret or settings.RAZORPAY_KEY_SECRET
+        retries = getattr(settings, 'RAZORPAY_RETRIES', GATEWAY_RETRIES) if retries is None else retries
+        pool_size = pool_size or getattr(settings, 'RAZORPAY_POOL_SIZE', GATEWAY_POOL_SIZE)
+
+        session = _TimeoutSession(timeout or getattr(settings, 'RAZORPAY_TIMEOUT', GATEWAY_TIMEOUT))
+        session.mount('https://', HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries, connect=retries, read=retries, status=retries,
+                allowed_methods=frozenset({'GET'}), status_forcelist=(429, 500, 502, 503, 504),
+                backoff_factor=GATEWAY_RETRY_BACKOFF, raise_on_status=False,
+            ),
+        ))
+        self.client = razorpay.Client(session=session, auth=(key_id or settings.RAZORPAY_KEY_ID, self.key_secret))
+
+    def _call(self, call, function, *args):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = function(*args)
+            failed = False
+            return result
+        except (requests.RequestException, ValueError, razorpay.errors.BadRequestError,
+                razorpay.errors.GatewayError, razorpay.errors.ServerError) as error:
+            raise PaymentGatewayError(f"{call}: {error}") from error
+        finally:
+            record_call(call, time.perf_counter() - started, failed)
+
+    def create_order(self, data):
+        return self._call('create_order', self.client.order.create, data)
+
+    def fetch_payment(self, payment_id):
+        return self._call('fetch_payment', self.client.payment.fetch, payment_id)
+
+    def _page(self, call, function, since, until, count, skip):
+        page = self._call(call, function, {'from': since, 'to': until, 'count': count, 'skip': skip})
+        return page.get('items', [])
+
+    def list_payments(self, since, until, count=100, skip=0):
+        return self._page('list_payments', self.client.payment.all, since, until, count, skip)
+
+    def list_orders(self, since, until, count=100, skip=0):
+        return self._page('list_orders', self.client.order.all, since, until, count, skip)
+
+    def order_payments(self, order_id):
+        return self._call('order_payments', self.client.order.payments, order_id).get('items', [])
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        try:
+            return self.client.utility.verify_payment_signature({
+                "razorpay_order_id": order_id,
+                "razorpay_payment_id": payment_id,
+                "razorpay_signature": signature,
+            })
+        except razorpay.errors.SignatureVerificationError:
+            return False
+
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-memory gateway for tests and local development (PAYMENT_GATEWAY setting).
+    pay(order_id) plays the customer: it captures (or fails) a payment and returns
+    the checkout callback data, signed like Razorpay signs it; event() builds the webhook
+    payload that follows.
+    """
+
+    def __init__(self, key_secret='fake-secret'):
+        self.key_secret = key_secret
+        self.orders = {}
+        self.payments = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _id(self, prefix):
+        with self._lock:
+            return f"{prefix}_fake{next(self._ids):08d}"
+
+    def sign(self, order_id, payment_id):
+        message = f"{order_id}|{payment_id}".encode()
+        return hmac.new(self.key_secret.encode(), message, hashlib.sha256).hexdigest()
+
+    def create_order(self, data):
+        order = {
+            **data, 'id': self._id('order'), 'entity': 'order', 'status': 'created', 'amount_paid': 0,
+            'created_at': int(time.time()),
+        }
+        self.orders[order['id']] = order
+        return order
+
+    def pay(self, order_id, status='captured'):
+        order = self.orders[order_id]
+        payment = {
+            'id': self._id('pay'), 'entity': 'payment', 'order_id': order_id, 'amount': order['amount'],
+            'currency': order.get('currency', 'INR'), 'status': status, 'captured': status == 'captured',
+            'method': 'upi', 'vpa': 'fake@upi', 'email': 'fake@example.invalid', 'contact': '+910000000000',
+            'fee': 0, 'tax': 0, 'international': False, 'created_at': int(time.time()),
+        }
+        self.payments[payment['id']] = payment
+        if status == 'captured':
+            order.update(status='paid', amount_paid=order['amount'])
+        return {
+            'razorpay_order_id': order_id,
+            'razorpay_payment_id': payment['id'],
+            'razorpay_signature': self.sign(order_id, payment['id']),
+        }
+
+    def event(self, name, payment_id):
+        """The webhook payload Razorpay would send for a payment, e.g. event('payment.captured', id)."""
+        payment = self.payments[payment_id]
+        payload = {'payment': {'entity': dict(payment)}}
+        if name == 'order.paid':
+            payload['order'] = {'entity': dict(self.orders[payment['order_id']])}
+        return {'entity': 'event', 'event': name, 'contains': list(payload), 'payload': payload}
+
+    def fetch_payment(self, payment_id):
+        try:
+            return dict(self.payments[payment_id])
+        except KeyError:
+            raise PaymentGatewayError(f"fetch_payment: unknown payment {payment_id}") from None
+
+    def _page(self, entities, since, until, count, skip):
+        found = [dict(entity) for entity in entities.values() if since <= entity['created_at'] <= until]
+        found.sort(key=lambda entity: (entity['created_at'], entity['id']), reverse=True)
+        return found[skip:skip + count]
+
+    def list_payments(self, since, until, count=100, skip=0):
+        return self._page(self.payments, since, until, count, skip)
+
+    def list_orders(self, since, until, count=100, skip=0):
+        return self._page(self.orders, since, until, count, skip)
+
+    def order_payments(self, order_id):
+        return [dict(payment) for payment in self.payments.values() if payment['order_id'] == order_id]
+
+    def verify_payment_signature(self, order_id, payment_id, signature):
+        return hmac.compare_digest(self.sign(order_id, payment_id), signature or '')
+
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+
+def get_gateway():
+    """The process wide gateway, built from settings.PAYMENT_GATEWAY (a class path) on first use."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                gateway_class = getattr(settings, 'PAYMENT_GATEWAY', 'medicalstore.gateway_utils.RazorpayGateway')
+                _gateway = import_string(gateway_class)()
+    return _gateway
+
+
+
+def set_gateway(gateway):
+    """Substitute the gateway (tests), returns the previous one."""
+    global _gateway
+    with _gateway_lock:
+        previous, _gateway = _gateway, gateway
+    return previous
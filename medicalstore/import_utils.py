@@ -0,0 +1,307 @@
+import csv
+import json
+import os
+import posixpath
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from urllib.request import urlopen
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile, File
+from django.db import transaction
+from .models import Category, Product
+from .db_utils import bulk_upsert
+from .search_utils import index_products
+from .related_utils import refresh_category
+from .catalog_cache import bump_catalog_version
+
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_WORKERS = 8
+URL_TIMEOUT = 30
+MAX_REPORTED_ERRORS = 100
+
+# Columns are the model field names. A row with a product_name is a product,
+# any other row a category. Products refer to their category by category_name,
+# which must exist already or come earlier in the file.
+CATEGORY_FIELDS = ('category_name', 'category_image_altername', 'category_background_color')
+CATEGORY_IMAGE_FIELDS = ('category_image',)
+PRODUCT_FIELDS = (
+    'product_name', 'product_image_altername', 'product_short_desc', 'product_desc',
+    'product_price', 'discount', 'available_stock', 'featured_option',
+)
+PRODUCT_IMAGE_FIELDS = ('product_main_image', 'product_image1', 'product_image2', 'product_image3', 'product_image4')
+
+
+
+class RowError(Exception):
+    pass
+
+
+
+def read_rows(path, fmt=None):
+    """Yield (row number, {column: value}) from a CSV or JSON Lines file, one row in memory at a time."""
+    fmt = fmt or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        if fmt == 'csv':
+            for number, row in enumerate(csv.DictReader(source), start=1):
+                yield number, row
+            return
+        number = 0
+        for line in source:
+            if not line.strip():
+                continue
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else {'_invalid': line.strip()[:80]}
+
+
+
+def clean_fields(model, row, field_names):
+    """{field: python value} validated by the model fields themselves (max_length, choices, validators)."""
+    values = {}
+    for name in field_names:
+        field = model._meta.get_field(name)
+        raw = row.get(name)
+        raw = raw.strip() if isinstance(raw, str) else raw
+        if raw in (None, '') and field.null:
+            values[name] = None
+            continue
+        try:
+            values[name] = field.clean('' if raw is None else raw, None)
+        except ValidationError as error:
+            raise RowError(f"{name}: {' '.join(error.messages)}")
+    return values
+
+
+
+def image_sources(row, field_names, base_dir):
+    """{field: local path or URL} of the images given in the row."""
+    sources = {}
+    for name in field_names:
+        source = str(row.get(name) or '').strip()
+        if source:
+            if urlparse(source).scheme not in ('http', 'https'):
+                source = os.path.join(base_dir, source)
+            sources[name] = source
+    return sources
+
+
+
+def upload_image(field, instance, source):
+    """Store one source image under the field's upload path, returns the stored name."""
+    filename = posixpath.basename(urlparse(source).path) if '://' in source else os.path.basename(source)
+    name = field.generate_filename(instance, filename)
+    if '://' in source:
+        with urlopen(source, timeout=URL_TIMEOUT) as response:
+            return field.storage.save(name, ContentFile(response.read()))
+    with open(source, 'rb') as image:
+        return field.storage.save(name, File(image))
+
+
+
+def same_image(stored_name, source):
+    # a re-run (or resumed) import does not upload an image the row already points to,
+    # also when the storage stored it under an alternative name (p.jpg -> p_AbC1234.jpg)
+    if not stored_name:
+        return False
+    root, ext = posixpath.splitext(posixpath.basename(urlparse(source).path))
+    pattern = rf'{re.escape(root)}(_[a-zA-Z0-9]{{7}})?{re.escape(ext)}'
+    return re.fullmatch(pattern, posixpath.basename(stored_name)) is not None
+
+
+
+class CatalogImporter:
+    """
+    Streams rows into batches of IMPORT_BATCH_SIZE. Per batch the images are uploaded concurrently
+    by a bounded thread pool, then categories and products are upserted with one INSERT ... ON
+    CONFLICT UPDATE each and the batch's products are reindexed for search, all in one transaction.
+    """
+
+    def __init__(self, base_dir, batch_size=IMPORT_BATCH_SIZE, workers=IMPORT_WORKERS):
+        self.base_dir = base_dir
+        self.batch_size = batch_size
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.category_ids = dict(Category.objects.values_list('category_name', 'id'))
+        self.pending_categories = set()
+        self.touched_categories = set()
+        self.stats = {'rows': 0, 'categories': 0, 'created': 0, 'updated': 0, 'images': 0, 'errors': 0}
+        self.errors = []
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def close(self):
+        self.pool.shutdown()
+
+    def error(self, number, message):
+        self.stats['errors'] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, message))
+
+    def upload_all(self, jobs):
+        """jobs: [(row number, instance, {field: source})]. Sets the stored names on the instances."""
+        futures = []
+        for number, instance, sources in jobs:
+            for name, source in sources.items():
+                field = instance._meta.get_field(name)
+                futures.append((number, instance, name, self.pool.submit(upload_image, field, instance, source)))
+
+        failed = set()
+        for number, instance, name, future in futures:
+            try:
+                setattr(instance, name, future.result())
+                self.stats['images'] += 1
+            except Exception as error:
+                failed.add(number)
+                self.error(number, f"{name}: could not upload image ({error})")
+        return failed
+
+    def prepare_categories(self, rows):
+        existing = dict(
+            Category.objects.filter(category_name__in=[str(row.get('category_name') or '').strip() for _, row in rows])
+            .values_list('category_name', 'category_image')
+        )
+        categories, jobs = {}, []
+        for number, row in rows:
+            try:
+                values = clean_fields(Category, row, CATEGORY_FIELDS)
+                sources = image_sources(row, CATEGORY_IMAGE_FIELDS, self.base_dir)
+            except RowError as error:
+                self.error(number, str(error))
+                continue
+            category = Category(**values, category_image=existing.get(values['category_name'], ''))
+            if 'category_image' in sources and same_image(category.category_image.name, sources['category_image']):
+                del sources['category_image']
+            if not category.category_image and not sources:
+                self.error(number, "category_image: required for a new category")
+                continue
+            categories[values['category_name']] = (number, category)
+            jobs.append((number, category, sources))
+        return categories, jobs
+
+    def prepare_products(self, rows):
+        names = [str(row.get('product_name') or '').strip() for _, row in rows]
+        existing = {
+            row['product_name']: row
+            for row in Product.objects.filter(product_name__in=names).values('product_name', *PRODUCT_IMAGE_FIELDS)
+        }
+        products, jobs = {}, []
+        for number, row in rows:
+            try:
+                values = clean_fields(Product, row, PRODUCT_FIELDS)
+                category_name = str(row.get('category_name') or '').strip()
+                if category_name not in self.category_ids and category_name not in self.pending_categories:
+                    raise RowError(f"category_name: unknown category {category_name!r}")
+                sources = image_sources(row, PRODUCT_IMAGE_FIELDS, self.base_dir)
+            except RowError as error:
+                self.error(number, str(error))
+                continue
+
+            # images missing from the row keep what the product already has
+            stored = existing.get(values['product_name'], {})
+            product = Product(**values, **{field: stored.get(field) or '' for field in PRODUCT_IMAGE_FIELDS})
+            product._category_name = category_name
+            for field, source in list(sources.items()):
+                if same_image(stored.get(field), source):
+                    del sources[field]
+            if not product.product_main_image and 'product_main_image' not in sources:
+                self.error(number, "product_main_image: required for a new product")
+                continue
+            products[values['product_name']] = (number, product, values['product_name'] in existing)
+            jobs.append((number, product, sources))
+        return products, jobs
+
+    def import_batch(self, rows):
+        for number, row in rows:
+            if '_invalid' in row:
+                self.error(number, f"not a JSON object: {row['_invalid']}")
+        rows = [(number, row) for number, row in rows if '_invalid' not in row]
+        category_rows = [(number, row) for number, row in rows if not row.get('product_name')]
+        product_rows = [(number, row) for number, row in rows if row.get('product_name')]
+
+        categories, category_jobs = self.prepare_categories(category_rows)
+        self.pending_categories = set(categories)
+        products, product_jobs = self.prepare_products(product_rows)
+        failed = self.upload_all(category_jobs + product_jobs)
+
+        categories = {name: category for name, (number, category) in categories.items() if number not in failed}
+        products = {name: entry for name, entry in products.items() if entry[0] not in failed}
+        with transaction.atomic():
+            if categories:
+                bulk_upsert(
+                    Category, list(categories.values()), ['category_name'],
+                    list(CATEGORY_FIELDS[1:]) + list(CATEGORY_IMAGE_FIELDS) + ['updated_at'],
+                )
+                self.category_ids.update(
+                    Category.objects.filter(category_name__in=categories).values_list('category_name', 'id')
+                )
+                self.stats['categories'] += len(categories)
+
+            objs = []
+            for number, product, exists in products.values():
+                category_id = self.category_ids.get(product._category_name)
+                if category_id is None:
+                    # its category row failed in this batch
+                    self.error(number, f"category_name: unknown category {product._category_name!r}")
+                    continue
+                product.category_id = category_id
+                objs.append(product)
+                self.stats['updated' if exists else 'created'] += 1
+                self.touched_categories.add(category_id)
+            if objs:
+                bulk_upsert(
+                    Product, objs, ['product_name'],
+                    ['category'] + list(PRODUCT_FIELDS[1:]) + list(PRODUCT_IMAGE_FIELDS) + ['updated_at'],
+                )
+                # bulk writes send no post_save, keep the search index in step here
+                names = [obj.product_name for obj in objs]
+                index_products(Product.objects.select_related('category').filter(product_name__in=names))
+
+    def finish(self):
+        """Derived data of the whole import: related products of every touched category and the catalog caches."""
+        for category_id in self.touched_categories:
+            refresh_category(category_id)
+        bump_catalog_version()
+
+
+
+def import_catalog(path, fmt=None, skip_rows=0, batch_size=IMPORT_BATCH_SIZE, workers=IMPORT_WORKERS,
+                   base_dir=None, progress=None):
+    """
+    Import a CSV / JSON Lines catalog file. progress(rows done, importer) is called after every
+    committed batch, so a caller can checkpoint "rows done" and resume with skip_rows.
+    Returns the importer (stats, errors).
+    """
+    importer = CatalogImporter(base_dir or os.path.dirname(os.path.abspath(path)), batch_size, workers)
+    done = skip_rows
+    batch = []
+    try:
+        for number, row in read_rows(path, fmt):
+            if number <= skip_rows:
+                continue
+            batch.append((number, row))
+            importer.stats['rows'] += 1
+            if len(batch) == batch_size:
+                importer.import_batch(batch)
+                done = number
+                batch = []
+                if progress:
+                    progress(done, importer)
+        if batch:
+            importer.import_batch(batch)
+            done = batch[-1][0]
+            if progress:
+                progress(done, importer)
+        importer.finish()
+    finally:
+        importer.close()
+    importer.finished = time.perf_counter()
+    return importer
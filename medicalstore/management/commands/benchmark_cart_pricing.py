@@ -0,0 +1,65 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from medicalstore.models import Cart, Cart_Item, Product, User_detail
+from medicalstore.pricing_utils import delivery_charge_for, price_cart
+
+
+BENCHMARK_USER_EMAIL = 'benchmark-cart@example.invalid'
+
+
+
+def price_in_python(user):
+    """The former per view computation: load every line with its product and sum the properties."""
+    cart_items = list(Cart_Item.objects.select_related('cart', 'product').filter(cart__user=user))
+    total_amount = sum(item.get_total_discount_price for item in cart_items)
+    return total_amount + delivery_charge_for(total_amount)
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Time pricing a large cart with the aggregate query against summing the loaded lines in Python. "
+        "Uses a cart of its own, run against a staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=150, help="Cart lines, one product each")
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.order_by('id')[:options['lines']])
+        if len(products) < options['lines']:
+            raise CommandError(f"Only {len(products)} products, a cart of {options['lines']} lines needs as many.")
+
+        user = User_detail.objects.filter(email=BENCHMARK_USER_EMAIL).first()
+        if user is None:
+            user = User_detail(name='Cart pricing benchmark', email=BENCHMARK_USER_EMAIL)
+            user.set_unusable_password()
+            user.save()
+        Cart.objects.filter(user=user).delete()
+        cart = Cart.objects.create(user=user)
+        Cart_Item.objects.bulk_create(
+            Cart_Item(cart=cart, product=product, quantity=number % 3 + 1) for number, product in enumerate(products)
+        )
+
+        try:
+            results = {}
+            for name, price in (('python sum', price_in_python), ('aggregate', lambda user: price_cart(user).final_amount)):
+                with CaptureQueriesContext(connection) as queries:
+                    results[name] = price(user)
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    price(user)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{name:>10}: {elapsed / options['repeat'] * 1000:.2f} ms per cart, "
+                    f"{len(queries)} queries, final amount {results[name]}"
+                )
+        finally:
+            Cart.objects.filter(user=user).delete()
+
+        if results['python sum'] != results['aggregate']:
+            raise CommandError("The two computations disagree.")
+        self.stdout.write(self.style.SUCCESS(f"Same totals for a {options['lines']} line cart."))
@@ -0,0 +1,62 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from medicalstore.models import Product
+
+
+def default_host():
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0] if hosts else 'localhost'
+
+
+
+class Command(BaseCommand):
+    help = "Compare throughput of the JSON catalog API with the HTML products page for the same listing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=24, help="API page size, the HTML page always shows one page of 24.")
+        parser.add_argument('--sort', default='recommended')
+        parser.add_argument('--host', default=None)
+
+    def measure(self, client, url, count, headers=None):
+        """(requests per second, bytes per response, queries per response, status) over count requests."""
+        headers = headers or {}
+        size = status = 0
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(count):
+                response = client.get(url, **headers)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                size, status = len(body), response.status_code
+            elapsed = time.perf_counter() - started
+        return count / elapsed, size, len(queries) / count, status
+
+    def handle(self, *args, **options):
+        if not Product.objects.exists():
+            raise CommandError("No products to list.")
+        count = options['requests']
+        client = Client(HTTP_HOST=options['host'] or default_host())
+        html_url = f"{reverse('products_page')}?sort={options['sort']}"
+        api_url = f"{reverse('api_products')}?sort={options['sort']}&limit={options['limit']}"
+
+        # warm up caches and the url resolver
+        client.get(html_url)
+        client.get(api_url)
+
+        self.stdout.write(f"{count} requests each")
+        runs = [("HTML page", html_url, None), ("JSON API", api_url, None)]
+        etag = client.get(api_url).get('ETag')
+        if etag:
+            runs.append(("JSON API 304", api_url, {'HTTP_IF_NONE_MATCH': etag}))
+
+        for label, url, headers in runs:
+            rate, size, queries, status = self.measure(client, url, count, headers)
+            self.stdout.write(
+                f"{label:>13}: {rate:8.1f} req/s, {1000 / rate:6.2f} ms, {size:7d} bytes, "
+                f"{queries:.1f} queries, status {status}"
+            )
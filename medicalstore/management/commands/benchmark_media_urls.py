@@ -0,0 +1,69 @@
+import copy
+import itertools
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context, Template
+from medicalstore.models import Product
+
+
+CARDS = Template(
+    "{% load image_tags %}{% for product in products %}"
+    "{% responsive_image product.product_main_image product.product_main_image_renditions alt=product.product_image_altername sizes='240px' %}"
+    "{% endfor %}"
+)
+
+
+
+def without_stored_urls(product):
+    """Copy of the product whose renditions only know file names, so every URL is built by the storage."""
+    product = copy.copy(product)
+    record = dict(product.product_main_image_renditions or {})
+    for fmt in ('webp', 'jpeg'):
+        record[fmt] = [entry[:2] for entry in record.get(fmt, [])]
+    product.product_main_image_renditions = record
+    return product
+
+
+class Command(BaseCommand):
+    help = "Compare card render time with image URLs built by the storage vs stored in the renditions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.order_by('id')[:options['cards']])
+        if not products:
+            raise CommandError("No products to render.")
+        if not products[0].product_main_image_renditions:
+            raise CommandError("Products have no renditions yet, run build_renditions first.")
+        products = list(itertools.islice(itertools.cycle(products), options['cards']))
+        storage = products[0].product_main_image.storage
+        storage_name = storage.__class__.__name__  # the backend class, also behind default_storage
+
+        self.stdout.write(f"{len(products)} cards x {options['repeat']} renders, storage {storage_name}")
+        runs = (("storage url()", [without_stored_urls(product) for product in products]), ("stored URLs", products))
+        for label, cards in runs:
+            calls = 0
+            build_url = storage.url
+
+            def counting_url(name, *args, **kwargs):
+                nonlocal calls
+                calls += 1
+                return build_url(name, *args, **kwargs)
+
+            storage.url = counting_url
+            try:
+                CARDS.render(Context({'products': cards}))  # warm up caches
+                calls = 0
+                started = time.perf_counter()
+                for _ in range(options['repeat']):
+                    CARDS.render(Context({'products': cards}))
+                elapsed = time.perf_counter() - started
+            finally:
+                del storage.url
+
+            self.stdout.write(
+                f"{label:>14}: {elapsed / options['repeat'] * 1000:.2f} ms per render, "
+                f"{calls / options['repeat']:.0f} storage url() calls per render"
+            )
@@ -0,0 +1,38 @@
+import itertools
+import random
+import time
+from django.core.management.base import BaseCommand
+from medicalstore.recommendation_utils import count_co_purchases, top_co_purchases
+
+
+class Command(BaseCommand):
+    help = "Time co-purchase counting and top-N selection on synthetic orders (no database access)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200000)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--max-lines', type=int, default=8, help="Largest number of lines in one order")
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # popular products are bought far more often, like a real catalog
+        cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, options['products'] + 1)))
+        product_ids = list(range(1, options['products'] + 1))
+        baskets = [
+            sorted(set(rng.choices(product_ids, cum_weights=cum_weights, k=rng.randint(1, options['max_lines']))))
+            for _ in range(options['orders'])
+        ]
+        lines = sum(len(basket) for basket in baskets)
+
+        started = time.perf_counter()
+        counts = count_co_purchases(baskets)
+        counted = time.perf_counter()
+        top = top_co_purchases(counts, options['limit'])
+        finished = time.perf_counter()
+
+        self.stdout.write(f"orders: {options['orders']}  order lines: {lines}  products: {options['products']}")
+        self.stdout.write(f"count pairs: {counted - started:.2f}s ({lines / (counted - started):,.0f} lines/s, {len(counts)} pairs)")
+        self.stdout.write(f"top {options['limit']}: {finished - counted:.2f}s ({len(top)} products)")
+        self.stdout.write(self.style.SUCCESS(f"total: {finished - started:.2f}s"))
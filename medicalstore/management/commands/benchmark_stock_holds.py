@@ -0,0 +1,110 @@
+import threading
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from medicalstore.models import Order, Product, StockHold, User_detail
+from medicalstore.reservation_utils import STOCK_HOLD_BATCH_SIZE, expire_holds, held_quantities, place_holds
+
+
+BENCHMARK_USER_EMAIL = 'benchmark-holds@example.invalid'
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Time placing stock holds (serial and from parallel threads), the availability aggregate "
+        "and the expiry sweep on orders of its own, deleted afterwards. Run against a staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--lines', type=int, default=3, help="Products held by every order")
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--lookups', type=int, default=1000, help="Availability aggregates to time")
+        parser.add_argument('--batch-size', type=int, default=STOCK_HOLD_BATCH_SIZE, help="Orders per sweep transaction")
+
+    def report(self, label, count, unit, elapsed):
+        self.stdout.write(f"{label:>22}: {count} {unit} in {elapsed:.2f}s, {count / elapsed:,.0f} {unit}/s")
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.order_by('id').values_list('id', flat=True)[:options['lines'] * 10])
+        if len(products) < options['lines']:
+            raise CommandError(f"Only {len(products)} products, every order holds {options['lines']}.")
+
+        user = User_detail.objects.filter(email=BENCHMARK_USER_EMAIL).first()
+        if user is None:
+            user = User_detail(name='Stock hold benchmark', email=BENCHMARK_USER_EMAIL)
+            user.set_unusable_password()
+            user.save()
+        Order.objects.filter(user=user).delete()
+
+        # holds are checked against the stock, make sure no order runs short
+        stock = dict(Product.objects.filter(pk__in=products).values_list('id', 'available_stock'))
+        Product.objects.filter(pk__in=products).update(available_stock=options['orders'] * options['lines'] * 10)
+
+        started = timezone.now()
+        orders = Order.objects.bulk_create([
+            Order(user=user, delivery_charge=0, amount=0, status="created", receipt=f"BENCH-{number}")
+            for number in range(options['orders'])
+        ])
+        # every order holds a window of neighbouring products, so the orders contend for rows
+        plans = [
+            (order, {products[(number + line) % len(products)]: 1 for line in range(options['lines'])})
+            for number, order in enumerate(orders)
+        ]
+        half = len(plans) // 2
+
+        try:
+            begin = time.perf_counter()
+            for order, lines in plans[:half]:
+                with transaction.atomic():
+                    place_holds(order, lines)
+            self.report("place holds, serial", half * options['lines'], "holds", time.perf_counter() - begin)
+
+            chunks = [plans[half + number::options['threads']] for number in range(options['threads'])]
+            errors = []
+
+            def worker(chunk):
+                try:
+                    for order, lines in chunk:
+                        with transaction.atomic():
+                            place_holds(order, lines)
+                except Exception as error:
+                    errors.append(repr(error))
+                finally:
+                    connection.close()
+
+            threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+            begin = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.report(f"place holds, {options['threads']} threads", (len(plans) - half) * options['lines'], "holds", time.perf_counter() - begin)
+            for error in errors[:10]:
+                self.stderr.write(error)
+
+            held = StockHold.objects.filter(order__user=user).count()
+            begin = time.perf_counter()
+            for number in range(options['lookups']):
+                # a checkout sized basket of products, each with many active holds
+                start = number * options['lines'] % len(products)
+                held_quantities(products[start:start + options['lines']])
+            self.report("availability aggregate", options['lookups'], "lookups", time.perf_counter() - begin)
+
+            # age the benchmark holds instead of sweeping with a future clock, which would expire real orders
+            StockHold.objects.filter(order__user=user).update(expires_at=started - timedelta(seconds=1))
+            begin = time.perf_counter()
+            expired, released = expire_holds(options['batch_size'])
+            self.report("expiry sweep", released, "holds", time.perf_counter() - begin)
+        finally:
+            Order.objects.filter(user=user).delete()
+            for product_id, available_stock in stock.items():
+                Product.objects.filter(pk=product_id).update(available_stock=available_stock)
+
+        self.stdout.write(f"{held} holds placed, {expired} orders expired, {released} holds released")
+        if errors or held != len(plans) * options['lines'] or released < held:
+            raise CommandError("Hold counts do not add up.")
+        self.stdout.write(self.style.SUCCESS("Done."))
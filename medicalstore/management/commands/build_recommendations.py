@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from medicalstore.recommendation_utils import rebuild_co_purchases
+
+
+class Command(BaseCommand):
+    help = "Rebuild the \"frequently bought together\" products from paid order history (run on a schedule)"
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        products, pairs = rebuild_co_purchases()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Recommendations built for {products} products from {pairs} product pairs in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from medicalstore.models import User_detail, Category, Product
+from medicalstore.rendition_utils import update_renditions
+from medicalstore.catalog_cache import bump_catalog_version
+
+
+SOURCES = (
+    (Product, 'product_main_image'),
+    (Category, 'category_image'),
+    (User_detail, 'user_profile_picture'),
+)
+
+
+class Command(BaseCommand):
+    help = "Create missing image renditions (thumbnails) of products, categories and profile pictures"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild renditions that already exist")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        for model, field_name in SOURCES:
+            built = 0
+            instances = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for instance in instances.only('pk', field_name, f'{field_name}_renditions').iterator(chunk_size=100):
+                built += update_renditions(instance, field_name, force=options['force'])
+            self.stdout.write(f"{model.__name__}: {built} images processed.")
+
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Renditions done in {time.perf_counter() - started:.2f}s."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from medicalstore.catalog_cache import catalog_cache_stats, get_catalog_version
+
+
+class Command(BaseCommand):
+    help = "Show the catalog cache version and hit / miss counters"
+
+    def handle(self, *args, **kwargs):
+        stats = catalog_cache_stats()
+        lookups = stats['hit'] + stats['miss']
+        hit_rate = (stats['hit'] / lookups * 100) if lookups else 0
+
+        self.stdout.write(f"Catalog version: {get_catalog_version()}")
+        for stat, count in stats.items():
+            self.stdout.write(f"{stat:>8}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Hit rate: {hit_rate:.1f}%"))
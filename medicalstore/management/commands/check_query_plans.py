@@ -0,0 +1,88 @@
+import json
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from medicalstore.models import Category, Product, SearchPosting
+from medicalstore.pagination_utils import SORT_KEYS, PRODUCTS_PAGE_SIZE, keyset_products, encode_cursor
+from medicalstore.catalog_cache import featured_products
+from medicalstore.reservation_utils import expired_holds, holds_by_product
+
+
+def hot_queries():
+    """(label, queryset) for every query the listing, home page, checkout and expiry job run on each hit."""
+    category_id = Category.objects.values_list('id', flat=True).first() or 1
+    sample = Product.objects.order_by('id').first()
+    listing = Product.objects.select_related('category')
+    queries = []
+
+    for sort_option in SORT_KEYS:
+        for label, products in (("all", listing), ("category", listing.filter(category__id=category_id))):
+            queries.append((
+                f"products_page {label} sort={sort_option}",
+                keyset_products(products, sort_option)[:PRODUCTS_PAGE_SIZE + 1],
+            ))
+            if sample:
+                cursor = encode_cursor(sort_option, sample)
+                queries.append((
+                    f"products_page {label} sort={sort_option} next page",
+                    keyset_products(products, sort_option, cursor)[:PRODUCTS_PAGE_SIZE + 1],
+                ))
+
+    queries.append(("home_page featured products", featured_products()))
+    queries.append(("search postings lookup", SearchPosting.objects.filter(token_id__in=[1, 2, 3])))
+    queries.append(("stock hold expiry scan", expired_holds().values_list('order_id', flat=True).distinct()))
+    if sample:
+        queries.append(("checkout active holds", holds_by_product([sample.id])))
+    return queries
+
+
+def _mysql_tables(plan):
+    if isinstance(plan, dict):
+        for key, value in plan.items():
+            if key == 'table' and isinstance(value, dict):
+                yield value
+            yield from _mysql_tables(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _mysql_tables(value)
+
+
+def full_scans(queryset):
+    """Tables the database plans to read with a full table scan for this queryset."""
+    if connection.vendor == 'mysql':
+        plan = json.loads(queryset.explain(format='json'))
+        return [table.get('table_name') for table in _mysql_tables(plan) if table.get('access_type') == 'ALL']
+
+    plan = queryset.explain()
+    if connection.vendor == 'postgresql':
+        return re.findall(r'Seq Scan on (\w+)', plan)
+    if connection.vendor == 'sqlite':
+        # "SCAN table" is a full scan, "SCAN table USING INDEX ..." walks an index
+        return [m.group(1) for m in re.finditer(r'SCAN (\w+)\s*$', plan, re.MULTILINE)]
+    raise CommandError(f"Query plan checks are not supported on {connection.vendor}.")
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot catalog and order queries and fail when any of them needs a full table scan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show-plans', action='store_true', help="Print the full plan of every query")
+
+    def handle(self, *args, **options):
+        failed = []
+
+        for label, queryset in hot_queries():
+            tables = full_scans(queryset)
+            if tables:
+                failed.append(label)
+                self.stdout.write(self.style.ERROR(f"FULL SCAN  {label}: {', '.join(tables)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"OK         {label}"))
+
+            if options['show_plans']:
+                self.stdout.write(queryset.explain())
+
+        # the planner may prefer a full scan on near-empty tables, run this against production sized data
+        if failed:
+            raise CommandError(f"{len(failed)} hot queries fall back to a full table scan.")
+        self.stdout.write(self.style.SUCCESS("All hot queries use an index."))
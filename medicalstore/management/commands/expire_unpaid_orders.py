@@ -1,33 +1,20 @@
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from medicalstore.models import Order  # adjust import
+from medicalstore.reservation_utils import STOCK_HOLD_BATCH_SIZE, expire_holds
+
 
 class Command(BaseCommand):
-    help = "Expire unpaid orders and restore stock"
+    help = "Expire unpaid orders whose stock holds ran out and release the held stock"
 
-    def handle(self, *args, **kwargs):
-        expiry_time = timezone.now() - timedelta(minutes=1)
-        orders = Order.objects.filter(
-            status="created",
-            order_payment_status="pending",
-            created_at__lt=expiry_time
-        )
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=STOCK_HOLD_BATCH_SIZE, help="Orders per transaction")
+
+    def handle(self, *args, **options):
+        orders, holds = expire_holds(options['batch_size'])
 
-        if not orders.exists():
+        if not holds:
             self.stdout.write(self.style.SUCCESS("No unpaid orders to expire."))
             return
 
-        for order in orders:
-            for item in order.orderitem.all():  # assuming Order has related OrderItems
-                item.product.available_stock += item.quantity
-                item.product.save()
-
-            order.order_payment_status = "failed"
-            order.status = "failed"
-            order.delivery_status = "failed"
-            order.save()
-
-            self.stdout.write(
-                self.style.WARNING(f"Order {order.id} expired, stock restored.")
-            )
+        self.stdout.write(
+            self.style.WARNING(f"{orders} orders expired, {holds} stock holds released.")
+        )
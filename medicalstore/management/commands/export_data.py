@@ -0,0 +1,51 @@
+import argparse
+import sys
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from medicalstore.export_utils import EXPORT_CHUNK_SIZE, EXPORTS, FORMATS, date_range, encode, render
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a date (YYYY-MM-DD)")
+
+
+
+class Command(BaseCommand):
+    help = "Stream products, orders (with items and shipping address) or payments to CSV / JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--since', type=parse_date, help="Created on or after (YYYY-MM-DD)")
+        parser.add_argument('--until', type=parse_date, help="Created on or before (YYYY-MM-DD)")
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+        parser.add_argument('--output', '-o', help="File to write, default stdout")
+
+    def handle(self, *args, **options):
+        name, fmt = options['name'], options['format']
+        model = EXPORTS[name][0]
+        queryset = date_range(model.objects.all(), options['since'], options['until'])
+        chunks = encode(render(name, queryset, fmt, options['chunk_size']), options['gzip'])
+
+        started = time.perf_counter()
+        written = 0
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
+
+        if options['output']:
+            self.stdout.write(
+                self.style.SUCCESS(f"Exported {name} to {options['output']}: {written} bytes in {time.perf_counter() - started:.1f}s.")
+            )
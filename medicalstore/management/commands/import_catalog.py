@@ -0,0 +1,64 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from medicalstore.import_utils import IMPORT_BATCH_SIZE, IMPORT_WORKERS, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Import categories and products from a CSV or JSON Lines file. Columns are the model field names, "
+        "rows with a product_name are products (category by category_name), the others categories. "
+        "Images are local paths (relative to the file) or http(s) URLs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help="Default: from the file extension")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=IMPORT_WORKERS, help="Concurrent image uploads")
+        parser.add_argument('--images-dir', help="Base directory of relative image paths")
+        parser.add_argument('--checkpoint', help="Progress file, default <path>.checkpoint")
+        parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and import from the first row")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+        checkpoint = options['checkpoint'] or f"{path}.checkpoint"
+
+        skip_rows = 0
+        if os.path.exists(checkpoint) and not options['restart']:
+            with open(checkpoint) as f:
+                skip_rows = json.load(f)['rows']
+            self.stdout.write(f"Resuming after row {skip_rows} ({checkpoint}).")
+
+        def progress(done, importer):
+            # only committed batches are recorded, a failed batch is imported again on resume
+            with open(checkpoint, 'w') as f:
+                json.dump({'rows': done}, f)
+            rows = importer.stats['rows']
+            elapsed = importer.elapsed
+            self.stdout.write(f"  row {done}: {rows} rows in {elapsed:.1f}s, {rows / elapsed:.0f} rows/s")
+
+        importer = import_catalog(
+            path, options['format'], skip_rows, options['batch_size'], options['workers'],
+            options['images_dir'], progress,
+        )
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        for number, message in importer.errors:
+            self.stderr.write(f"row {number}: {message}")
+        stats = importer.stats
+        if stats['errors'] > len(importer.errors):
+            self.stderr.write(f"... {stats['errors'] - len(importer.errors)} more errors")
+
+        rate = stats['rows'] / importer.elapsed if importer.elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {stats['rows']} rows in {importer.elapsed:.1f}s ({rate:.0f} rows/s): "
+                f"{stats['categories']} categories, {stats['created']} products created, "
+                f"{stats['updated']} updated, {stats['images']} images uploaded, {stats['errors']} rows skipped."
+            )
+        )
+        self.stdout.write("Run build_renditions to create the thumbnails of new images.")
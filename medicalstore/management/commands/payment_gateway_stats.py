@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from medicalstore.cache_utils import is_shared_cache
+from medicalstore.gateway_utils import gateway_stats, reset_gateway_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the payment gateway call, error and latency counters. They cover every process only "
+        "with a shared CACHE_URL; with the local memory cache they are the ones of this process alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Zero the counters after showing them")
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            self.stderr.write(self.style.WARNING(
+                "The cache is local to this process: these are its own counters, not the web workers' or celery's."
+            ))
+        for call, stats in gateway_stats().items():
+            average = stats['ms'] / stats['calls'] if stats['calls'] else 0
+            error_rate = (stats['errors'] / stats['calls'] * 100) if stats['calls'] else 0
+            self.stdout.write(
+                f"{call:>14}: {stats['calls']} calls, {stats['errors']} errors ({error_rate:.1f}%), "
+                f"avg {average:.0f} ms, {stats['slow']} slow"
+            )
+        if options['reset']:
+            reset_gateway_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
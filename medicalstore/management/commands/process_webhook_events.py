@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from medicalstore.webhook_utils import WEBHOOK_BATCH_SIZE, WEBHOOK_MAX_ATTEMPTS, pending_events, process_event
+
+
+class Command(BaseCommand):
+    help = "Apply stored Razorpay webhook events no task got to, and retry the failed ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=WEBHOOK_BATCH_SIZE, help="Events per run")
+        parser.add_argument('--max-attempts', type=int, default=WEBHOOK_MAX_ATTEMPTS)
+        parser.add_argument('--older-than', type=int, default=60, help="Seconds a received event is left to its task")
+
+    def handle(self, *args, **options):
+        event_ids = list(
+            pending_events(options['max_attempts'], options['older_than']).values_list('pk', flat=True)[:options['limit']]
+        )
+        if not event_ids:
+            self.stdout.write(self.style.SUCCESS("No webhook events pending."))
+            return
+
+        results = {}
+        for event_pk in event_ids:
+            status = process_event(event_pk)
+            results[status] = results.get(status, 0) + 1
+
+        summary = ", ".join(f"{count} {status or 'already done'}" for status, count in results.items())
+        style = self.style.WARNING if results.get("failed") else self.style.SUCCESS
+        self.stdout.write(style(f"{len(event_ids)} webhook events: {summary}."))
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from medicalstore.related_utils import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = "Re-rank the related products of every category (run on a schedule, sales are only counted here)"
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        categories, changed = rebuild_related_products()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Related products ranked for {categories} categories ({changed} changed) in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,16 @@
+import time
+from django.core.management.base import BaseCommand
+from medicalstore.search_utils import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product search index from all products"
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        indexed = rebuild_index()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Search index rebuilt for {indexed} products in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from medicalstore.gateway_utils import PaymentGatewayError
+from medicalstore.reconcile_utils import RECONCILE_LOOKBACK, RECONCILE_PAGE_SIZE, RECONCILE_WINDOW, reconcile_payments
+
+
+class Command(BaseCommand):
+    help = "Match the gateway's recent payments to orders, capture paid orders and release failed ones (run every minute)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookback', type=int, default=RECONCILE_LOOKBACK, help="Seconds before the checkpoint read again")
+        parser.add_argument('--window', type=int, default=RECONCILE_WINDOW, help="Seconds of gateway history per chunk")
+        parser.add_argument('--page-size', type=int, default=RECONCILE_PAGE_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            run = reconcile_payments(window=options['window'], lookback=options['lookback'], page_size=options['page_size'])
+        except PaymentGatewayError as error:
+            # the finished windows are checkpointed, the next run carries on from there
+            raise CommandError(f"Gateway call failed: {error}")
+
+        if run is None:
+            self.stdout.write(self.style.WARNING("Another reconciliation is running."))
+            return
+
+        self.stdout.write(
+            f"Reconciled {run.window_from:%Y-%m-%d %H:%M:%S} - {run.checkpoint:%Y-%m-%d %H:%M:%S} in {run.seconds:.2f}s: "
+            f"{run.payments_seen} payments seen, {run.payments_saved} saved."
+        )
+        style = self.style.WARNING if run.orders_captured or run.orders_released else self.style.SUCCESS
+        self.stdout.write(style(f"{run.orders_captured} orders captured, {run.orders_released} released."))
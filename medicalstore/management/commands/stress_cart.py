@@ -0,0 +1,91 @@
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from medicalstore.models import Cart, Cart_Item, Product, User_detail
+from medicalstore.reservation_utils import available_quantities
+from medicalstore.management.commands.benchmark_catalog_api import default_host
+
+
+STRESS_USER_EMAIL = 'stress-cart@example.invalid'
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire parallel add to cart / increase quantity requests for one product and check the cart "
+        "ends with exactly one line holding min(available units, requests) units. Run against a staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, help="Product id, default the first product in stock")
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=25, help="Requests per thread")
+        parser.add_argument('--host', default=None)
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(available_stock__gt=0)
+        if options['product']:
+            products = products.filter(id=options['product'])
+        product = products.order_by('id').first()
+        if product is None:
+            raise CommandError("No product in stock to add.")
+        # units held by unpaid checkouts cannot go in the cart
+        available = available_quantities([product.pk])[product.pk]
+
+        # a login-less user of its own, so no real cart is touched
+        user = User_detail.objects.filter(email=STRESS_USER_EMAIL).first()
+        if user is None:
+            user = User_detail(name='Cart stress test', email=STRESS_USER_EMAIL)
+            user.set_unusable_password()
+            user.save()
+        Cart.objects.filter(user=user).delete()
+
+        host = options['host'] or default_host()
+        add_url = f"{reverse('add_to_cart', args=[product.id])}?next=/"
+        increase_url = reverse('increase_item_qty_in_cart', args=[product.id])
+        errors = []
+        start = threading.Barrier(options['threads'])
+
+        def worker(number):
+            client = Client(HTTP_HOST=host)
+            client.force_login(user)
+            start.wait()
+            try:
+                for request in range(options['requests']):
+                    # odd threads race the insert path, even ones the conditional increment
+                    if number % 2 or request == 0:
+                        response = client.get(add_url)
+                    else:
+                        response = client.post(increase_url)
+                    if response.status_code != 302:
+                        errors.append(f"thread {number}: status {response.status_code}")
+            except Exception as error:
+                errors.append(f"thread {number}: {error!r}")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(number,)) for number in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = options['threads'] * options['requests']
+        lines = list(Cart_Item.objects.filter(cart__user=user, product=product).values_list('quantity', flat=True))
+        expected = min(available, attempts)
+        Cart.objects.filter(user=user).delete()
+
+        self.stdout.write(
+            f"{attempts} requests from {options['threads']} threads in {elapsed:.2f}s, "
+            f"{available} available: lines {lines}, expected one line of {expected}"
+        )
+        for error in errors[:10]:
+            self.stderr.write(error)
+        if errors or lines != ([expected] if expected else []):
+            raise CommandError("Cart state is inconsistent.")
+        self.stdout.write(self.style.SUCCESS("Cart stayed consistent."))
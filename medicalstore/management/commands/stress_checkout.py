@@ -0,0 +1,99 @@
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from medicalstore.checkout_utils import OutOfStock, place_order
+from medicalstore.models import Cart, Cart_Item, Order, Product, User_detail
+from medicalstore.pricing_utils import price_cart
+from medicalstore.reservation_utils import available_quantities, held_quantities
+
+
+STRESS_USER_EMAIL = 'stress-checkout-{}@example.invalid'
+
+
+
+class Command(BaseCommand):
+    help = (
+        "Check out one product from many carts in parallel (no payment gateway call) and check "
+        "no unit is reserved twice: the held units equal the ordered units and never exceed the "
+        "available units. The orders are deleted afterwards. Run against a staging database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, help="Product id, default the first product in stock")
+        parser.add_argument('--threads', type=int, default=16, help="Parallel checkouts, one user each")
+        parser.add_argument('--quantity', type=int, default=1, help="Units in every cart")
+
+    def handle(self, *args, **options):
+        products = Product.objects.select_related('category').filter(available_stock__gt=0)
+        if options['product']:
+            products = products.filter(id=options['product'])
+        product = products.order_by('id').first()
+        if product is None:
+            raise CommandError("No product in stock to check out.")
+        available = available_quantities([product.pk])[product.pk]
+        held_before = held_quantities([product.pk]).get(product.pk, 0)
+
+        # login-less users of their own, one cart each
+        users = []
+        for number in range(options['threads']):
+            email = STRESS_USER_EMAIL.format(number)
+            user = User_detail.objects.filter(email=email).first()
+            if user is None:
+                user = User_detail(name=f'Checkout stress test {number}', email=email)
+                user.set_unusable_password()
+                user.save()
+            Cart.objects.filter(user=user).delete()
+            cart = Cart.objects.create(user=user)
+            Cart_Item.objects.bulk_create([Cart_Item(cart=cart, product=product, quantity=options['quantity'])])
+            users.append(user)
+
+        placed, short, errors = [], [], []
+        start = threading.Barrier(options['threads'])
+        shipping = {
+            'firstname': 'Stress', 'email': 'stress@example.invalid', 'phone': '0000000000',
+            'address': '-', 'city': '-', 'state': '-', 'pincode': '000000',
+        }
+
+        def worker(number, user):
+            try:
+                cart_items = Cart_Item.objects.select_related('product__category').filter(cart__user=user)
+                pricing = price_cart(user)
+                start.wait()
+                order = place_order(
+                    user, cart_items, pricing, shipping, f"STRESS-{number}-{time.time_ns()}", f"RCT-STRESS-{number}",
+                )
+                placed.append(order.pk)
+            except OutOfStock:
+                short.append(number)
+            except Exception as error:
+                errors.append(f"checkout {number}: {error!r}")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(number, user)) for number, user in enumerate(users)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        held = held_quantities([product.pk]).get(product.pk, 0) - held_before
+        remaining = available_quantities([product.pk])[product.pk]
+        ordered = len(placed) * options['quantity']
+        expected_orders = min(options['threads'], available // options['quantity'])
+
+        # revert: the stress orders go, and their holds with them
+        Order.objects.filter(pk__in=placed).delete()
+        Cart.objects.filter(user__in=users).delete()
+
+        self.stdout.write(
+            f"{options['threads']} checkouts of {options['quantity']} x '{product.product_name}' in {elapsed:.2f}s, "
+            f"{available} available: {len(placed)} placed, {len(short)} out of stock, {held} held, {remaining} left"
+        )
+        for error in errors[:10]:
+            self.stderr.write(error)
+        if errors or held != ordered or held + remaining != available or len(placed) != expected_orders:
+            raise CommandError(f"Stock is inconsistent, expected {expected_orders} orders.")
+        self.stdout.write(self.style.SUCCESS("No unit was reserved twice."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from medicalstore.sales_utils import update_featured_tags
+
+
+class Command(BaseCommand):
+    help = "Roll up daily sales and tag Bestseller / New products (run daily)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Roll up the whole order history again")
+
+    def handle(self, *args, **options):
+        run = update_featured_tags(full_rollup=options['full'])
+
+        self.stdout.write(f"Rolled up {run.days_rolled_up} days in {run.rollup_seconds:.2f}s.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Tagged {run.bestsellers} bestsellers and {run.new_products} new products, "
+                f"untagged {run.untagged} in {run.tagging_seconds:.2f}s."
+            )
+        )
@@ -0,0 +1,57 @@
+import hashlib
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+
+# A stored file name never changes its URL (a new upload gets a new name),
+# so resolved URLs can be kept for a long time without invalidation.
+MEDIA_URL_KEY = 'media_url:{}'
+MEDIA_URL_TIMEOUT = 60 * 60 * 24 * 30
+MAX_LOCAL_URLS = 10000
+
+# per process memo in front of the shared cache
+_local_urls = {}
+
+
+
+def _key(name):
+    return MEDIA_URL_KEY.format(hashlib.md5(name.encode()).hexdigest())
+
+
+
+def _remember_local(name, url):
+    if len(_local_urls) >= MAX_LOCAL_URLS:
+        _local_urls.clear()
+    _local_urls[name] = url
+
+
+
+def url_for_name(name, storage=default_storage):
+    """Public URL of a stored file name, built by the storage backend only once per name."""
+    if not name:
+        return ''
+    url = _local_urls.get(name)
+    if url is None:
+        url = cache.get(_key(name))
+        if url is None:
+            url = storage.url(name)
+            cache.set(_key(name), url, MEDIA_URL_TIMEOUT)
+        _remember_local(name, url)
+    return url
+
+
+
+def media_url(field_file):
+    """Cached field_file.url"""
+    if not field_file:
+        return ''
+    return url_for_name(field_file.name, field_file.storage)
+
+
+
+def remember_media_urls(field_files):
+    """Resolve and cache the URLs of freshly saved files, so the first page render finds them ready."""
+    urls = {field_file.name: field_file.storage.url(field_file.name) for field_file in field_files if field_file}
+    cache.set_many({_key(name): url for name, url in urls.items()}, MEDIA_URL_TIMEOUT)
+    for name, url in urls.items():
+        _remember_local(name, url)
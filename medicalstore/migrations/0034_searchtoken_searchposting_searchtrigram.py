@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0033_alter_product_product_name_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=50, unique=True)),
+                ('trigram_count', models.PositiveSmallIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='searchposting', to='medicalstore.product')),
+                ('token', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='posting', to='medicalstore.searchtoken')),
+            ],
+            options={
+                'unique_together': {('token', 'product')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(db_index=True, max_length=3)),
+                ('token', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigram', to='medicalstore.searchtoken')),
+            ],
+            options={
+                'unique_together': {('trigram', 'token')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:13
+
+from decimal import Decimal, ROUND_CEILING
+from django.db import migrations, models
+
+
+def fill_selling_price(apps, schema_editor):
+    # same rule as Product.discounted_price, historical models have no custom methods
+    Product = apps.get_model('medicalstore', 'Product')
+    batch = []
+    for product in Product.objects.only('id', 'product_price', 'discount').iterator(chunk_size=500):
+        price = Decimal(str(product.product_price))
+        if product.discount and product.discount > 0:
+            price = price - (price * Decimal(str(product.discount)) / Decimal("100"))
+        product.selling_price = price.quantize(Decimal("0.01"), rounding=ROUND_CEILING)
+        batch.append(product)
+        if len(batch) == 500:
+            Product.objects.bulk_update(batch, ['selling_price'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['selling_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0034_searchtoken_searchposting_searchtrigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='selling_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, help_text='Price after discount. Auto-calculated from product price and discount.', max_digits=10),
+        ),
+        migrations.RunPython(fill_selling_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_rating_summaries(apps, schema_editor):
+    # every product with enabled reviews gets its histogram, the rest read as empty until their first review
+    Review = apps.get_model('medicalstore', 'Review')
+    RatingSummary = apps.get_model('medicalstore', 'RatingSummary')
+    rows = Review.objects.filter(disable=False).values('product_id').annotate(
+        rating_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+    )
+    RatingSummary.objects.bulk_create([RatingSummary(**row) for row in rows], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0036_order_order_expiry_scan_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ratingsummary', serialize=False, to='medicalstore.product')),
+                ('rating1', models.PositiveIntegerField(default=0)),
+                ('rating2', models.PositiveIntegerField(default=0)),
+                ('rating3', models.PositiveIntegerField(default=0)),
+                ('rating4', models.PositiveIntegerField(default=0)),
+                ('rating5', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_rating_summaries, migrations.RunPython.noop),
+    ]
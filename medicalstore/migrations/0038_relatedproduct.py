@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_related_products(apps, schema_editor):
+    # same ranking as related_utils.rank_category with the default limit of 8
+    Category = apps.get_model('medicalstore', 'Category')
+    Product = apps.get_model('medicalstore', 'Product')
+    RelatedProduct = apps.get_model('medicalstore', 'RelatedProduct')
+    rows = []
+    for category_id in Category.objects.values_list('id', flat=True):
+        ranking = (
+            Product.objects.filter(category_id=category_id, available_stock__gt=0)
+            .annotate(units_sold=Coalesce(Sum('orderitem__quantity', filter=Q(orderitem__order__status='paid')), Value(0)))
+            .order_by('-rating', '-units_sold', '-created_at', '-id')
+            .values_list('id', 'units_sold')[:9]
+        )
+        rows.extend(
+            RelatedProduct(category_id=category_id, product_id=product_id, rank=rank, units_sold=units_sold)
+            for rank, (product_id, units_sold) in enumerate(ranking)
+        )
+    RelatedProduct.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0037_ratingsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relatedproduct', to='medicalstore.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relatedproduct', to='medicalstore.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'rank'], name='related_cat_rank_idx')],
+                'unique_together': {('category', 'product')},
+            },
+        ),
+        migrations.RunPython(fill_related_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0038_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoPurchase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('orders', models.PositiveIntegerField(help_text='Paid orders containing both products.')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='copurchase', to='medicalstore.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='medicalstore.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'rank'], name='copurchase_product_rank_idx')],
+                'unique_together': {('product', 'recommended')},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:39
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicates(apps, schema_editor):
+    # extra carts of a user move their lines into the oldest cart, then every product's
+    # lines are merged into its oldest line with the summed quantity, capped at the stock
+    Cart = apps.get_model('medicalstore', 'Cart')
+    Cart_Item = apps.get_model('medicalstore', 'Cart_Item')
+    Product = apps.get_model('medicalstore', 'Product')
+
+    duplicate_carts = Cart.objects.values('user_id').annotate(carts=Count('id'), keep=Min('id')).filter(carts__gt=1)
+    for row in duplicate_carts:
+        extra = Cart.objects.filter(user_id=row['user_id']).exclude(id=row['keep'])
+        Cart_Item.objects.filter(cart__in=extra).update(cart_id=row['keep'])
+        extra.delete()
+
+    duplicate_lines = (
+        Cart_Item.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), quantity=Sum('quantity'), keep=Min('id'))
+        .filter(lines__gt=1)
+    )
+    for row in duplicate_lines:
+        stock = Product.objects.filter(id=row['product_id']).values_list('available_stock', flat=True).first() or 0
+        Cart_Item.objects.filter(id=row['keep']).update(quantity=max(1, min(row['quantity'], stock)))
+        Cart_Item.objects.filter(cart_id=row['cart_id'], product_id=row['product_id']).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0042_category_updated_at_product_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='cart_item',
+            unique_together={('cart', 'product')},
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(fields=('user',), name='unique_cart_per_user'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:49
+
+import django.db.models.deletion
+from datetime import timedelta
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def hold_unpaid_orders(apps, schema_editor):
+    # unpaid orders took their stock at checkout, their units go back on the shelf as
+    # holds expiring one hold period after the order was placed
+    Order = apps.get_model('medicalstore', 'Order')
+    OrderItem = apps.get_model('medicalstore', 'OrderItem')
+    Product = apps.get_model('medicalstore', 'Product')
+    StockHold = apps.get_model('medicalstore', 'StockHold')
+    ttl = timedelta(seconds=getattr(settings, 'STOCK_HOLD_TTL', 15 * 60))
+
+    unpaid = Order.objects.filter(status="created", order_payment_status="pending")
+    items = OrderItem.objects.filter(order__in=unpaid, product__isnull=False).select_related('order')
+    holds = []
+    for item in items.iterator():
+        Product.objects.filter(pk=item.product_id).update(available_stock=F('available_stock') + item.quantity)
+        holds.append(StockHold(
+            order_id=item.order_id, product_id=item.product_id, quantity=item.quantity,
+            expires_at=item.order.created_at + ttl,
+        ))
+    StockHold.objects.bulk_create(holds, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0043_merge_duplicate_cart_lines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stockholds', to='medicalstore.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stockholds', to='medicalstore.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'expires_at', 'quantity'], name='stockhold_product_active_idx'), models.Index(fields=['expires_at'], name='stockhold_expiry_idx')],
+            },
+        ),
+        migrations.RunPython(hold_unpaid_orders, migrations.RunPython.noop),
+    ]
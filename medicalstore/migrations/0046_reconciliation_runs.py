@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0045_webhook_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('window_from', models.DateTimeField()),
+                ('checkpoint', models.DateTimeField(help_text='Gateway history is reconciled up to here')),
+                ('payments_seen', models.PositiveIntegerField(default=0)),
+                ('payments_saved', models.PositiveIntegerField(default=0)),
+                ('orders_captured', models.PositiveIntegerField(default=0)),
+                ('orders_released', models.PositiveIntegerField(default=0)),
+                ('seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['checkpoint'], name='reconciliationrun_ckpt_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0046_reconciliation_runs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_shortfall',
+            field=models.JSONField(blank=True, help_text='{product id: units paid for but not in stock at capture}, to refund or restock by hand', null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medicalstore', '0049_catalog_updated_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationLock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('holder', models.CharField(blank=True, max_length=32)),
+                ('locked_until', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -6,6 +6,7 @@ from datetime import timedelta
 from django.utils import timezone
 from django.utils.html import format_html
 from django.templatetags.static import static
+from .media_utils import media_url
 
 
 
@@ -51,6 +52,7 @@ class User_detail(AbstractBaseUser, PermissionsMixin):
     ]
 
     user_profile_picture = models.ImageField( null=True, blank=True, upload_to=user_image_upload_path)
+    user_profile_picture_renditions = models.JSONField(default=dict, blank=True, editable=False)
     name = models.CharField(max_length=50,null=False, blank=False)
     phone = models.CharField(max_length=10, unique=True, null=True, blank=True)
     email = models.EmailField(unique=True, null=False, blank=False)
@@ -84,7 +86,7 @@ class User_detail(AbstractBaseUser, PermissionsMixin):
     @property
     def profile_picture_url(self):
         if self.user_profile_picture and self.user_profile_picture.name:
-            return self.user_profile_picture.url
+            return media_url(self.user_profile_picture)
         return static('images/user_image_default.png')
         
 
@@ -100,9 +102,17 @@ class Category(models.Model):
     ]
     category_name = models.CharField(max_length=50,null=False, blank=False,unique=True)
     category_image = models.ImageField(upload_to='Categories_images/',null=False, blank=False)
+    category_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     category_image_altername = models.CharField(max_length=50, null=False, blank=False)
     category_background_color = models.CharField(max_length=30,choices=COLOR_CHOICES,null=False, blank=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # newest change, part of the catalog page validators
+            models.Index(fields=['updated_at'], name='category_updated_idx'),
+        ]
 
     def __str__(self):
         return self.category_name
@@ -110,6 +120,56 @@ class Category(models.Model):
     
 
 
+class ProductQuerySet(models.QuerySet):
+    """
+    Keeps the stored selling_price in sync for writes that skip Product.save()
+    (admin bulk edits, queryset.update(), bulk_create and bulk_update).
+    queryset.update() also stamps updated_at like a save would.
+    """
+    PRICE_FIELDS = {'product_price', 'discount'}
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        if not self.PRICE_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+
+        # filters may stop matching after the update, so collect the rows first
+        pks = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        self.model.objects.filter(pk__in=pks).refresh_selling_prices()
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.selling_price = obj.discounted_price
+        update_fields = kwargs.get('update_fields')
+        if update_fields and self.PRICE_FIELDS.intersection(update_fields):
+            kwargs['update_fields'] = list(update_fields) + ['selling_price']
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if self.PRICE_FIELDS.intersection(fields):
+            objs = list(objs)
+            for obj in objs:
+                obj.selling_price = obj.discounted_price
+            fields = list(fields) + ['selling_price']
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def refresh_selling_prices(self, batch_size=500):
+        """Recompute selling_price of the matched products in batches."""
+        batch = []
+        for product in self.only('id', 'product_price', 'discount').iterator(chunk_size=batch_size):
+            product.selling_price = product.discounted_price
+            batch.append(product)
+            if len(batch) == batch_size:
+                self.bulk_update(batch, ['selling_price'])
+                batch = []
+        if batch:
+            self.bulk_update(batch, ['selling_price'])
+
+
+
 def product_image_upload_path(instance, filename):
     from django.utils.text import slugify
     product_name = slugify(instance.product_name)
@@ -127,6 +187,7 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE,related_name="product")
     product_name = models.CharField(max_length=200,null=False, blank=False,unique=True)
     product_main_image = models.ImageField(upload_to=product_image_upload_path, null=False, blank=False)
+    product_main_image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     product_image1 = models.ImageField(upload_to=product_image_upload_path, null=True, blank=True)
     product_image2 = models.ImageField(upload_to=product_image_upload_path, null=True, blank=True)
     product_image3 = models.ImageField(upload_to=product_image_upload_path, null=True, blank=True)
@@ -146,11 +207,54 @@ class Product(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(5)],
         help_text="Leave empty when adding products. It will auto-calculate."
     )
+    selling_price = models.DecimalField(
+        decimal_places=2, max_digits=10, default=0, editable=False, db_index=True,
+        help_text="Price after discount. Auto-calculated from product price and discount."
+    )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # listing sorts (see pagination_utils.SORT_KEYS) with and without a category filter
+        # and the home page featured filter. InnoDB appends the primary key to every
+        # secondary index, so each one also serves the "id" tie-breaker of the keyset order.
+        indexes = [
+            models.Index(fields=['created_at'], name='product_created_idx'),
+            models.Index(fields=['discount'], name='product_discount_idx'),
+            models.Index(fields=['category', 'created_at'], name='product_cat_created_idx'),
+            models.Index(fields=['category', 'selling_price'], name='product_cat_price_idx'),
+            models.Index(fields=['category', 'discount'], name='product_cat_discount_idx'),
+            models.Index(fields=['featured_option'], name='product_featured_idx'),
+            # newest change, part of the catalog page validators
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ]
 
 
     def __str__(self):
         return f"{self.product_name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # whether the product was in stock when loaded, a stock save that keeps it
+        # on the same side of zero cannot change the related products ranking
+        if 'available_stock' in field_names:
+            instance._loaded_in_stock = values[field_names.index('available_stock')] > 0
+        return instance
+
+    def save(self, *args, **kwargs):
+        # store the effective price so listings can sort on an indexed column
+        self.selling_price = self.discounted_price
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # partial saves (stock changes) still count as an update
+            update_fields = set(update_fields) | {'updated_at'}
+            if ProductQuerySet.PRICE_FIELDS.intersection(update_fields):
+                update_fields.add('selling_price')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
     
     @property
     def discounted_price(self):
@@ -187,9 +291,90 @@ class Review(models.Model):
     class Meta:
         unique_together = ('product', 'user')  
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # rating this review currently contributes to the product's RatingSummary (None = not counted)
+        loaded = dict(zip(field_names, values))
+        if 'rating' in loaded and 'disable' in loaded:
+            instance._counted_rating = None if loaded['disable'] else loaded['rating']
+        return instance
+
     def save(self, *args, **kwargs):
         self.rating_label = self.RATING_LABELS.get(self.rating, '')
         super().save(*args, **kwargs)
+
+
+
+class RatingSummary(models.Model):
+    """Star histogram of a product's enabled reviews, kept up to date on every review change."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='ratingsummary')
+    rating1 = models.PositiveIntegerField(default=0)
+    rating2 = models.PositiveIntegerField(default=0)
+    rating3 = models.PositiveIntegerField(default=0)
+    rating4 = models.PositiveIntegerField(default=0)
+    rating5 = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product} - {self.average:.1f} ({self.rating_count})"
+
+    @property
+    def average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else 0
+
+    @property
+    def histogram(self):
+        histogram = {f'rating{star}': getattr(self, f'rating{star}') for star in range(1, 6)}
+        histogram['total'] = self.rating_count
+        return histogram
+
+    @property
+    def percentages(self):
+        return {
+            star: (getattr(self, f'rating{star}') / self.rating_count * 100) if self.rating_count else 0
+            for star in range(1, 6)
+        }
+
+
+
+class RelatedProduct(models.Model):
+    """
+    Ranked in stock products of a category, best rated then best selling first.
+    A product's related strip is its category's list without itself, see related_utils.
+    """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='relatedproduct')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='relatedproduct')
+    rank = models.PositiveSmallIntegerField()
+    units_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('category', 'product')
+        indexes = [
+            models.Index(fields=['category', 'rank'], name='related_cat_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} #{self.rank} - {self.product}"
+
+
+
+class CoPurchase(models.Model):
+    """Top products ordered together with a product in paid orders, rebuilt by build_recommendations."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='copurchase')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    orders = models.PositiveIntegerField(help_text="Paid orders containing both products.")
+
+    class Meta:
+        unique_together = ('product', 'recommended')
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='copurchase_product_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product} + {self.recommended} ({self.orders})"
         
     
         
@@ -218,6 +403,10 @@ class Cart(models.Model):
     user = models.ForeignKey(User_detail, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # one cart per user, concurrent get_or_create calls can't create a second one
+        constraints = [models.UniqueConstraint(fields=['user'], name='unique_cart_per_user')]
+
     def __str__(self):
         return f"Cart ({self.user.name})"
     
@@ -229,6 +418,10 @@ class Cart_Item(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="cartitem")
     quantity = models.PositiveIntegerField(blank=False, null=False, default=1)
 
+    class Meta:
+        # one line per product, see cart_utils for the atomic upserts
+        unique_together = ('cart', 'product')
+
     def __str__(self):
         return f"{self.product.product_name} x {self.quantity}"
 
@@ -238,8 +431,7 @@ class Cart_Item(models.Model):
     
     @property
     def get_total_discount_price(self):
-        discount_amount = (self.product.discount or 0) / 100 * self.product.product_price
-        return self.quantity * (self.product.product_price - discount_amount)
+        return self.quantity * self.product.selling_price
     
 
 
@@ -282,6 +474,18 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     order_payment_status=models.CharField(max_length=20, choices=ORDER_PAYMENT_STATUS, default="pending")
+    stock_shortfall = models.JSONField(
+        null=True, blank=True,
+        help_text="{product id: units paid for but not in stock at capture}, to refund or restock by hand",
+    )
+
+    class Meta:
+        indexes = [
+            # unpaid orders: status="created", order_payment_status="pending", by created_at
+            models.Index(fields=['status', 'order_payment_status', 'created_at'], name='order_expiry_scan_idx'),
+            # daily sales rollup: status="paid", created_at in [day, day + 1)
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
 
     def __str__(self): 
         return f"{self.order_number}"
@@ -379,6 +583,30 @@ class OrderItem(models.Model):
 
 
 
+class StockHold(models.Model):
+    """
+    Units of a product reserved for an unpaid order until expires_at. Available stock is
+    available_stock minus the active holds, the stock itself only drops on capture.
+    """
+    order = models.ForeignKey(Order, related_name="stockholds", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="stockholds", on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # active holds of a product: SUM(quantity) read from the index alone
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='stockhold_product_active_idx'),
+            # the expiry sweep
+            models.Index(fields=['expires_at'], name='stockhold_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.order} - {self.product} x {self.quantity}"
+
+
+
 class Payment(models.Model):
     order = models.OneToOneField(Order, related_name="payment", on_delete=models.CASCADE)
     razorpay_payment_id = models.CharField(max_length=100, unique=True)
@@ -406,6 +634,158 @@ class Payment(models.Model):
     
 
 
+class WebhookEvent(models.Model):
+    """
+    A Razorpay webhook delivery, stored before it is processed. Razorpay retries deliveries,
+    the unique event_id turns a repeated delivery into a no-op.
+    """
+    STATUS_CHOICES = [
+        ("received", "Received"),
+        ("processed", "Processed"),
+        ("ignored", "Ignored"),
+        ("failed", "Failed"),
+    ]
+
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="received")
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the retry sweep: events still received or failed, oldest first
+            models.Index(fields=['status', 'created_at'], name='webhookevent_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.event_id}"
+
+
+
+class ReconciliationRun(models.Model):
+    """
+    One payment reconciliation run: the gateway history it covered and what it fixed.
+    The latest checkpoint is where the next run starts (less a lookback).
+    """
+    started_at = models.DateTimeField(auto_now_add=True)
+    window_from = models.DateTimeField()
+    checkpoint = models.DateTimeField(help_text="Gateway history is reconciled up to here")
+    payments_seen = models.PositiveIntegerField(default=0)
+    payments_saved = models.PositiveIntegerField(default=0)
+    orders_captured = models.PositiveIntegerField(default=0)
+    orders_released = models.PositiveIntegerField(default=0)
+    seconds = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['checkpoint'], name='reconciliationrun_ckpt_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.started_at:%Y-%m-%d %H:%M} ({self.window_from:%H:%M} - {self.checkpoint:%H:%M})"
+
+
+
+class ReconciliationLock(models.Model):
+    """
+    A single row, the lease of the running payment reconciliation. A run takes it with a
+    conditional UPDATE and renews it after every window, a crashed run's lease runs out.
+    """
+    holder = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.holder or 'free'} until {self.locked_until:%Y-%m-%d %H:%M:%S}"
+
+
+
+class DailyProductSales(models.Model):
+    """Units of a product sold in paid orders on one day, rolled up by update_featured_tags."""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='dailysales')
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'product')
+
+    def __str__(self):
+        return f"{self.day} - {self.product} x {self.quantity}"
+
+
+
+class CatalogVersion(models.Model):
+    """
+    A single row, bumped by every catalog change. Cached catalog entries and page ETags follow
+    its version, and the database is what every worker, celery task and command shares.
+    """
+    version = models.PositiveBigIntegerField()
+    modified = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.version} ({self.modified:%Y-%m-%d %H:%M:%S})"
+
+
+
+class FeaturedTagRun(models.Model):
+    """Timings and results of one automatic Bestseller / New tagging run."""
+    started_at = models.DateTimeField(auto_now_add=True)
+    days_rolled_up = models.PositiveIntegerField(default=0)
+    rollup_seconds = models.FloatField(default=0)
+    tagging_seconds = models.FloatField(default=0)
+    bestsellers = models.PositiveIntegerField(default=0)
+    new_products = models.PositiveIntegerField(default=0)
+    untagged = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.started_at:%Y-%m-%d %H:%M} ({self.rollup_seconds + self.tagging_seconds:.2f}s)"
+
+
+
+class SearchToken(models.Model):
+    """Vocabulary of the product search index."""
+    token = models.CharField(max_length=50, unique=True)
+    trigram_count = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return self.token
+
+
+
+class SearchTrigram(models.Model):
+    """Trigrams of every vocabulary token, used to find tokens close to a misspelt query word."""
+    trigram = models.CharField(max_length=3, db_index=True)
+    token = models.ForeignKey(SearchToken, on_delete=models.CASCADE, related_name="trigram")
+
+    def __str__(self):
+        return f"{self.trigram} - {self.token}"
+
+    class Meta:
+        unique_together = ('trigram', 'token')
+
+
+
+class SearchPosting(models.Model):
+    """Inverted index entry - which products contain a token and how strongly (field weight)."""
+    token = models.ForeignKey(SearchToken, on_delete=models.CASCADE, related_name="posting")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="searchposting")
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.token} - {self.product} ({self.weight})"
+
+    class Meta:
+        unique_together = ('token', 'product')
+
+
+
 class Contact_Us_Message(models.Model):
     name = models.CharField(max_length=100, blank=False, null=False)
     email = models.EmailField(null=False, blank=False)
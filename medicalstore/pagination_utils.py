@@ -0,0 +1,121 @@
+from decimal import Decimal
+from django.core import signing
+from django.db.models import Q, F
+from django.utils.dateparse import parse_datetime
+
+
+PRODUCTS_PAGE_SIZE = 24
+CURSOR_SALT = "medicalstore.products_cursor"
+
+# sort option -> (sort key, descending)
+# every ordering ends with the product id so the sort order is total and a cursor
+# always points at exactly one row, even when new products share the same key.
+# Keys are plain columns so each sort can walk one of the Product indexes.
+SORT_KEYS = {
+    'recommended': ('created_at', True),
+    'price_low_to_high': ('selling_price', False),
+    'price_high_to_low': ('selling_price', True),
+    'offer_low_to_high': ('discount', False),
+    'offer_high_to_low': ('discount', True),
+}
+
+# discount is nullable, products without an offer rank below every discount
+NULLABLE_SORT_KEYS = {'discount'}
+
+
+
+def get_sort_key(sort_option):
+    return SORT_KEYS.get(sort_option, SORT_KEYS['recommended'])
+
+
+
+def order_products(products, sort_option):
+    """Order products for the given sort option, NULL keys count as the lowest value."""
+    key, descending = get_sort_key(sort_option)
+    if descending:
+        return products.order_by(F(key).desc(nulls_last=True), F('id').desc())
+    return products.order_by(F(key).asc(nulls_first=True), F('id').asc())
+
+
+
+def encode_cursor(sort_option, product):
+    """Cursor after the given product, a model instance or a values() row with the sort key and id."""
+    key, _ = get_sort_key(sort_option)
+    if isinstance(product, dict):
+        value, product_id = product[key], product['id']
+    else:
+        value, product_id = getattr(product, key), product.id
+    if value is not None:
+        value = value.isoformat() if key == 'created_at' else str(value)
+    return signing.dumps({'sort': sort_option, 'key': value, 'id': product_id}, salt=CURSOR_SALT, compress=True)
+
+
+
+def decode_cursor(cursor, sort_option):
+    """
+    Returns (key value, product id) of the last row of the previous page.
+    Tampered, expired or other-sort cursors give None so the listing restarts from the first page.
+    """
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+        if data.get('sort') != sort_option:
+            return None
+        key, _ = get_sort_key(sort_option)
+        value = data['key']
+        if value is None:
+            if key not in NULLABLE_SORT_KEYS:
+                return None
+        elif key == 'created_at':
+            value = parse_datetime(value)
+            if value is None:
+                return None
+        else:
+            value = Decimal(value)
+        return value, int(data['id'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+
+def after_position(key, descending, value, last_id):
+    """Q matching the rows that come after (value, last_id) in the listing order."""
+    lookup = 'lt' if descending else 'gt'
+    if value is None:
+        # NULL keys are the lowest: first rows ascending, last rows descending
+        after = Q(**{f'{key}__isnull': True, f'id__{lookup}': last_id})
+        if not descending:
+            after |= Q(**{f'{key}__isnull': False})
+        return after
+
+    after = Q(**{f'{key}__{lookup}': value}) | Q(**{key: value, f'id__{lookup}': last_id})
+    if descending and key in NULLABLE_SORT_KEYS:
+        after |= Q(**{f'{key}__isnull': True})
+    return after
+
+
+
+def keyset_products(products, sort_option, cursor=None):
+    """The ordered listing queryset starting after the cursor position."""
+    products = order_products(products, sort_option)
+    position = decode_cursor(cursor, sort_option) if cursor else None
+    if position:
+        key, descending = get_sort_key(sort_option)
+        products = products.filter(after_position(key, descending, *position))
+    return products
+
+
+
+def paginate_products(products, sort_option, cursor=None, page_size=PRODUCTS_PAGE_SIZE):
+    """
+    Keyset pagination over the product listing.
+    Returns (products of this page, cursor for the next page or None).
+    Rows are located by their (sort key, id) position instead of an OFFSET,
+    so products inserted while a user scrolls never shift or repeat cards.
+    """
+    page = list(keyset_products(products, sort_option, cursor)[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(sort_option, page[-1])
+
+    return page, next_cursor
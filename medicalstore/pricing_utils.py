@@ -0,0 +1,75 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Cart_Item
+
+
+DELIVERY_CHARGE_BILLVALUE = Decimal("500")
+DELIVERY_AMOUNT = Decimal("100")
+
+ZERO = Decimal("0.00")
+CENT = Decimal("0.01")
+
+_AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+
+
+
+def to_paise(amount_rupees):
+    # safe conversion to paise (int) from rupees
+    return int((Decimal(str(amount_rupees)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+
+def delivery_charge_for(total_amount):
+    """Flat delivery charge below the free delivery bill value (after discount, the amount paid)."""
+    return DELIVERY_AMOUNT if total_amount < DELIVERY_CHARGE_BILLVALUE else ZERO
+
+
+
+class CartPricing:
+    """
+    Totals of a cart, or of one of its lines (buy now). bill_amount is at list price,
+    total_amount at the stored selling_price (Product.discounted_price, rounded once per unit).
+    """
+
+    def __init__(self, lines=0, quantity=0, bill_amount=ZERO, total_amount=ZERO):
+        self.lines = lines
+        self.quantity = quantity
+        self.bill_amount = bill_amount.quantize(CENT)
+        self.total_amount = total_amount.quantize(CENT)
+        self.discount_amount = self.bill_amount - self.total_amount
+        self.delivery_charge = delivery_charge_for(self.total_amount) if lines else ZERO
+        self.final_amount = self.total_amount + self.delivery_charge
+        self.final_amount_paise = to_paise(self.final_amount)
+
+    def __bool__(self):
+        return bool(self.lines)
+
+    def __repr__(self):
+        return f"<CartPricing lines={self.lines} final_amount={self.final_amount}>"
+
+
+
+def price_cart(user, cart_item_id=None):
+    """Price the user's cart lines with one aggregate query (no rows are loaded)."""
+    cart_items = Cart_Item.objects.filter(cart__user=user)
+    if cart_item_id is not None:
+        cart_items = cart_items.filter(id=cart_item_id)
+    totals = cart_items.aggregate(
+        line_count=Count('id'),
+        unit_count=Coalesce(Sum('quantity'), 0),
+        list_total=Coalesce(Sum(F('quantity') * F('product__product_price'), output_field=_AMOUNT), Value(ZERO), output_field=_AMOUNT),
+        selling_total=Coalesce(Sum(F('quantity') * F('product__selling_price'), output_field=_AMOUNT), Value(ZERO), output_field=_AMOUNT),
+    )
+    return CartPricing(totals['line_count'], totals['unit_count'], totals['list_total'], totals['selling_total'])
+
+
+
+def get_cart_pricing(request, cart_item_id=None):
+    """The request's CartPricing, computed once per cart / line and reused by views and templates."""
+    memo = getattr(request, '_cart_pricing', None)
+    if memo is None:
+        memo = request._cart_pricing = {}
+    if cart_item_id not in memo:
+        memo[cart_item_id] = price_cart(request.user, cart_item_id)
+    return memo[cart_item_id]
@@ -0,0 +1,103 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from .models import Product, RatingSummary, Review
+from .db_utils import bulk_upsert
+
+
+BATCH_SIZE = 500
+SUMMARY_FIELDS = ['rating1', 'rating2', 'rating3', 'rating4', 'rating5', 'rating_count', 'rating_sum']
+
+
+
+def rating_summary_for(product):
+    """The product's summary, an empty one when it has no reviews yet. Use select_related('ratingsummary')."""
+    try:
+        return product.ratingsummary
+    except RatingSummary.DoesNotExist:
+        return RatingSummary(product=product)
+
+
+
+def _sync_product_rating(product_id):
+    # Product.rating feeds the star row of the listing cards
+    summary = RatingSummary.objects.filter(product_id=product_id).values('rating_sum', 'rating_count').first()
+    rating = summary['rating_sum'] // summary['rating_count'] if summary and summary['rating_count'] else 0
+    Product.objects.filter(pk=product_id).update(rating=rating)
+
+
+
+def apply_rating_change(product_id, old_rating, new_rating):
+    """
+    Move one review between histogram buckets with a single UPDATE.
+    A rating of None means the review is not counted (new, deleted or disabled).
+    """
+    if old_rating == new_rating:
+        return
+
+    changes = {}
+    if old_rating:
+        changes[f'rating{old_rating}'] = F(f'rating{old_rating}') - 1
+    if new_rating:
+        changes[f'rating{new_rating}'] = F(f'rating{new_rating}') + 1
+
+    count_delta = (1 if new_rating else 0) - (1 if old_rating else 0)
+    sum_delta = (new_rating or 0) - (old_rating or 0)
+    if count_delta:
+        changes['rating_count'] = F('rating_count') + count_delta
+    if sum_delta:
+        changes['rating_sum'] = F('rating_sum') + sum_delta
+
+    with transaction.atomic():
+        RatingSummary.objects.bulk_create([RatingSummary(product_id=product_id)], ignore_conflicts=True)
+        RatingSummary.objects.filter(product_id=product_id).update(**changes)
+        _sync_product_rating(product_id)
+
+
+
+def _summary_rows(product_ids=None):
+    reviews = Review.objects.filter(disable=False)
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+    return reviews.values('product_id').annotate(
+        rating_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating{star}': Count('id', filter=Q(rating=star)) for star in range(1, 6)}
+    )
+
+
+
+def recompute_rating_summary(product_id):
+    """Rebuild one product's summary from its reviews, used when the previous rating of a review is unknown."""
+    row = next(iter(_summary_rows([product_id])), None) or {}
+    summary = RatingSummary(product_id=product_id, **{field: row.get(field) or 0 for field in SUMMARY_FIELDS})
+    with transaction.atomic():
+        bulk_upsert(RatingSummary, [summary], ['product'], SUMMARY_FIELDS)
+        _sync_product_rating(product_id)
+
+
+
+def rebuild_rating_summaries():
+    """Recompute the summary of every product with one aggregate query and batched upserts."""
+    rows = {row['product_id']: row for row in _summary_rows()}
+    summaries = []
+    ratings = {}
+    for product_id in Product.objects.values_list('id', flat=True).iterator(chunk_size=BATCH_SIZE):
+        row = rows.get(product_id, {})
+        summary = RatingSummary(product_id=product_id, **{field: row.get(field) or 0 for field in SUMMARY_FIELDS})
+        summaries.append(summary)
+        ratings[product_id] = summary.rating_sum // summary.rating_count if summary.rating_count else 0
+
+    with transaction.atomic():
+        for start in range(0, len(summaries), BATCH_SIZE):
+            bulk_upsert(RatingSummary, summaries[start:start + BATCH_SIZE], ['product'], SUMMARY_FIELDS)
+
+        # only touch products whose star rating actually changed
+        changed = [
+            Product(id=product_id, rating=rating)
+            for product_id, current in Product.objects.values_list('id', 'rating').iterator(chunk_size=BATCH_SIZE)
+            for rating in [ratings.get(product_id, 0)]
+            if current != rating
+        ]
+        Product.objects.bulk_update(changed, ['rating'], batch_size=BATCH_SIZE)
+
+    return len(summaries), len(changed)
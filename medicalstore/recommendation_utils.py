@@ -0,0 +1,123 @@
+import heapq
+from collections import Counter, defaultdict
+from itertools import combinations, groupby
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import CoPurchase, OrderItem, Product
+from .catalog_cache import bump_catalog_version
+
+
+BATCH_SIZE = 500
+ORDER_ITEM_CHUNK_SIZE = 5000
+# a basket of n products adds n*(n-1)/2 pairs, huge (wholesale) orders say little about "bought together"
+MAX_BASKET_SIZE = 50
+CACHE_KEY = 'bought_together:{}'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+
+def co_purchase_limit():
+    return getattr(settings, 'CO_PURCHASE_LIMIT', 6)
+
+
+
+def paid_baskets(chunk_size=ORDER_ITEM_CHUNK_SIZE):
+    """Distinct product ids of every paid order, streamed order by order."""
+    order_lines = (
+        OrderItem.objects.filter(order__status='paid', product__isnull=False)
+        .order_by('order_id')
+        .values_list('order_id', 'product_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for _, lines in groupby(order_lines, key=lambda line: line[0]):
+        yield sorted({product_id for _, product_id in lines})
+
+
+
+def count_co_purchases(baskets, max_basket_size=MAX_BASKET_SIZE):
+    """
+    Sparse item-item co-occurrence counts as {(a, b): orders} with a < b.
+    Only pairs that were actually bought together take memory, never a products x products matrix.
+    """
+    counts = Counter()
+    for basket in baskets:
+        if 1 < len(basket) <= max_basket_size:
+            counts.update(combinations(basket, 2))
+    return counts
+
+
+
+def top_co_purchases(counts, limit):
+    """{product id: [(other product id, orders), ...]} best first, ties broken by the lower product id."""
+    neighbours = defaultdict(list)
+    for (a, b), orders in counts.items():
+        neighbours[a].append((orders, -b))
+        neighbours[b].append((orders, -a))
+
+    return {
+        product_id: [(-negative_id, orders) for orders, negative_id in heapq.nlargest(limit, candidates)]
+        for product_id, candidates in neighbours.items()
+    }
+
+
+
+def rebuild_co_purchases():
+    """Recount every paid order and replace the stored recommendations. Returns (products, pairs counted)."""
+    counts = count_co_purchases(paid_baskets())
+    top = top_co_purchases(counts, co_purchase_limit())
+
+    cached_ids = set(top) | set(CoPurchase.objects.values_list('product_id', flat=True).distinct())
+    with transaction.atomic():
+        CoPurchase.objects.all().delete()
+        CoPurchase.objects.bulk_create(
+            (
+                CoPurchase(product_id=product_id, recommended_id=recommended_id, rank=rank, orders=orders)
+                for product_id, recommendations in top.items()
+                for rank, (recommended_id, orders) in enumerate(recommendations)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        transaction.on_commit(lambda: cache.delete_many([CACHE_KEY.format(product_id) for product_id in cached_ids]))
+        transaction.on_commit(bump_catalog_version)
+    return len(top), len(counts)
+
+
+
+def _recommended_ids(product_id):
+    key = CACHE_KEY.format(product_id)
+    recommended_ids = cache.get(key)
+    if recommended_ids is None:
+        recommended_ids = list(
+            CoPurchase.objects.filter(product_id=product_id).order_by('rank').values_list('recommended_id', flat=True)
+        )
+        cache.set(key, recommended_ids, CACHE_TIMEOUT)
+    return recommended_ids
+
+
+
+def _in_stock(product_ids):
+    products_by_id = Product.objects.select_related('category').filter(available_stock__gt=0).in_bulk(product_ids)
+    return [products_by_id[product_id] for product_id in product_ids if product_id in products_by_id]
+
+
+
+def get_bought_together(product):
+    """Products most often ordered together with this one."""
+    return _in_stock(_recommended_ids(product.id))
+
+
+
+def get_cart_recommendations(product_ids):
+    """Products most often ordered with the cart's products, not already in the cart."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return []
+
+    scores = Counter()
+    rows = CoPurchase.objects.filter(product_id__in=product_ids).exclude(recommended_id__in=product_ids)
+    for recommended_id, orders in rows.values_list('recommended_id', 'orders'):
+        scores[recommended_id] += orders
+
+    ranked = sorted(scores, key=lambda recommended_id: (-scores[recommended_id], recommended_id))
+    return _in_stock(ranked[:co_purchase_limit()])
@@ -0,0 +1,186 @@
+import logging
+import time
+import uuid
+from datetime import timedelta
+from django.utils import timezone
+from .checkout_utils import capture_order, clear_ordered_items, payment_fields, release_order
+from .db_utils import bulk_upsert
+from .gateway_utils import get_gateway
+from .models import Order, Payment, ReconciliationLock, ReconciliationRun
+
+
+logger = logging.getLogger(__name__)
+
+
+# Catches what the checkout callback and the webhooks missed (tab closed, webhook lost):
+# the gateway's payments are listed page by page, matched to local orders in bulk, the
+# Payment rows upserted in one statement per batch, and orders whose money arrived are
+# captured (failed ones released). History is read in windows from the last checkpoint,
+# so a run every minute only reads the last few minutes, and a run that stops half way
+# resumes from the last finished window. One run at a time, across every worker and host:
+# the run holds a lease on a database row (the cache may be local to the process).
+
+RECONCILE_PAGE_SIZE = 100  # the largest page Razorpay serves
+RECONCILE_WINDOW = 30 * 60  # seconds of gateway history per chunk
+# payments change after they are created (authorized, then captured), recent ones are read again
+RECONCILE_LOOKBACK = 15 * 60
+RECONCILE_MAX_CATCHUP = 3 * 24 * 60 * 60  # first run, or after a long outage
+# the customer may still retry a failed payment in the checkout popup
+RECONCILE_FAILED_GRACE = 5 * 60
+RECONCILE_KEEP_DAYS = 7
+RECONCILE_LOCK_ID = 1
+# renewed after every window, a crashed run holds up the next ones this long at most
+RECONCILE_LOCK_TIMEOUT = 10 * 60
+
+# every column payment_fields fills, the checkout signature is kept
+PAYMENT_UPDATE_FIELDS = list(payment_fields({'id': None}))
+
+
+
+def _unix(moment):
+    return int(moment.timestamp())
+
+
+
+def gateway_pages(list_page, since, until, page_size=RECONCILE_PAGE_SIZE):
+    """Every entity of a gateway listing between since and until, page by page."""
+    skip = 0
+    while True:
+        items = list_page(_unix(since), _unix(until), count=page_size, skip=skip)
+        yield from items
+        if len(items) < page_size:
+            return
+        skip += page_size
+
+
+
+def _ranks_above(payment, current):
+    # a captured payment counts over any other attempt, otherwise the latest attempt does
+    return (payment.get('status') == 'captured', payment.get('created_at', 0)) > \
+        (current.get('status') == 'captured', current.get('created_at', 0))
+
+
+
+def payments_by_order(payments):
+    """{gateway order id: the payment that counts for it}."""
+    chosen = {}
+    for payment in payments:
+        order_id = payment.get('order_id')
+        if order_id and (order_id not in chosen or _ranks_above(payment, chosen[order_id])):
+            chosen[order_id] = payment
+    return chosen
+
+
+
+def acquire_lock(holder):
+    """Take the reconciliation lease for holder. False while another run holds an unexpired one."""
+    now = timezone.now()
+    ReconciliationLock.objects.get_or_create(pk=RECONCILE_LOCK_ID, defaults={'locked_until': now})
+    return ReconciliationLock.objects.filter(pk=RECONCILE_LOCK_ID, locked_until__lte=now).update(
+        holder=holder, locked_until=now + timedelta(seconds=RECONCILE_LOCK_TIMEOUT),
+    ) == 1
+
+
+
+def renew_lock(holder):
+    """Extend holder's lease. False when it ran out and another run took it over."""
+    return ReconciliationLock.objects.filter(pk=RECONCILE_LOCK_ID, holder=holder).update(
+        locked_until=timezone.now() + timedelta(seconds=RECONCILE_LOCK_TIMEOUT),
+    ) == 1
+
+
+
+def release_lock(holder):
+    ReconciliationLock.objects.filter(pk=RECONCILE_LOCK_ID, holder=holder).update(holder='', locked_until=timezone.now())
+
+
+
+def reconcile_window(since, until, now=None, gateway=None, page_size=RECONCILE_PAGE_SIZE):
+    """
+    Reconcile the gateway payments and orders created between since and until.
+    Returns (payments seen, payments saved, orders captured, orders released).
+    """
+    gateway = gateway or get_gateway()
+    now = now or timezone.now()
+    payments = {payment['id']: payment for payment in gateway_pages(gateway.list_payments, since, until, page_size)}
+    chosen = payments_by_order(payments.values())
+
+    # orders paid at the gateway whose capturing payment was created before the window
+    paid_elsewhere = [
+        gateway_order['id'] for gateway_order in gateway_pages(gateway.list_orders, since, until, page_size)
+        if gateway_order.get('status') == 'paid' and chosen.get(gateway_order['id'], {}).get('status') != 'captured'
+    ]
+    unpaid = Order.objects.filter(razorpay_order_id__in=paid_elsewhere).exclude(status="paid")
+    for razorpay_order_id in unpaid.values_list('razorpay_order_id', flat=True):
+        chosen.update(payments_by_order(gateway.order_payments(razorpay_order_id)))
+
+    orders = Order.objects.only('id', 'user_id', 'status', 'cart_item_ids', 'razorpay_order_id').in_bulk(
+        list(chosen), field_name='razorpay_order_id',
+    )
+    stored = {
+        row['order_id']: row
+        for row in Payment.objects.filter(order__in=orders.values()).values('order_id', 'razorpay_payment_id', 'status', 'captured')
+    }
+
+    changed = []
+    for razorpay_order_id, order in orders.items():
+        payment, current = chosen[razorpay_order_id], stored.get(order.pk)
+        if current and (current['razorpay_payment_id'], current['status']) == (payment['id'], payment.get('status')):
+            continue
+        # a captured payment is never replaced by another attempt
+        if current and current['captured'] and current['razorpay_payment_id'] != payment['id']:
+            continue
+        changed.append(Payment(order=order, razorpay_signature="", **payment_fields(payment)))
+    if changed:
+        bulk_upsert(Payment, changed, ['order'], PAYMENT_UPDATE_FIELDS)
+
+    captured = released = 0
+    failed_before = _unix(now - timedelta(seconds=RECONCILE_FAILED_GRACE))
+    for razorpay_order_id, order in orders.items():
+        payment = chosen[razorpay_order_id]
+        if payment.get('status') == 'captured' and order.status != "paid":
+            if capture_order(order):
+                clear_ordered_items(order)
+                captured += 1
+        elif payment.get('status') == 'failed' and order.status == "created" and payment.get('created_at', 0) <= failed_before:
+            released += release_order(order)
+    return len(payments), len(changed), captured, released
+
+
+
+def reconcile_payments(now=None, gateway=None, window=RECONCILE_WINDOW, lookback=RECONCILE_LOOKBACK, page_size=RECONCILE_PAGE_SIZE):
+    """
+    Reconcile the gateway history since the last checkpoint (less lookback) window by window,
+    moving the checkpoint after each one. Returns the ReconciliationRun, or None when another
+    run is still going.
+    """
+    holder = uuid.uuid4().hex
+    if not acquire_lock(holder):
+        return None
+    try:
+        now = now or timezone.now()
+        last = ReconciliationRun.objects.order_by('-checkpoint').values_list('checkpoint', flat=True).first()
+        earliest = now - timedelta(seconds=RECONCILE_MAX_CATCHUP)
+        since = max(last or earliest, earliest) - timedelta(seconds=lookback)
+        run = ReconciliationRun.objects.create(window_from=since, checkpoint=since)
+
+        started = time.perf_counter()
+        while run.checkpoint < now:
+            until = min(run.checkpoint + timedelta(seconds=window), now)
+            seen, saved, captured, released = reconcile_window(run.checkpoint, until, now, gateway, page_size)
+            run.payments_seen += seen
+            run.payments_saved += saved
+            run.orders_captured += captured
+            run.orders_released += released
+            run.checkpoint = until
+            run.seconds = time.perf_counter() - started
+            run.save()
+            if run.checkpoint < now and not renew_lock(holder):
+                # stalled past the lease: another run has started, it carries on from this checkpoint
+                logger.warning("Reconciliation lease lost at %s, stopping.", run.checkpoint)
+                break
+
+        ReconciliationRun.objects.filter(started_at__lt=now - timedelta(days=RECONCILE_KEEP_DAYS)).delete()
+        return run
+    finally:
+        release_lock(holder)
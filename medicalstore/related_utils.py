@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+from .models import Category, Product, RelatedProduct
+from .catalog_cache import bump_catalog_version
+
+
+CACHE_KEY = 'related_products:{}'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+# fields whose change can move a product in its category's ranking
+RANKING_FIELDS = {'available_stock', 'rating', 'category'}
+
+
+
+def related_products_limit():
+    return getattr(settings, 'RELATED_PRODUCTS_LIMIT', 8)
+
+
+
+def rank_category(category_id):
+    """[(product id, units sold)] of the category's best in stock products, best first."""
+    # one more than shown, so a listed product still has a full strip without itself
+    return list(
+        Product.objects.filter(category_id=category_id, available_stock__gt=0)
+        .annotate(units_sold=Coalesce(Sum('orderitem__quantity', filter=Q(orderitem__order__status='paid')), Value(0)))
+        .order_by('-rating', '-units_sold', '-created_at', '-id')
+        .values_list('id', 'units_sold')[:related_products_limit() + 1]
+    )
+
+
+
+def refresh_category(category_id):
+    """Re-rank one category, the stored list is only rewritten when the ranking changed."""
+    ranking = rank_category(category_id)
+    product_ids = [product_id for product_id, _ in ranking]
+
+    stored = list(RelatedProduct.objects.filter(category_id=category_id).order_by('rank').values_list('product_id', 'units_sold'))
+    if stored != ranking:
+        with transaction.atomic():
+            RelatedProduct.objects.filter(category_id=category_id).delete()
+            RelatedProduct.objects.bulk_create([
+                RelatedProduct(category_id=category_id, product_id=product_id, rank=rank, units_sold=units_sold)
+                for rank, (product_id, units_sold) in enumerate(ranking)
+            ])
+            # the strip is part of the cached / ETagged detail pages
+            transaction.on_commit(bump_catalog_version)
+
+    cache.set(CACHE_KEY.format(category_id), product_ids, CACHE_TIMEOUT)
+    return stored != ranking
+
+
+
+def refresh_for_product(product):
+    """Refresh the product's category and any other category that still lists it (category changed)."""
+    category_ids = set(
+        RelatedProduct.objects.filter(product_id=product.id).exclude(category_id=product.category_id)
+        .values_list('category_id', flat=True)
+    )
+    category_ids.add(product.category_id)
+    for category_id in category_ids:
+        refresh_category(category_id)
+
+
+
+def rebuild_related_products():
+    """Re-rank every category. Returns (categories, categories whose ranking changed)."""
+    changed = 0
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    for category_id in category_ids:
+        changed += refresh_category(category_id)
+    return len(category_ids), changed
+
+
+
+def ranked_product_ids(category_id):
+    key = CACHE_KEY.format(category_id)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = list(
+            RelatedProduct.objects.filter(category_id=category_id).order_by('rank').values_list('product_id', flat=True)
+        )
+        cache.set(key, product_ids, CACHE_TIMEOUT)
+    return product_ids
+
+
+
+def get_related_products(product):
+    """At most RELATED_PRODUCTS_LIMIT ranked products of the product's category, one indexed query."""
+    product_ids = [product_id for product_id in ranked_product_ids(product.category_id) if product_id != product.id]
+    product_ids = product_ids[:related_products_limit()]
+    if not product_ids:
+        return []
+
+    # stock is checked again so a product that just sold out never shows up before the next refresh
+    products_by_id = Product.objects.select_related('category').filter(available_stock__gt=0).in_bulk(product_ids)
+    return [products_by_id[product_id] for product_id in product_ids if product_id in products_by_id]
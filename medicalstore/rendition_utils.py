@@ -0,0 +1,135 @@
+import base64
+import logging
+import posixpath
+from io import BytesIO
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# image field -> rendition widths in px, sized for how the templates show them
+# (product cards 240px wide, category icons 40px, header / profile avatars)
+RENDITION_WIDTHS = {
+    'product_main_image': (240, 480, 720),
+    'category_image': (40, 80, 120),
+    'user_profile_picture': (64, 128, 256),
+}
+
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 40
+
+
+
+def renditions_field(field_name):
+    return f'{field_name}_renditions'
+
+
+
+def _resize(image, width):
+    # never upscale, a small original is served at its own size
+    if image.width <= width:
+        return image.copy()
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+
+def _encode(image, fmt):
+    options = dict(FORMATS[fmt])
+    pil_format = options.pop('format')
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha, flatten transparent PNGs on white like the card background
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+
+def placeholder_data_uri(image):
+    """Tiny blurred-looking JPEG inlined as a data URI, shown while the real image loads."""
+    small = _resize(image, PLACEHOLDER_WIDTH)
+    buffer = BytesIO()
+    small.convert('RGB').save(buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+
+def build_renditions(field_file, widths):
+    """
+    Write every width x format of the image next to the original, through the field's storage
+    (Cloudinary in production, FileSystemStorage locally).
+    Returns the renditions record stored on the model, public URLs included so rendering
+    never has to ask the storage backend.
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as source:
+        image = Image.open(BytesIO(source.read()))
+        image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    directory, filename = posixpath.split(field_file.name)
+    stem = posixpath.splitext(filename)[0]
+    record = {
+        'source': field_file.name,
+        'url': storage.url(field_file.name),
+        'width': image.width,
+        'placeholder': placeholder_data_uri(image),
+    }
+
+    for fmt in FORMATS:
+        record[fmt] = []
+        for width in widths:
+            resized = _resize(image, width)
+            name = posixpath.join(directory, 'renditions', f'{stem}_{width}w.{fmt}')
+            saved_name = storage.save(name, ContentFile(_encode(resized, fmt)))
+            record[fmt].append([resized.width, saved_name, storage.url(saved_name)])
+    return record
+
+
+
+def delete_renditions(storage, record):
+    for fmt in FORMATS:
+        for _, name, *_ in (record or {}).get(fmt, []):
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.warning("Could not delete image rendition %s", name, exc_info=True)
+
+
+
+def update_renditions(instance, field_name, force=False):
+    """
+    Regenerate the renditions of instance.<field_name> when the image changed.
+    The record is written with a queryset update so no save signals run again.
+    Returns True when renditions were (re)built or cleared.
+    """
+    field_file = getattr(instance, field_name)
+    record_field = renditions_field(field_name)
+    current = getattr(instance, record_field) or {}
+    source = field_file.name if field_file else None
+
+    if not force and current.get('source') == source:
+        return False
+
+    record = {}
+    if source:
+        try:
+            record = build_renditions(field_file, RENDITION_WIDTHS[field_name])
+        except Exception:
+            # unreadable upload or storage outage, templates fall back to the original image
+            logger.exception("Could not build renditions for %s", source)
+
+    if current:
+        delete_renditions(field_file.storage, current)
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{record_field: record})
+    setattr(instance, record_field, record)
+    return True
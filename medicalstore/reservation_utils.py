@@ -0,0 +1,156 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Order, Product, StockHold
+
+
+# Checkout reserves stock with holds instead of taking it: one StockHold per order line,
+# valid for STOCK_HOLD_TTL seconds. A product's available units are its available_stock
+# minus the quantities of its active (unexpired) holds. On capture the holds are committed
+# (the stock drops, the holds go), on failure or cancel they are deleted, and holds of
+# abandoned orders are swept once expired. Every step is a handful of set-based statements,
+# whatever the number of lines.
+
+STOCK_HOLD_BATCH_SIZE = 500
+
+
+
+def hold_ttl():
+    return getattr(settings, 'STOCK_HOLD_TTL', 15 * 60)
+
+
+
+def active_holds(product_ids, now=None):
+    return StockHold.objects.filter(product_id__in=product_ids, expires_at__gt=now or timezone.now())
+
+
+
+def holds_by_product(product_ids, now=None):
+    """Units held per product, a GROUP BY answered from the (product, expires_at, quantity) index."""
+    return active_holds(product_ids, now).values('product_id').annotate(held=Sum('quantity')).order_by()
+
+
+
+def held_subquery(product_ref, now=None):
+    """Units held by active holds of product_ref (an OuterRef), for annotations and conditional updates."""
+    held = (
+        StockHold.objects.filter(product_id=product_ref, expires_at__gt=now or timezone.now())
+        .order_by().values('product_id').annotate(held=Sum('quantity')).values('held')
+    )
+    return Coalesce(Subquery(held[:1]), 0, output_field=IntegerField())
+
+
+
+def held_quantities(product_ids, now=None):
+    """{product_id: units held by active holds}."""
+    return {row['product_id']: row['held'] for row in holds_by_product(product_ids, now)}
+
+
+
+def available_quantities(product_ids, now=None):
+    """{product_id: stock minus active holds}."""
+    held = held_quantities(product_ids, now)
+    stock = Product.objects.filter(pk__in=product_ids).values_list('id', 'available_stock')
+    return {product_id: max(0, available_stock - held.get(product_id, 0)) for product_id, available_stock in stock}
+
+
+
+def place_holds(order, lines, now=None):
+    """
+    Hold {product_id: quantity} for the order, all lines or none. Returns the product ids
+    without enough available units (nothing is held then). Call inside a transaction.
+
+    The product rows are locked (in id order) before the holds are read, so parallel
+    checkouts of a product queue up here and each one sees the holds committed before it.
+    The holds are read with a locking read too, which returns the latest committed rows
+    on every isolation level (a plain read could come from an older snapshot on MySQL).
+    """
+    now = now or timezone.now()
+    product_ids = sorted(lines)
+    stock = dict(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('id', 'available_stock'))
+    held = {}
+    for product_id, quantity in active_holds(product_ids, now).select_for_update().values_list('product_id', 'quantity'):
+        held[product_id] = held.get(product_id, 0) + quantity
+
+    short = [
+        product_id for product_id in product_ids
+        if stock.get(product_id, 0) - held.get(product_id, 0) < lines[product_id]
+    ]
+    if short:
+        return short
+
+    expires_at = now + timedelta(seconds=hold_ttl())
+    StockHold.objects.bulk_create([
+        StockHold(order=order, product_id=product_id, quantity=lines[product_id], expires_at=expires_at)
+        for product_id in product_ids
+    ])
+    return []
+
+
+
+def commit_holds(order_id, lines, now=None):
+    """
+    Take the sold units out of stock with one UPDATE and drop the order's holds. Call inside
+    a transaction. When the order's holds expired or were released before the capture, only
+    the units neither in stock nor held by other orders can be taken; the rest is short.
+    Returns ({product_id: units short}, ids of products now out of stock).
+    """
+    if not lines:
+        return {}, []
+    product_ids = sorted(lines)
+    # locked like place_holds does, so no hold is placed or taken meanwhile
+    stock = dict(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('id', 'available_stock'))
+    held = {
+        row['product_id']: row['held']
+        for row in holds_by_product(product_ids, now).exclude(order_id=order_id)
+    }
+    taken, short = {}, {}
+    for product_id in product_ids:
+        free = max(0, stock.get(product_id, 0) - held.get(product_id, 0))
+        taken[product_id] = min(lines[product_id], free)
+        if taken[product_id] < lines[product_id]:
+            short[product_id] = lines[product_id] - taken[product_id]
+
+    Product.objects.filter(pk__in=product_ids).update(available_stock=Case(
+        *[When(pk=product_id, then=F('available_stock') - quantity) for product_id, quantity in taken.items()],
+        default=F('available_stock'), output_field=IntegerField(),
+    ))
+    StockHold.objects.filter(order_id=order_id).delete()
+    return short, list(Product.objects.filter(pk__in=product_ids, available_stock=0).values_list('id', flat=True))
+
+
+
+def release_holds(order_ids):
+    """Give the held units back: one DELETE, stock itself is untouched."""
+    deleted, _ = StockHold.objects.filter(order_id__in=order_ids).delete()
+    return deleted
+
+
+
+def expired_holds(now=None):
+    return StockHold.objects.filter(expires_at__lte=now or timezone.now())
+
+
+
+def expire_holds(batch_size=STOCK_HOLD_BATCH_SIZE, now=None):
+    """
+    Fail the unpaid orders whose holds expired and release those holds, batch_size orders
+    per transaction (one UPDATE and one DELETE each). Returns (orders expired, holds released).
+    """
+    now = now or timezone.now()
+    expired_orders = released = 0
+    while True:
+        order_ids = list(expired_holds(now).order_by().values_list('order_id', flat=True).distinct()[:batch_size])
+        if not order_ids:
+            break
+        with transaction.atomic():
+            expired_orders += Order.objects.filter(pk__in=order_ids, status="created").update(
+                status="failed", order_payment_status="failed", delivery_status="failed", updated_at=now,
+            )
+            released += release_holds(order_ids)
+        if len(order_ids) < batch_size:
+            break
+    return expired_orders, released
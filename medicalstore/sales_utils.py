@@ -0,0 +1,130 @@
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min, Q, Sum
+from django.utils import timezone
+from .models import DailyProductSales, FeaturedTagRun, Order, OrderItem, Product
+from .catalog_cache import bump_catalog_version
+
+
+BATCH_SIZE = 500
+# orders are created unpaid and become paid minutes later, so recent days are rolled up again
+ROLLUP_LOOKBACK_DAYS = 2
+AUTO_TAGS = ('Bestseller', 'New')
+
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+    return start, timezone.make_aware(datetime.combine(day + timedelta(days=1), datetime.min.time()))
+
+
+
+def rollup_day(day):
+    """Replace the day's DailyProductSales rows with the paid order quantities of that (local) day."""
+    start, end = _day_bounds(day)
+    rows = (
+        OrderItem.objects.filter(order__status='paid', order__created_at__gte=start, order__created_at__lt=end, product__isnull=False)
+        .values('product_id')
+        .annotate(quantity=Sum('quantity'))
+    )
+    with transaction.atomic():
+        DailyProductSales.objects.filter(day=day).delete()
+        DailyProductSales.objects.bulk_create(
+            [DailyProductSales(day=day, product_id=row['product_id'], quantity=row['quantity']) for row in rows],
+            batch_size=BATCH_SIZE,
+        )
+
+
+
+def rollup_daily_sales(full=False):
+    """
+    Roll up the days not summarised yet (plus the last few, for late payments).
+    full=True starts again from the first paid order. Returns the number of days rolled up.
+    """
+    today = timezone.localdate()
+    if full:
+        DailyProductSales.objects.all().delete()
+    last_day = DailyProductSales.objects.aggregate(day=Max('day'))['day']
+    if last_day is not None:
+        first_day = min(last_day, today) - timedelta(days=ROLLUP_LOOKBACK_DAYS)
+    else:
+        first_paid = Order.objects.filter(status='paid').aggregate(created_at=Min('created_at'))['created_at']
+        if first_paid is None:
+            return 0
+        first_day = timezone.localdate(first_paid)
+
+    day = first_day
+    while day <= today:
+        rollup_day(day)
+        day += timedelta(days=1)
+    return (today - first_day).days + 1
+
+
+
+def trailing_bestseller_ids(window_days=None, count=None):
+    """Products with the most units sold in the last window_days days, best first."""
+    window_days = window_days or settings.BESTSELLER_WINDOW_DAYS
+    count = count or settings.BESTSELLER_COUNT
+    since = timezone.localdate() - timedelta(days=window_days - 1)
+    return list(
+        DailyProductSales.objects.filter(day__gte=since)
+        .values('product_id')
+        .annotate(units=Sum('quantity'))
+        .order_by('-units', 'product_id')
+        .values_list('product_id', flat=True)[:count]
+    )
+
+
+
+def apply_featured_tags(bestseller_ids):
+    """
+    Tag bestsellers and new products with three set-based UPDATEs.
+    Only Bestseller / New / untagged products are touched, a manual "Discount" tag always stays.
+    Returns (tagged bestseller, tagged new, untagged) row counts.
+    """
+    new_since = timezone.now() - timedelta(days=settings.NEW_PRODUCT_DAYS)
+    taggable = Q(featured_option__isnull=True) | Q(featured_option__in=AUTO_TAGS)
+
+    with transaction.atomic():
+        untagged = (
+            Product.objects.filter(featured_option__in=AUTO_TAGS)
+            .exclude(id__in=bestseller_ids)
+            .exclude(created_at__gte=new_since)
+            .update(featured_option=None)
+        )
+        bestsellers = (
+            Product.objects.filter(taggable, id__in=bestseller_ids)
+            .exclude(featured_option='Bestseller')
+            .update(featured_option='Bestseller')
+        )
+        new_products = (
+            Product.objects.filter(taggable, created_at__gte=new_since)
+            .exclude(id__in=bestseller_ids)
+            .exclude(featured_option='New')
+            .update(featured_option='New')
+        )
+        if untagged or bestsellers or new_products:
+            # queryset updates send no signals, drop the cached home page ourselves
+            transaction.on_commit(bump_catalog_version)
+    return bestsellers, new_products, untagged
+
+
+
+def update_featured_tags(full_rollup=False):
+    """Roll up recent sales, retag the catalog and record the run."""
+    started = time.perf_counter()
+    days = rollup_daily_sales(full=full_rollup)
+    rolled_up = time.perf_counter()
+    bestsellers, new_products, untagged = apply_featured_tags(trailing_bestseller_ids())
+    finished = time.perf_counter()
+
+    return FeaturedTagRun.objects.create(
+        days_rolled_up=days,
+        rollup_seconds=rolled_up - started,
+        tagging_seconds=finished - rolled_up,
+        bestsellers=bestsellers,
+        new_products=new_products,
+        untagged=untagged,
+    )
@@ -0,0 +1,250 @@
+import re
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, IntegerField, Max, Value, When
+from django.db.models.functions import Length
+from .models import Product, SearchToken, SearchTrigram, SearchPosting
+from .pagination_utils import PRODUCTS_PAGE_SIZE
+
+
+MAX_TOKEN_LENGTH = 50
+MAX_QUERY_TERMS = 8
+BATCH_SIZE = 500
+
+# a token found in the product name is worth more than one found in the description
+FIELD_WEIGHTS = {
+    'product_name': 8,
+    'category_name': 4,
+    'product_short_desc': 2,
+    'product_desc': 1,
+}
+
+PREFIX_SIMILARITY = 0.8
+MIN_TRIGRAM_SIMILARITY = 0.35
+MAX_PREFIX_MATCHES = 50
+MAX_FUZZY_MATCHES = 20
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+
+def tokenize(text):
+    """Lowercase words of the text, in order and without duplicates."""
+    tokens = []
+    for token in TOKEN_RE.findall((text or '').lower()):
+        token = token[:MAX_TOKEN_LENGTH]
+        if len(token) >= 2 and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+
+def product_token_weights(product):
+    """{token: weight} for one product, weights of all fields the token occurs in are added up."""
+    weights = defaultdict(int)
+    fields = {
+        'product_name': product.product_name,
+        'category_name': product.category.category_name,
+        'product_short_desc': product.product_short_desc,
+        'product_desc': product.product_desc,
+    }
+    for field, text in fields.items():
+        for token in tokenize(text):
+            weights[token] += FIELD_WEIGHTS[field]
+    return weights
+
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+
+def ensure_tokens(tokens):
+    """Returns {token: id}, adding any missing tokens (and their trigrams) to the vocabulary."""
+    token_ids = {}
+    for chunk in _chunks(tokens):
+        token_ids.update(SearchToken.objects.filter(token__in=chunk).values_list('token', 'id'))
+
+    missing = [token for token in tokens if token not in token_ids]
+    if not missing:
+        return token_ids
+
+    for chunk in _chunks(missing):
+        SearchToken.objects.bulk_create(
+            [SearchToken(token=token, trigram_count=len(trigrams(token))) for token in chunk],
+            ignore_conflicts=True,
+        )
+        created = dict(SearchToken.objects.filter(token__in=chunk).values_list('token', 'id'))
+        token_ids.update(created)
+        SearchTrigram.objects.bulk_create(
+            [SearchTrigram(trigram=trigram, token_id=token_id)
+             for token, token_id in created.items() for trigram in trigrams(token)],
+            ignore_conflicts=True,
+            batch_size=BATCH_SIZE,
+        )
+    return token_ids
+
+
+
+def index_products(products):
+    """(Re)build the postings of the given products. Products need their category loaded."""
+    product_weights = {product.id: product_token_weights(product) for product in products}
+    if not product_weights:
+        return 0
+
+    vocabulary = set()
+    for weights in product_weights.values():
+        vocabulary.update(weights)
+    token_ids = ensure_tokens(vocabulary)
+
+    postings = [
+        SearchPosting(token_id=token_ids[token], product_id=product_id, weight=weight)
+        for product_id, weights in product_weights.items()
+        for token, weight in weights.items()
+    ]
+    with transaction.atomic():
+        SearchPosting.objects.filter(product_id__in=product_weights.keys()).delete()
+        SearchPosting.objects.bulk_create(postings, batch_size=BATCH_SIZE)
+    return len(product_weights)
+
+
+
+def index_category(category):
+    """Category name is indexed into every product of it, so a rename reindexes the category."""
+    products = Product.objects.select_related('category').filter(category=category)
+    indexed = 0
+    batch = []
+    for product in products.iterator(chunk_size=BATCH_SIZE):
+        batch.append(product)
+        if len(batch) == BATCH_SIZE:
+            indexed += index_products(batch)
+            batch = []
+    return indexed + index_products(batch)
+
+
+
+def rebuild_index():
+    """
+    Build the index again from every product, a batch of products at a time: each batch's
+    postings are replaced in one transaction, so search keeps answering during the rebuild.
+    Tokens no product uses any more are dropped at the end.
+    """
+    last_token_id = SearchToken.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    indexed = 0
+    batch = []
+    for product in Product.objects.select_related('category').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        batch.append(product)
+        if len(batch) == BATCH_SIZE:
+            indexed += index_products(batch)
+            batch = []
+    indexed += index_products(batch)
+
+    # tokens created meanwhile may still be waiting for their postings, only older ones go
+    SearchToken.objects.filter(id__lte=last_token_id, posting__isnull=True).delete()
+    return indexed
+
+
+
+def match_tokens(term):
+    """
+    Vocabulary tokens that can stand for a query word, as {token id: similarity}.
+    Exact match 1.0, prefix match (typing in progress) 0.8, otherwise trigram similarity for typos.
+    """
+    matches = {}
+    # shortest completions first, so the exact token always survives the cut
+    prefixed = SearchToken.objects.filter(token__startswith=term).order_by(Length('token'), 'token')
+    for token_id, token in prefixed.values_list('id', 'token')[:MAX_PREFIX_MATCHES]:
+        matches[token_id] = 1.0 if token == term else PREFIX_SIMILARITY
+
+    if len(term) < 3:
+        return matches
+
+    term_trigrams = trigrams(term)
+    shared_counts = (
+        SearchTrigram.objects.filter(trigram__in=term_trigrams)
+        .values('token_id', 'token__trigram_count')
+        .annotate(shared=Count('id'))
+        .order_by('-shared')[:MAX_FUZZY_MATCHES * 5]
+    )
+    fuzzy = []
+    for row in shared_counts:
+        similarity = row['shared'] / (len(term_trigrams) + row['token__trigram_count'] - row['shared'])
+        if similarity >= MIN_TRIGRAM_SIMILARITY:
+            fuzzy.append((similarity, row['token_id']))
+
+    for similarity, token_id in sorted(fuzzy, reverse=True)[:MAX_FUZZY_MATCHES]:
+        matches[token_id] = max(matches.get(token_id, 0), similarity)
+    return matches
+
+
+
+def term_score(candidates):
+    """Best weight x similarity of one query word among a product's postings, an aggregate."""
+    by_similarity = defaultdict(list)
+    for token_id, similarity in candidates.items():
+        by_similarity[similarity].append(token_id)
+    return Max(Case(
+        *[
+            When(token_id__in=token_ids, then=ExpressionWrapper(F('weight') * Value(similarity), output_field=FloatField()))
+            for similarity, token_ids in by_similarity.items()
+        ],
+        default=Value(0.0), output_field=FloatField(),
+    ))
+
+
+
+def term_matched(candidates):
+    """1 when one of the product's postings stands for the query word, an aggregate."""
+    return Max(Case(When(token_id__in=list(candidates), then=Value(1)), default=Value(0), output_field=IntegerField()))
+
+
+
+def search_products(query, category_id=None, page=1, page_size=PRODUCTS_PAGE_SIZE):
+    """
+    Ranked product search.
+    Products matching more query words come first, then by the summed field weight x similarity.
+    Scored and paginated by one grouped query, only the page's product ids leave the database.
+    Returns (products of this page, next page number or None).
+    """
+    terms = [candidates for candidates in map(match_tokens, tokenize(query)[:MAX_QUERY_TERMS]) if candidates]
+    if not terms:
+        return [], None
+
+    token_ids = set()
+    for candidates in terms:
+        token_ids.update(candidates)
+    postings = SearchPosting.objects.filter(token_id__in=token_ids)
+    if category_id:
+        postings = postings.filter(product__category_id=category_id)
+
+    scores = {f'term{number}': term_score(candidates) for number, candidates in enumerate(terms)}
+    matches = {f'matched{number}': term_matched(candidates) for number, candidates in enumerate(terms)}
+    ranked = (
+        postings.values('product_id')
+        .annotate(**scores, **matches)
+        .annotate(
+            score=ExpressionWrapper(sum(F(name) for name in scores), output_field=FloatField()),
+            matched=ExpressionWrapper(sum(F(name) for name in matches), output_field=IntegerField()),
+        )
+        .order_by('-matched', '-score', 'product_id')
+    )
+
+    # one row more than the page tells whether there is a next page
+    start = (page - 1) * page_size
+    page_ids = [row['product_id'] for row in ranked[start:start + page_size + 1]]
+    next_page = page + 1 if len(page_ids) > page_size else None
+    page_ids = page_ids[:page_size]
+
+    products_by_id = Product.objects.select_related('category').in_bulk(page_ids)
+    products = [products_by_id[product_id] for product_id in page_ids if product_id in products_by_id]
+    return products, next_page
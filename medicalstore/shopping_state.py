@@ -0,0 +1,143 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+from .cache_utils import is_shared_cache
+from .models import Cart_Item, User_detail, Wishlist_Cart_Item
+
+
+CART_STATE_KEY = 'shopping_state:cart:{}'
+WISHLIST_STATE_KEY = 'shopping_state:wishlist:{}'
+HEADER_COUNTS_KEY = 'header_counts:{}'
+# short: a count read just before a write and stored just after it is wrong until then
+HEADER_COUNTS_TIMEOUT = 5 * 60
+
+
+
+def cache_timeout():
+    # 0 (default) keeps the state request scoped only. Ignored without a shared cache,
+    # a per worker local memory cache can't be invalidated from the other workers.
+    if not is_shared_cache():
+        return 0
+    return getattr(settings, 'SHOPPING_STATE_CACHE_TIMEOUT', 0)
+
+
+
+class ShoppingState:
+    """
+    Cart and wishlist state of the current user.
+    Each half is loaded on first use with one values_list query and then reused for the
+    rest of the request (views, templates and the common_data context processor).
+    """
+
+    def __init__(self, user):
+        self.user_id = user.pk if user.is_authenticated else None
+
+    def _load(self, key, loader):
+        timeout = cache_timeout()
+        if self.user_id is None or not timeout:
+            return loader()
+        key = key.format(self.user_id)
+        value = cache.get(key)
+        if value is None:
+            value = loader()
+            cache.set(key, value, timeout)
+        return value
+
+    def _load_cart(self):
+        if self.user_id is None:
+            return {}
+        return dict(Cart_Item.objects.filter(cart__user_id=self.user_id).values_list('product_id', 'quantity'))
+
+    def _load_wishlist(self):
+        if self.user_id is None:
+            return frozenset()
+        return frozenset(Wishlist_Cart_Item.objects.filter(wishlistcart__user_id=self.user_id).values_list('product_id', flat=True))
+
+    @cached_property
+    def cart_quantities(self):
+        """{product_id: quantity} of the cart lines."""
+        return self._load(CART_STATE_KEY, self._load_cart)
+
+    @cached_property
+    def wishlist_product_ids(self):
+        return self._load(WISHLIST_STATE_KEY, self._load_wishlist)
+
+    @property
+    def cart_product_ids(self):
+        return self.cart_quantities.keys()
+
+    @property
+    def cart_quantity(self):
+        return sum(self.cart_quantities.values())
+
+    @property
+    def wishlist_count(self):
+        return len(self.wishlist_product_ids)
+
+
+
+def get_shopping_state(request):
+    """The request's ShoppingState, created once and shared by everything rendering this request."""
+    state = getattr(request, '_shopping_state', None)
+    if state is None:
+        state = request._shopping_state = ShoppingState(request.user)
+    return state
+
+
+
+def invalidate_shopping_state(user_id, cart=True, wishlist=True):
+    keys = []
+    if cart:
+        keys.append(CART_STATE_KEY.format(user_id))
+    if wishlist:
+        keys.append(WISHLIST_STATE_KEY.format(user_id))
+    cache.delete_many(keys)
+
+
+
+# --------------------------
+# HEADER BADGE COUNTS
+# --------------------------
+# {'cart': total quantity, 'wishlist': items} of the header badges, counted with one query
+# once per request. With a shared cache the record is kept for a few minutes between requests
+# and dropped by every cart / wishlist write path (invalidate_header_counts), from any process.
+# A per process cache never keeps it: writes from other workers or celery would not reach it.
+
+def count_header(user_id):
+    cart = (
+        Cart_Item.objects.filter(cart__user_id=OuterRef('pk')).order_by()
+        .values('cart__user_id').annotate(total=Sum('quantity')).values('total')
+    )
+    wishlist = (
+        Wishlist_Cart_Item.objects.filter(wishlistcart__user_id=OuterRef('pk')).order_by()
+        .values('wishlistcart__user_id').annotate(items=Count('id')).values('items')
+    )
+    counts = User_detail.objects.filter(pk=user_id).values_list(
+        Coalesce(Subquery(cart[:1]), 0), Coalesce(Subquery(wishlist[:1]), 0),
+    ).first() or (0, 0)
+    return {'cart': counts[0], 'wishlist': counts[1]}
+
+
+
+def invalidate_header_counts(user_id):
+    if is_shared_cache():
+        cache.delete(HEADER_COUNTS_KEY.format(user_id))
+
+
+
+def get_header_counts(request):
+    counts = getattr(request, '_header_counts', None)
+    if counts is None:
+        user_id = request.user.pk
+        if not is_shared_cache():
+            counts = count_header(user_id)
+        else:
+            key = HEADER_COUNTS_KEY.format(user_id)
+            counts = cache.get(key)
+            if counts is None:
+                counts = count_header(user_id)
+                cache.set(key, counts, HEADER_COUNTS_TIMEOUT)
+        request._header_counts = counts
+    return counts
@@ -0,0 +1,177 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import User_detail, Category, Product, Review, Cart, Cart_Item, Wishlist_Cart, Wishlist_Cart_Item
+from .search_utils import index_products, index_category
+from .catalog_cache import bump_catalog_version
+from .rating_utils import apply_rating_change, recompute_rating_summary
+from .related_utils import RANKING_FIELDS, refresh_category, refresh_for_product
+from .rendition_utils import update_renditions
+from .media_utils import remember_media_urls
+from .shopping_state import cache_timeout as shopping_state_cache_timeout, invalidate_shopping_state
+
+
+SEARCH_INDEXED_FIELDS = {'product_name', 'product_short_desc', 'product_desc', 'category'}
+
+
+
+def _deleted_with(origin, *models):
+    # cascades from these models remove the derived rows themselves
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+
+# --------------------------
+# SEARCH INDEX
+# --------------------------
+# Deletes need no receiver, postings are removed by the product foreign key cascade.
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not SEARCH_INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_products([instance])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or (update_fields and 'category_name' not in update_fields):
+        return
+    index_category(instance)
+
+
+
+# --------------------------
+# RATING SUMMARY
+# --------------------------
+# _counted_rating is what the review contributed when it was loaded, see Review.from_db.
+
+@receiver(post_save, sender=Review)
+def update_rating_summary(sender, instance, created=False, **kwargs):
+    counted = None if instance.disable else instance.rating
+    if not created and not hasattr(instance, '_counted_rating'):
+        # saved without being loaded from the db first, the previous rating is unknown
+        recompute_rating_summary(instance.product_id)
+    else:
+        apply_rating_change(instance.product_id, None if created else instance._counted_rating, counted)
+    instance._counted_rating = counted
+
+
+@receiver(post_delete, sender=Review)
+def remove_from_rating_summary(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, Product, Category):
+        return  # product deleted, its summary goes with it
+    if hasattr(instance, '_counted_rating'):
+        apply_rating_change(instance.product_id, instance._counted_rating, None)
+    else:
+        recompute_rating_summary(instance.product_id)
+
+
+
+# --------------------------
+# RELATED PRODUCTS
+# --------------------------
+# Sales only move the ranking through the scheduled rebuild_related_products run.
+
+@receiver(post_save, sender=Product)
+def rerank_product(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields and not RANKING_FIELDS.intersection(update_fields):
+        return
+    if update_fields and set(update_fields) <= {'available_stock', 'selling_price', 'updated_at'}:
+        # plain stock change, only crossing zero adds or removes the product
+        if getattr(instance, '_loaded_in_stock', None) == (instance.available_stock > 0):
+            return
+    refresh_for_product(instance)
+    instance._loaded_in_stock = instance.available_stock > 0
+
+
+@receiver(post_delete, sender=Product)
+def rerank_deleted_product(sender, instance, origin=None, **kwargs):
+    if not _deleted_with(origin, Category):
+        refresh_category(instance.category_id)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def rerank_reviewed_product(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, Product, Category):
+        return
+    category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+    if category_id:
+        refresh_category(category_id)
+
+
+
+# --------------------------
+# IMAGE RENDITIONS & MEDIA URLS
+# --------------------------
+# Runs before the catalog cache receiver, so cached products already carry the new renditions.
+
+RENDITION_SOURCES = {
+    Product: 'product_main_image',
+    Category: 'category_image',
+    User_detail: 'user_profile_picture',
+}
+PRODUCT_IMAGE_FIELDS = {'product_main_image', 'product_image1', 'product_image2', 'product_image3', 'product_image4'}
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=User_detail)
+def refresh_renditions(sender, instance, update_fields=None, raw=False, **kwargs):
+    field_name = RENDITION_SOURCES[sender]
+    if raw or (update_fields and field_name not in update_fields):
+        return
+    update_renditions(instance, field_name)
+
+
+@receiver(post_save, sender=Product)
+def remember_product_image_urls(sender, instance, update_fields=None, raw=False, **kwargs):
+    # the detail page gallery shows the originals, resolve their URLs once at save time
+    if raw or (update_fields and not PRODUCT_IMAGE_FIELDS.intersection(update_fields)):
+        return
+    remember_media_urls(getattr(instance, field_name) for field_name in PRODUCT_IMAGE_FIELDS)
+
+
+
+# --------------------------
+# CATALOG CACHE
+# --------------------------
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+
+# --------------------------
+# SHOPPING STATE CACHE
+# --------------------------
+# Only needed when the cross request cache is on (SHOPPING_STATE_CACHE_TIMEOUT).
+
+@receiver([post_save, post_delete], sender=Cart_Item)
+def invalidate_cart_state(sender, instance, **kwargs):
+    if shopping_state_cache_timeout():
+        user_id = Cart.objects.filter(id=instance.cart_id).values_list('user_id', flat=True).first()
+        if user_id:
+            invalidate_shopping_state(user_id, wishlist=False)
+
+
+@receiver([post_save, post_delete], sender=Wishlist_Cart_Item)
+def invalidate_wishlist_state(sender, instance, **kwargs):
+    if shopping_state_cache_timeout():
+        user_id = Wishlist_Cart.objects.filter(id=instance.wishlistcart_id).values_list('user_id', flat=True).first()
+        if user_id:
+            invalidate_shopping_state(user_id, cart=False)
+
+
+@receiver(post_delete, sender=Cart)
+def invalidate_cleared_cart_state(sender, instance, **kwargs):
+    if shopping_state_cache_timeout():
+        invalidate_shopping_state(instance.user_id, wishlist=False)
+
+
+@receiver(post_delete, sender=Wishlist_Cart)
+def invalidate_cleared_wishlist_state(sender, instance, **kwargs):
+    if shopping_state_cache_timeout():
+        invalidate_shopping_state(instance.user_id, cart=False)
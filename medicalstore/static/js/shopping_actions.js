@@ -0,0 +1,117 @@
+// Progressive enhancement of the cart / wishlist buttons: links and forms marked with
+// data-shop-action are sent with fetch and the page is patched from the JSON answer.
+// Without JavaScript (or when the answer is not JSON, e.g. the login redirect) they
+// keep working as plain links and form posts.
+(function () {
+    const ajaxHeaders = {'X-Requested-With': 'XMLHttpRequest'};
+
+    const send = (url, options) =>
+        fetch(url, {credentials: 'same-origin', ...options, headers: {...ajaxHeaders, ...(options && options.headers)}})
+            .then(response => {
+                const isJson = (response.headers.get('Content-Type') || '').includes('application/json');
+                if (!response.ok || !isJson) throw new Error('not a shopping action response');
+                return response.json();
+            });
+
+    const showMessage = (text, tag) => {
+        if (!text) return;
+        document.querySelectorAll('#absoluteerrortag').forEach(el => el.remove());
+        const toast = document.createElement('span');
+        toast.className = `absolute ${tag}`;
+        toast.id = 'absoluteerrortag';
+        toast.textContent = text;
+        (document.querySelector('main .container') || document.querySelector('main') || document.body).prepend(toast);
+        setTimeout(() => toast.classList.add('hide'), 2000);
+        setTimeout(() => toast.remove(), 6000);
+    };
+
+    const updateCounts = (counts) => {
+        document.querySelectorAll('[data-cart-count]').forEach(el => { el.textContent = counts.cart; });
+        document.querySelectorAll('[data-wishlist-count]').forEach(el => { el.textContent = counts.wishlist; });
+    };
+
+    const toggleCart = (link, data) => {
+        const icon = link.querySelector('img');
+        link.href = data.toggle_url;
+        link.classList.toggle('add-to-cart', !data.in_cart);
+        link.classList.toggle('remove-from-cart', data.in_cart);
+        link.textContent = data.label;
+        if (icon) link.prepend(icon);
+    };
+
+    const toggleWishlist = (link, data) => {
+        if (!data.in_wishlist && link.hasAttribute('data-remove-card')) {
+            const card = link.closest('.product-card');
+            if (card) card.remove();
+            if (!data.counts.wishlist) window.location.reload();  // show the empty wishlist state
+            return;
+        }
+        const icon = link.querySelector('img');
+        link.href = data.toggle_url;
+        if (icon) icon.src = data.icon;
+    };
+
+    const patchCartLine = (data) => {
+        if (!data.totals_html) {
+            window.location.reload();  // cart is empty now
+            return;
+        }
+        const line = document.getElementById(`cartline${data.product_id}`);
+        if (line) {
+            if (data.line_html) line.outerHTML = data.line_html; else line.remove();
+        }
+        const totals = document.getElementById('carttotals');
+        if (totals) totals.outerHTML = data.totals_html;
+    };
+
+    const setQuantity = (data) => {
+        document.querySelectorAll('[data-cart-quantity]').forEach(el => {
+            if (el.tagName === 'INPUT') el.value = data.quantity; else el.textContent = data.quantity;
+        });
+    };
+
+    const handle = (element, data) => {
+        updateCounts(data.counts);
+        showMessage(data.message, data.ok ? 'success' : 'error');
+        const action = element.dataset.shopAction;
+        if (action === 'cart') toggleCart(element, data);
+        else if (action === 'wishlist') toggleWishlist(element, data);
+        else if (action === 'cartline') patchCartLine(data);
+        else if (action === 'quantity' && data.ok) setQuantity(data);
+    };
+
+    const busy = new WeakSet();  // one request per button at a time, double clicks are dropped
+
+    document.addEventListener('click', (event) => {
+        const link = event.target.closest('a[data-shop-action]');
+        if (!link || event.defaultPrevented || event.button !== 0 || event.metaKey || event.ctrlKey || event.shiftKey) return;
+        event.preventDefault();
+        if (busy.has(link)) return;
+        busy.add(link);
+        const url = link.href;
+        send(url)
+            .then(data => handle(link, data))
+            .catch(() => { window.location.href = url; })
+            .finally(() => busy.delete(link));
+    });
+
+    document.addEventListener('submit', (event) => {
+        const form = event.target.closest('form[data-shop-action]');
+        const submitter = event.submitter;
+        if (!form || form.dataset.plainSubmit) return;
+        // buying goes on to the checkout page, only the in place actions are enhanced
+        if (submitter && submitter.name === 'action' && submitter.value !== 'remove_from_cart') return;
+        event.preventDefault();
+        if (busy.has(form)) return;
+        busy.add(form);
+        const body = new FormData(form);
+        if (submitter && submitter.name) body.append(submitter.name, submitter.value);
+        send(form.action, {method: 'POST', body})
+            .then(data => handle(form, data))
+            .catch(() => {
+                form.dataset.plainSubmit = '1';
+                form.requestSubmit(submitter || undefined);
+            })
+            .finally(() => busy.delete(form));
+    });
+})();
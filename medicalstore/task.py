@@ -1,7 +1,32 @@
 from celery import shared_task
 from django.core.management import call_command
+from .webhook_utils import process_event
 
 @shared_task
 def expire_unpaid_orders_task():
     """Run the Django management command as a Celery task."""
     call_command('expire_unpaid_orders')
+
+
+@shared_task
+def update_featured_tags_task():
+    """Daily Bestseller / New tagging, schedule it with celery beat."""
+    call_command('update_featured_tags')
+
+
+@shared_task(ignore_result=True)
+def process_webhook_event_task(event_pk):
+    """Apply one stored Razorpay webhook event, queued by the webhook endpoint."""
+    process_event(event_pk)
+
+
+@shared_task
+def process_webhook_events_task():
+    """Retry webhook events no task applied, schedule it every few minutes with celery beat."""
+    call_command('process_webhook_events')
+
+
+@shared_task
+def reconcile_payments_task():
+    """Match gateway payments to orders, schedule it every minute with celery beat."""
+    call_command('reconcile_payments')
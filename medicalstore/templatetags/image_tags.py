@@ -0,0 +1,55 @@
+from django import template
+from django.utils.html import format_html
+from medicalstore.media_utils import media_url as resolve_media_url
+
+
+register = template.Library()
+
+
+
+def _entry_url(storage, entry):
+    # entries are [width, name, url], records built before URLs were stored have no url
+    return entry[2] if len(entry) > 2 else storage.url(entry[1])
+
+
+
+def _srcset(storage, entries):
+    return ', '.join(f'{_entry_url(storage, entry)} {entry[0]}w' for entry in entries)
+
+
+
+@register.filter
+def media_url(field_file):
+    """{{ product.product_image1|media_url }} - cached replacement for .url"""
+    return resolve_media_url(field_file)
+
+
+
+@register.simple_tag
+def responsive_image(field_file, renditions=None, alt='', sizes='100vw', css_class='', default='', lazy=True):
+    """
+    <picture> with WebP and JPEG srcsets from the stored renditions and the low quality placeholder
+    as background. Falls back to a plain <img> of the original (or default) while renditions are missing.
+    URLs come from the renditions record or the media URL cache, not from the storage backend.
+
+    {% responsive_image product.product_main_image product.product_main_image_renditions alt=product.product_image_altername sizes="240px" %}
+    """
+    loading = 'lazy' if lazy else 'eager'
+    if not field_file:
+        return format_html('<img src="{}" alt="{}" class="{}" loading="{}">', default, alt, css_class, loading)
+
+    record = renditions or {}
+    if record.get('source') != field_file.name or not record.get('jpeg'):
+        return format_html('<img src="{}" alt="{}" class="{}" loading="{}">', resolve_media_url(field_file), alt, css_class, loading)
+
+    storage = field_file.storage
+    return format_html(
+        '<picture class="responsiveimage">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="{}" decoding="async"'
+        ' style="background: center / cover no-repeat url(\'{}\')">'
+        '</picture>',
+        _srcset(storage, record['webp']), sizes,
+        _entry_url(storage, record['jpeg'][0]), _srcset(storage, record['jpeg']), sizes, alt, css_class, loading,
+        record['placeholder'],
+    )
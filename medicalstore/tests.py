@@ -1,3 +1,134 @@
-from django.test import TestCase
+import threading
+from decimal import Decimal
+from django.db import connection
+from django.test import TransactionTestCase
+from .cart_utils import add_cart_item, get_cart, increase_cart_item
+from .checkout_utils import OutOfStock, place_order
+from .models import Cart_Item, Category, Order, OrderItem, Product, ShippingAddress, User_detail
+from .pricing_utils import price_cart
+from .reservation_utils import held_quantities
 
-# Create your tests here.
+
+
+def make_user(email):
+    user = User_detail(name='Test user', email=email)
+    user.set_unusable_password()
+    user.save()
+    return user
+
+
+
+def make_product(name, stock):
+    # bulk_create sends no post_save, so no image renditions are built
+    category = Category.objects.filter(category_name='Tests').first() or Category.objects.bulk_create([Category(
+        category_name='Tests', category_image='Categories_images/test.jpg', category_background_color='pink',
+    )])[0]
+    Product.objects.bulk_create([Product(
+        category=category, product_name=name, product_main_image='products/test.jpg', product_image_altername=name,
+        product_short_desc=name, product_desc=name, product_price=Decimal('10'), available_stock=stock,
+    )])
+    return Product.objects.get(product_name=name)
+
+
+
+def run_parallel(target, count):
+    """Run target(number) in count threads started together. Returns the errors raised."""
+    errors = []
+    start = threading.Barrier(count)
+
+    def worker(number):
+        start.wait()
+        try:
+            target(number)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+
+class ParallelTestCase(TransactionTestCase):
+    def setUp(self):
+        # the threads open connections of their own, an in-memory sqlite database is private to one
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("needs a test database every connection shares")
+
+
+
+class ParallelCartTests(ParallelTestCase):
+    """Parallel add to cart / increase quantity calls for one product (see stress_cart)."""
+
+    THREADS = 6
+    CALLS = 4
+
+    def add_and_increase(self, stock):
+        product = make_product('Cart test product', stock)
+        user = make_user('cart-test@example.invalid')
+        cart = get_cart(user)
+
+        def calls(number):
+            for call in range(self.CALLS):
+                # odd threads race the insert path, even ones the conditional increment
+                if number % 2 or call == 0:
+                    add_cart_item(cart, product, 1)
+                else:
+                    increase_cart_item(user, product.pk)
+
+        self.assertEqual(run_parallel(calls, self.THREADS), [])
+        lines = list(Cart_Item.objects.filter(cart=cart, product=product).values_list('quantity', flat=True))
+        self.assertEqual(lines, [min(stock, self.THREADS * self.CALLS)])
+
+    def test_no_update_is_lost(self):
+        self.add_and_increase(stock=100)
+
+    def test_line_stops_at_available_units(self):
+        self.add_and_increase(stock=5)
+
+
+
+class ParallelCheckoutTests(ParallelTestCase):
+    """Parallel place_order calls against fixed stock (see stress_checkout)."""
+
+    CHECKOUTS = 6
+    STOCK = 3
+    SHIPPING = {
+        'firstname': 'Test', 'email': 'checkout-test@example.invalid', 'phone': '0000000000',
+        'address': '-', 'city': '-', 'state': '-', 'pincode': '000000',
+    }
+
+    def test_units_are_held_once(self):
+        scarce = make_product('Scarce test product', self.STOCK)
+        plenty = make_product('Plenty test product', 100)
+        users = []
+        for number in range(self.CHECKOUTS):
+            user = make_user(f'checkout-test-{number}@example.invalid')
+            cart = get_cart(user)
+            Cart_Item.objects.bulk_create([Cart_Item(cart=cart, product=plenty, quantity=1), Cart_Item(cart=cart, product=scarce, quantity=1)])
+            users.append(user)
+
+        placed, short = [], []
+
+        def checkout(number):
+            user = users[number]
+            cart_items = Cart_Item.objects.select_related('product__category').filter(cart__user=user)
+            try:
+                placed.append(place_order(user, cart_items, price_cart(user), self.SHIPPING, f"TEST-{number}", f"RCT-TEST-{number}"))
+            except OutOfStock:
+                short.append(number)
+
+        self.assertEqual(run_parallel(checkout, self.CHECKOUTS), [])
+        self.assertEqual((len(placed), len(short)), (self.STOCK, self.CHECKOUTS - self.STOCK))
+
+        held = held_quantities([scarce.pk, plenty.pk])
+        self.assertEqual(held, {scarce.pk: self.STOCK, plenty.pk: self.STOCK})
+        # an out of stock checkout leaves nothing behind, not even the line it could hold
+        self.assertEqual(Order.objects.count(), self.STOCK)
+        self.assertEqual(ShippingAddress.objects.count(), self.STOCK)
+        self.assertEqual(OrderItem.objects.count(), 2 * self.STOCK)
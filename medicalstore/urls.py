@@ -7,6 +7,8 @@ urlpatterns = [
     path('', home_page, name='home_page'),
     path('products/', products_page, name='products_page'),
     path('products/<int:category_id>/', products_page, name='products_page'),
+    path('products/page/', products_page_fragment, name='products_page_fragment'),
+    path('products/<int:category_id>/page/', products_page_fragment, name='products_page_fragment'),
     path('products/add_to_cart/<int:product_id>/', add_to_cart, name='add_to_cart'),
     path('products/remove_from_cart/<int:product_id>/', remove_from_cart, name='remove_from_cart'),
     path('products/products_detail/<int:product_id>', product_detail_page, name='product_detail_page'),
@@ -30,6 +32,7 @@ urlpatterns = [
     path("user/payment/success/<int:order_id>/", payment_success_page, name="payment_success_page"),
     path("user/payment/failed/<int:order_id>/", payment_failed_page, name="payment_failed_page"),
     path("user/payment_cancel/<str:razorpay_order_id>/", payment_cancel, name="payment_cancel"),
+    path("payment/razorpay/webhook/", razorpay_webhook, name="razorpay_webhook"),
     path("user/order/tracking/<int:order_id>/", order_tracking_page, name='order_tracking_page'),
     path("user/order/tracking/search/", order_search_page, name='order_search_page'),
     path('user/wishListCart/', wishlist_page, name='wishlist_page'),
@@ -41,6 +44,10 @@ urlpatterns = [
     path('user/login/', user_login, name='user_login'),
     path('user/register/', user_register, name='user_register'),
     path('user/logout/', user_logout, name='user_logout'),
+    path('api/v1/categories/', api_categories, name='api_categories'),
+    path('api/v1/products/', api_products, name='api_products'),
+    path('api/v1/products/<int:product_id>/', api_product_detail, name='api_product_detail'),
+    path('api/v1/products/<int:product_id>/ratings/', api_product_ratings, name='api_product_ratings'),
     path('reset_password/', CustomPasswordResetView.as_view(), name='password_reset'),
     path('reset_password_sent/', auth_views.PasswordResetDoneView.as_view(
         template_name='registration/password_reset_done.html'
@@ -1,43 +1,57 @@
 from django.shortcuts import render, redirect
+from django.urls import reverse
+from urllib.parse import urlencode
 from .models import *
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.views.decorators.cache import never_cache
 from django.contrib.auth.decorators import login_required
 import re
-from django.db.models import Q, F, ExpressionWrapper, FloatField
+from django.db.models import Q, F
 from .static_content_utils import *
 from django.contrib.auth.views import PasswordResetView
 from .forms import RateLimitedPasswordResetForm
+from .pagination_utils import SORT_KEYS, paginate_products
+from .search_utils import search_products
+from .catalog_cache import get_categories, get_featured_products, get_or_build
+from .shopping_state import get_header_counts, get_shopping_state, invalidate_header_counts
+from .rating_utils import rating_summary_for
+from .related_utils import get_related_products
+from .recommendation_utils import get_bought_together, get_cart_recommendations
+from .conditional_utils import conditional_page
+from .pricing_utils import get_cart_pricing
+from .checkout_utils import OutOfStock, clear_ordered_items, place_order, release_order
+from .gateway_utils import PaymentGatewayError, get_gateway
+from .reservation_utils import available_quantities
+from .webhook_utils import event_id_for, record_event, verify_webhook_signature
+from .cart_utils import add_cart_item, decrease_cart_item, get_cart, get_cart_item, increase_cart_item, remove_cart_item
+from .api_utils import (
+    CATEGORY_FIELDS, PRODUCT_DETAIL_FIELDS, RATING_FIELDS, api_error, catalog_api, category_data,
+    parse_limit, product_detail_data, product_listing_response, rating_data,
+)
 from django.views.decorators.http import require_POST
-from decimal import Decimal, ROUND_HALF_UP
 from django.utils import timezone
-import razorpay
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.http import JsonResponse
-import hmac, hashlib
-from django.db.models import Avg
-from django.db.models import Count, Case, When, IntegerField
+from django.template.loader import render_to_string
+from django.templatetags.static import static
+import json
+import logging
 
 
+logger = logging.getLogger(__name__)
+
 
-DELIVERY_CHARGE_BILLVALUE = Decimal("500")
-DELIVERY_AMOUNT = Decimal("100")
 
 # Create your views here.
+@conditional_page
 def home_page(request):
-    categories = Category.objects.all().order_by('-created_at')
-    products = Product.objects.filter(
-                    Q(featured_option='Discount') |
-                    Q(featured_option='New') |
-                    Q(featured_option='Bestseller')
-                )
-    cart_items = Cart_Item.objects.filter(cart__user=request.user) if request.user.is_authenticated else []
-    cart_dict = {item.product_id for item in cart_items}
-
-    wishlist_items = Wishlist_Cart_Item.objects.filter(wishlistcart__user=request.user) if request.user.is_authenticated else []
-    wishlist_dict = {item.product_id for item in wishlist_items}
+    categories = sorted(get_categories(), key=lambda category: category.created_at, reverse=True)
+    products = get_featured_products()
+    shopping_state = get_shopping_state(request)
+    cart_dict = shopping_state.cart_product_ids
+    wishlist_dict = shopping_state.wishlist_product_ids
 
     context = {
         'categories':categories,
@@ -51,46 +65,52 @@ def home_page(request):
 
 
 
-def products_page(request, category_id=None):
-    categories = Category.objects.all().order_by('category_name')
+def products_listing_page(request, category_id=None):
+    """
+    One page of the products listing and the cursor of the next page.
+    With a search query the results are ranked by relevance and the cursor is the next page number,
+    otherwise the catalog is keyset paginated in the selected sort order.
+    """
     sort_option = request.GET.get('sort', 'recommended')
-    
+    search_query = request.GET.get('q', '').strip()
+    cursor = request.GET.get('cursor')
 
-    selected_category_name = None
+    if search_query:
+        page = int(cursor) if cursor and cursor.isdigit() and int(cursor) > 0 else 1
+        products, next_page = search_products(search_query, category_id, page)
+        next_cursor = str(next_page) if next_page else None
+        return products, next_cursor
 
     if category_id:
         products = Product.objects.select_related('category').filter(category__id=category_id)
-        selected_category = Category.objects.filter(id=category_id).first()
-        if selected_category:
-            selected_category_name = selected_category.category_name
     else:
         products = Product.objects.select_related('category').all()
 
-    # 👇 Annotate discounted_price (calculated: price - (price * discount / 100))
-    products = products.annotate(
-        annotated_discounted_price=ExpressionWrapper(
-            F('product_price') - (F('product_price') * F('discount') / 100.0),
-            output_field=FloatField()
-        )
-    )
+    return paginate_products(products, sort_option, cursor)
 
-    if sort_option == 'price_low_to_high':
-        products = products.order_by('annotated_discounted_price')
-    elif sort_option == 'price_high_to_low':
-        products = products.order_by('-annotated_discounted_price')
-    elif sort_option == 'offer_low_to_high':
-        products = products.order_by('discount')
-    elif sort_option == 'offer_high_to_low':
-        products = products.order_by('-discount')
-    else:
-        # Recommended or default sorting (e.g. by created date)
-        products = products.order_by('-created_at')
 
-    cart_items = Cart_Item.objects.filter(cart__user=request.user) if request.user.is_authenticated else []
-    cart_dict = {item.product_id for item in cart_items}
 
-    wishlist_items = Wishlist_Cart_Item.objects.filter(wishlistcart__user=request.user) if request.user.is_authenticated else []
-    wishlist_dict = {item.product_id for item in wishlist_items}
+
+@conditional_page
+def products_page(request, category_id=None):
+    categories = get_categories()
+    sort_option = request.GET.get('sort', 'recommended')
+    search_query = request.GET.get('q', '').strip()
+    
+
+    selected_category_name = None
+
+    if category_id:
+        selected_category = next((category for category in categories if category.id == category_id), None)
+        if selected_category:
+            selected_category_name = selected_category.category_name
+
+    # 👇 Only one page of cards is rendered, the rest is loaded by infinite scroll
+    products, next_cursor = products_listing_page(request, category_id)
+
+    shopping_state = get_shopping_state(request)
+    cart_dict = shopping_state.cart_product_ids
+    wishlist_dict = shopping_state.wishlist_product_ids
 
     
     context = {
@@ -99,16 +119,55 @@ def products_page(request, category_id=None):
         'selected_category_id':category_id,
         'selected_category_name':selected_category_name,
         'selected_sort_option': sort_option,
+        'search_query':search_query,
+        'next_cursor':next_cursor,
         'cart_dict':cart_dict,
         'wishlist_dict':wishlist_dict,
     }
     return render(request, 'products_page.html', context)
 
 
-    
 
 
+def products_page_fragment(request, category_id=None):
+    """
+    Infinite scroll and live search endpoint.
+    Returns only the product cards of the requested page, the cursor after it is sent in the X-Next-Cursor header.
+    """
+    sort_option = request.GET.get('sort', 'recommended')
+    search_query = request.GET.get('q', '').strip()
+
+    if category_id:
+        listing_url = reverse('products_page', args=[category_id])
+    else:
+        listing_url = reverse('products_page')
+
+    products, next_cursor = products_listing_page(request, category_id)
+
+    shopping_state = get_shopping_state(request)
+    cart_dict = shopping_state.cart_product_ids
+    wishlist_dict = shopping_state.wishlist_product_ids
+
+    next_query = {'sort': sort_option, 'q': search_query} if search_query else {'sort': sort_option}
+    next_path = f"{listing_url}?{urlencode(next_query)}"
+
+    context = {
+        'products':products,
+        'cart_dict':cart_dict,
+        'wishlist_dict':wishlist_dict,
+        'fragment':True,
+        # cart / wishlist buttons must come back to the listing, not to this fragment url
+        'next_path':next_path,
+    }
+    response = render(request, 'partials/product_list.html', context)
+    if next_cursor:
+        response['X-Next-Cursor'] = next_cursor
+    return response
+
+
+    
 
+@conditional_page
 def product_detail_page(request, product_id):
 
     if request.user.is_authenticated:
@@ -117,44 +176,29 @@ def product_detail_page(request, product_id):
         productincart = []
 
 
-    product = Product.objects.select_related('category').filter(id=product_id).first()
-    related_products=Product.objects.select_related('category').filter(category__id=product.category.id).exclude(id=product_id).all()
+    product = Product.objects.select_related('category', 'ratingsummary').filter(id=product_id).first()
+    related_products = get_related_products(product)
+    bought_together = get_bought_together(product)
 
     reviews = product.review.select_related('user').all()
-    product.rating = reviews.aggregate(avg=Avg('rating'))['avg'] or 0
-    product.save(update_fields=['rating'])
-
-    review_count = reviews.count()
-
-    ratings_data = reviews.aggregate(
-        total=Count('id'),
-        rating1=Count(Case(When(rating=1, then=1), output_field=IntegerField())),
-        rating2=Count(Case(When(rating=2, then=1), output_field=IntegerField())),
-        rating3=Count(Case(When(rating=3, then=1), output_field=IntegerField())),
-        rating4=Count(Case(When(rating=4, then=1), output_field=IntegerField())),
-        rating5=Count(Case(When(rating=5, then=1), output_field=IntegerField())),
-    )
-
-    rating_percentages = {}
-    total = ratings_data['total'] or 0
-    for star in range(1, 6):
-        count = ratings_data[f'rating{star}']
-        rating_percentages[star] = (count / total * 100) if total else 0
 
-    cart_items = Cart_Item.objects.filter(cart__user=request.user) if request.user.is_authenticated else []
-    cart_dict = {item.product_id for item in cart_items}
+    # star histogram is maintained on every review change, nothing to aggregate here
+    rating_summary = rating_summary_for(product)
 
-    wishlist_items = Wishlist_Cart_Item.objects.filter(wishlistcart__user=request.user) if request.user.is_authenticated else []
-    wishlist_dict = {item.product_id for item in wishlist_items}
+    shopping_state = get_shopping_state(request)
+    cart_dict = shopping_state.cart_product_ids
+    wishlist_dict = shopping_state.wishlist_product_ids
 
     context = {
         'product':product,
         'products':related_products,
+        'bought_together':bought_together,
         'productincart':productincart,
         'reviews':reviews,
-        'ratings_data':ratings_data,
-        'review_count':review_count,
-        'rating_percentages':rating_percentages,
+        'ratings_data':rating_summary.histogram,
+        'review_count':rating_summary.rating_count,
+        'rating_percentages':rating_summary.percentages,
+        'rating_average':rating_summary.average,
         'cart_dict':cart_dict,
         'wishlist_dict':wishlist_dict,
 
@@ -204,14 +248,93 @@ def submit_review(request, product_id):
 
 
 
+def is_ajax(request):
+    """Cart / wishlist clicks enhanced by shopping_actions.js, answered with JSON instead of a redirect."""
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+
+
+def stock_message(product_id):
+    # units held by unpaid checkouts are not available
+    product = Product.objects.filter(id=product_id).only('product_name').first()
+    if product:
+        available = available_quantities([product.id]).get(product.id, 0)
+        return f"'{product.product_name}' has only {available} items available."
+    return ""
+
+
+
+def shopping_json(request, product_id, ok=True, message="", **data):
+    """Result of a cart / wishlist click plus the header badge counts."""
+    counts = get_header_counts(request)
+    return JsonResponse({
+        'ok': ok,
+        'message': message,
+        'product_id': product_id,
+        'counts': {'cart': counts['cart'], 'wishlist': counts['wishlist']},
+        **data,
+    })
+
+
+
+def _with_next(request, url):
+    next_url = request.GET.get('next')
+    return f"{url}?{urlencode({'next': next_url})}" if next_url else url
+
+
+
+def cart_toggle_json(request, product_id, ok=True, message=""):
+    """Card Add / Remove button: the new state and the url the button points to now."""
+    in_cart = Cart_Item.objects.filter(cart__user=request.user, product_id=product_id).exists()
+    toggle_url = reverse('remove_from_cart' if in_cart else 'add_to_cart', args=[product_id])
+    return shopping_json(
+        request, product_id, ok, message,
+        in_cart=in_cart, toggle_url=_with_next(request, toggle_url), label='Remove' if in_cart else 'Add',
+    )
+
+
+
+def wishlist_toggle_json(request, product_id, ok=True, message=""):
+    in_wishlist = Wishlist_Cart_Item.objects.filter(wishlistcart__user=request.user, product_id=product_id).exists()
+    toggle_url = reverse('remove_from_wishlistcart' if in_wishlist else 'add_to_wishlistcart', args=[product_id])
+    return shopping_json(
+        request, product_id, ok, message,
+        in_wishlist=in_wishlist, toggle_url=_with_next(request, toggle_url),
+        icon=static('images/wishlist_active.png' if in_wishlist else 'images/empty_heart.png'),
+    )
+
+
+
+def cart_quantity_json(request, product_id, ok=True, message=""):
+    """Product detail page quantity buttons."""
+    quantity = Cart_Item.objects.filter(cart__user=request.user, product_id=product_id).values_list('quantity', flat=True).first()
+    return shopping_json(request, product_id, ok, message, quantity=quantity or 0)
+
+
+
+def cart_line_json(request, product_id, ok=True, message=""):
+    """Cart page: the re-rendered line (empty once removed) and totals, the rest of the page stays."""
+    cart_item = Cart_Item.objects.select_related('cart','product').filter(cart__user=request.user, product_id=product_id).first()
+    pricing = get_cart_pricing(request)
+    line_html = render_to_string('partials/cart_line.html', {'cart_item': cart_item}, request) if cart_item else ""
+    totals_html = render_to_string('partials/cart_totals.html', {'pricing': pricing}, request) if pricing else ""
+    return shopping_json(request, product_id, ok, message, line_html=line_html, totals_html=totals_html)
+
+
+
 @login_required
 def add_to_cart(request, product_id):
     next_url = request.GET.get('next')
 
     selected_product = Product.objects.select_related('category').filter(id=product_id).first()
-    cart, _ = Cart.objects.get_or_create(user=request.user)
+    cart = get_cart(request.user)
     quantity = 1
-    addtocart(cart, selected_product, quantity, selected_product.available_stock)
+    added = addtocart(cart, selected_product, quantity)
+    message = "" if added else stock_message(product_id)
+    if is_ajax(request):
+        return cart_toggle_json(request, product_id, bool(added), message)
+    if not added:
+        messages.error(request, message)
     return redirect(next_url)
 
     
@@ -222,8 +345,9 @@ def add_to_cart(request, product_id):
 def remove_from_cart(request, product_id):
     next_url = request.GET.get('next')
 
-    selected_cart_item = Cart_Item.objects.filter(cart__user=request.user, product__id=product_id).first()
-    selected_cart_item.delete()
+    remove_cart_item(request.user, product_id)
+    if is_ajax(request):
+        return cart_toggle_json(request, product_id)
     return redirect(next_url)
 
 
@@ -233,14 +357,16 @@ def remove_from_cart(request, product_id):
 @require_POST
 def increase_cartitem_quantity(request, product_id):
 
-    cart_item = Cart_Item.objects.select_related('cart','product').filter(cart__user=request.user, product__id=product_id).first()
-
-    if cart_item and cart_item.quantity < cart_item.product.available_stock :
-        cart_item.quantity += 1
-        cart_item.save(update_fields=['quantity'])
+    if increase_cart_item(request.user, product_id):
+        if is_ajax(request):
+            return cart_quantity_json(request, product_id)
         return redirect('product_detail_page', product_id=product_id)
     else:
-        messages.error(request, f"'{cart_item.product.product_name}' has only {cart_item.product.available_stock} items available.")
+        message = stock_message(product_id)
+        if is_ajax(request):
+            return cart_quantity_json(request, product_id, False, message)
+        if message:
+            messages.error(request, message)
         return redirect('product_detail_page', product_id=product_id)
         
     
@@ -249,14 +375,13 @@ def increase_cartitem_quantity(request, product_id):
 @require_POST
 def decrease_cartitem_quantity(request, product_id):
     
-    cart_item = Cart_Item.objects.filter(cart__user=request.user, product__id=product_id).first()
-       
-    if cart_item and cart_item.quantity > 1:
-        cart_item.quantity -= 1
-        cart_item.save(update_fields=['quantity'])
+    if decrease_cart_item(request.user, product_id):
+        if is_ajax(request):
+            return cart_quantity_json(request, product_id)
         return redirect('product_detail_page', product_id=product_id)
-        
-    elif cart_item.quantity == 1:
+    else:
+        if is_ajax(request):
+            return cart_quantity_json(request, product_id, False, "Product value cannot be Zero.")
         messages.error(request, "Product value cannot be Zero.")
         return redirect('product_detail_page', product_id=product_id)
 
@@ -271,9 +396,9 @@ def addtocart_or_buyproduct(request, product_id):
             
             selected_product = Product.objects.filter(id=product_id).first()
             
-            cart, _ = Cart.objects.get_or_create(user=request.user)
+            cart = get_cart(request.user)
 
-            cart_item = addtocart(cart, selected_product, quantity, selected_product.available_stock)
+            cart_item = addtocart(cart, selected_product, quantity)
 
             if cart_item:
                 if action == "buy_now":
@@ -283,7 +408,7 @@ def addtocart_or_buyproduct(request, product_id):
                     return redirect('product_detail_page', product_id=product_id) 
                 
             else:
-                messages.error(request, f"{selected_product.product_name} has only {selected_product.available_stock} items available.")
+                messages.error(request, stock_message(product_id))
                 return redirect('product_detail_page', product_id=product_id)
             
         else:
@@ -291,21 +416,16 @@ def addtocart_or_buyproduct(request, product_id):
             return redirect('product_detail_page', product_id=product_id)
 
 
-def addtocart(cart, selected_product, quantity, available_stock):
+def addtocart(cart, selected_product, quantity):
 
     if cart and selected_product  and quantity:
-        quantity = int(quantity)
-        
-        if quantity <= available_stock:
-            cart_item = Cart_Item.objects.create(
-                cart=cart,
-                product=selected_product,
-                quantity=quantity
-            )
-            cart_item.save()
-            return cart_item
-        else:
-            return []
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            return None
+
+        # one atomic upsert, a second click adds to the same line instead of duplicating it
+        return add_cart_item(cart, selected_product, quantity)
     
 
 
@@ -317,10 +437,12 @@ def removefromcart_or_buyproduct(request, product_id):
 
     action = request.POST.get('action')
 
-    selected_product = Cart_Item.objects.filter(cart__user=request.user, product__id=product_id).first()
+    selected_product = get_cart_item(request.user, product_id)
+    if not selected_product:
+        return redirect('product_detail_page', product_id=product_id)
 
     if action == "remove_from_cart":
-        selected_product.delete()
+        remove_cart_item(request.user, product_id)
         messages.success(request, f"'{selected_product.product.product_name}' is removed from the cart.")
         return redirect('product_detail_page', product_id=product_id)
 
@@ -329,6 +451,7 @@ def removefromcart_or_buyproduct(request, product_id):
 
 
 
+@conditional_page
 def aboutus_page(request):
     return render(request, 'aboutus_page.html')
 
@@ -394,25 +517,14 @@ def contactus_page(request):
 def cart_page(request):
     cart_items=Cart_Item.objects.select_related('cart','product').filter(cart__user=request.user).all()
 
-    total_amount = sum(item.get_total_price for item in cart_items)
-    total_discount_price = sum(item.get_total_discount_price for item in cart_items)
-    discount_price = total_amount - total_discount_price
-
-    
-    if total_amount < Decimal(DELIVERY_CHARGE_BILLVALUE):
-        delivery_charge = Decimal(DELIVERY_AMOUNT)
-    else:
-        delivery_charge = Decimal("0")
-
-    total_amount_to_pay = total_discount_price + delivery_charge
+    shopping_state = get_shopping_state(request)
 
     context = {
         'cart_items':cart_items,
-        'total_amount':total_amount,
-        'total_discount_price':total_discount_price,
-        'discount_price':discount_price,
-        'delivery_charge':delivery_charge,
-        'total_amount_to_pay':total_amount_to_pay,
+        'pricing':get_cart_pricing(request),
+        'recommended_products':get_cart_recommendations(shopping_state.cart_product_ids),
+        'cart_dict':shopping_state.cart_product_ids,
+        'wishlist_dict':shopping_state.wishlist_product_ids,
 
     }
     return render(request, 'cart_page.html', context)
@@ -422,15 +534,17 @@ def cart_page(request):
 @require_POST
 def increase_item_qty_in_cart(request, cart_item_id):
 
-    cart_item = Cart_Item.objects.select_related('cart','product').filter(cart__user=request.user, product__id=cart_item_id).first()
-
-    if cart_item and cart_item.quantity < cart_item.product.available_stock:
-        cart_item.quantity += 1
-        cart_item.save()
+    if increase_cart_item(request.user, cart_item_id):
+        if is_ajax(request):
+            return cart_line_json(request, cart_item_id)
         return redirect('cart_page')
     
     else:
-        messages.error(request, f"'{cart_item.product.product_name}' has only {cart_item.product.available_stock} items available.")
+        message = stock_message(cart_item_id)
+        if is_ajax(request):
+            return cart_line_json(request, cart_item_id, False, message)
+        if message:
+            messages.error(request, message)
         return redirect('cart_page')
         
         
@@ -441,14 +555,14 @@ def increase_item_qty_in_cart(request, cart_item_id):
 @require_POST
 def decrease_item_qty_in_cart(request, cart_item_id):
     
-    cart_item = Cart_Item.objects.filter(cart__user=request.user, product__id=cart_item_id).first()
-    
-    if cart_item and cart_item.quantity > 1:
-        cart_item.quantity -= 1
-        cart_item.save()
+    if decrease_cart_item(request.user, cart_item_id):
+        if is_ajax(request):
+            return cart_line_json(request, cart_item_id)
         return redirect('cart_page')
         
-    elif cart_item.quantity == 1:
+    else:
+        if is_ajax(request):
+            return cart_line_json(request, cart_item_id, False, "Product value cannot be Zero.")
         messages.error(request, "Product value cannot be Zero.")
         return redirect('cart_page')
         
@@ -461,11 +575,16 @@ def remove_or_buy_item_in_cart(request, cart_item_id):
 
     action = request.POST.get('action')
     
-    selected_product = Cart_Item.objects.filter(cart__user=request.user, product__id=cart_item_id).first()
+    selected_product = get_cart_item(request.user, cart_item_id)
+    if not selected_product:
+        return redirect('cart_page')
 
     if action == "remove_from_cart":
-        selected_product.delete()
-        messages.success(request, f"'{selected_product.product.product_name}' is removed from the cart.")
+        remove_cart_item(request.user, cart_item_id)
+        message = f"'{selected_product.product.product_name}' is removed from the cart."
+        if is_ajax(request):
+            return cart_line_json(request, cart_item_id, message=message)
+        messages.success(request, message)
         return redirect('cart_page')
 
     if action == "buy_now":
@@ -480,18 +599,13 @@ def clearcart(request):
     cart = Cart.objects.filter(user=request.user).first()
     if cart:
         cart.delete()
+        invalidate_header_counts(request.user.pk)
         messages.success(request, f"'{request.user.name}' cart cleared successfully.")
         return redirect('cart_page')
     
 
     
     
-def _to_paise_rupees_decimal(amount_rupees):
-    # safe conversion to paise (int) from rupees
-    return int((Decimal(str(amount_rupees)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
-
-    
-
 @login_required
 def checkout_page(request, cart_item_id=None):
     cart = Cart.objects.filter(user=request.user).first()
@@ -511,12 +625,7 @@ def checkout_page(request, cart_item_id=None):
         if not cart_items:
             return redirect('cart_page')
 
-    bill_amount = sum(item.get_total_price for item in cart_items)
-    total_amount = sum(item.get_total_discount_price for item in cart_items)
-    discount_amount = bill_amount - total_amount
-    delivery_charge = Decimal(DELIVERY_AMOUNT) if total_amount < Decimal(DELIVERY_CHARGE_BILLVALUE) else Decimal("0")
-    final_amount = total_amount + delivery_charge              
-    final_amount_paise = _to_paise_rupees_decimal(final_amount)
+    pricing = get_cart_pricing(request, cart_item_id)
 
     # ✅ Add user details to context
     user = request.user
@@ -533,12 +642,12 @@ def checkout_page(request, cart_item_id=None):
     # GET – just show the page
     context = {
         "cart_items": cart_items,
-        "bill_amount":bill_amount,
-        "total_amount": total_amount,
-        "delivery_charge": delivery_charge,
-        'discount_amount':discount_amount,
-        "final_amount": final_amount,
-        "final_amount_pay": final_amount_paise,
+        "bill_amount":pricing.bill_amount,
+        "total_amount": pricing.total_amount,
+        "delivery_charge": pricing.delivery_charge,
+        'discount_amount':pricing.discount_amount,
+        "final_amount": pricing.final_amount,
+        "final_amount_pay": pricing.final_amount_paise,
         'cart_item_id':cart_item_id,
         "user_data": user_data,   # 👈 Pass user data to template
     }
@@ -569,15 +678,6 @@ def checkout_page(request, cart_item_id=None):
 
 
 
-def get_razorpay_client():
-    """
-    Returns a fresh Razorpay client instance using settings credentials.
-    """
-    return razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-
-
-
-
 def generate_order_number(user):
     now = timezone.now()
     # DDMMYYYYHHMMSSmmm  (day,month,year,hour,min,sec,millisec)
@@ -613,99 +713,67 @@ def initiate_payment(request,cart_item_id=None):
         if not cart_items:
             return redirect('home_page')
 
-    total_amount = sum(item.get_total_discount_price for item in cart_items)
-    delivery_charge = Decimal(DELIVERY_AMOUNT) if total_amount < Decimal(DELIVERY_CHARGE_BILLVALUE) else Decimal("0")
-    final_amount = total_amount + delivery_charge              
-    final_amount_paise = _to_paise_rupees_decimal(final_amount)
-
+    pricing = get_cart_pricing(request, cart_item_id)
 
-    order_number = generate_order_number(user)
-    receipt = order_number.replace("ORD-", "")
-    order = Order.objects.create(
-        user=user,
-        order_number=order_number,
-        delivery_charge=delivery_charge,
-        amount=final_amount,
-        currency="INR",
-        receipt=f"RCT-{receipt}",
-        cart_item_ids=[ci.id for ci in cart_items],
-        status="created",
-    )
 
     if register_address:
-        # 1️⃣ Create shipping address for user registered addresss
-        ShippingAddress.objects.create(
-            order=order,
-            firstname=user.name,
-            email=user.email,
-            address=user.address,
-            city=user.city,
-            state=user.state,
-            pincode=user.pincode,
-            phone=user.phone
-        )
+        # 1️⃣ Shipping address: the user's registered address
+        shipping = {
+            "firstname": user.name,
+            "email": user.email,
+            "address": user.address,
+            "city": user.city,
+            "state": user.state,
+            "pincode": user.pincode,
+            "phone": user.phone,
+        }
 
     else:
-        # 1️⃣ Create shipping address first
-        ShippingAddress.objects.create(
-            order=order,
-            firstname=request.POST.get('firstname'),
-            lastname=request.POST.get('lastname'),
-            email=request.POST.get('email'),
-            address=request.POST.get('address'),
-            city=request.POST.get('city'),
-            state=request.POST.get('state'),
-            pincode=request.POST.get('pincode'),
-            phone=request.POST.get('phone')
-        )
+        # 1️⃣ Shipping address entered on the checkout page
+        shipping = {
+            field: request.POST.get(field)
+            for field in ("firstname", "lastname", "email", "address", "city", "state", "pincode", "phone")
+        }
 
-    # First, check all items
-    out_of_stock_items = []
-    for ci in cart_items:
-        
-        if ci.product.available_stock < ci.quantity:
-            # Add error message
-            out_of_stock_items.append(ci.product.product_name)
-
-    if out_of_stock_items:
-            # Show error message for all out-of-stock products
-        messages.error(request,f"Not enough stock for: {', '.join(out_of_stock_items)}")  
-        # Redirect to cart page
-        return redirect('cart_page')
+    order_number = generate_order_number(user)
+    receipt = order_number.replace("ORD-", "")
+    cart_item_ids = [item.id for item in cart_items]
 
-    for ci in cart_items:
-        # Reduce stock
-        ci.product.available_stock -= ci.quantity
-        ci.product.save(update_fields=["available_stock"])
-        
+    def open_razorpay_order(order):
+        # 2) Create the Razorpay order once the stock is taken and committed, the HTTP call holds no row locks
+        try:
+            rzp_order = get_gateway().create_order({
+                "amount": pricing.final_amount_paise,
+                "currency": "INR",
+                "receipt": order.receipt,
+                "payment_capture": "1",
+                "notes": {"order_number": order_number,
+                            "cart_item_ids": cart_item_ids,},
+                "partial_payment": False,
+            })
+        except PaymentGatewayError:
+            logger.exception("Could not create the Razorpay order for %s", order_number)
+            release_order(order)
+            return
+        order.razorpay_order_id = rzp_order["id"]
+        order.save(update_fields=["razorpay_order_id"])
 
-        OrderItem.objects.create(
-            order=order,
-            product_id=ci.product.id,
-            product_name=ci.product.product_name,
-            category_name=ci.product.category.category_name,
-            quantity=ci.quantity,
-            unit_price=ci.product.discounted_price,
+    try:
+        # order, address, items and stock in one transaction, nothing is written when a line is short
+        order = place_order(
+            user, cart_items.select_related('product__category'), pricing, shipping,
+            order_number, f"RCT-{receipt}", on_placed=open_razorpay_order,
         )
+    except OutOfStock as error:
+        messages.error(request, str(error))
+        return redirect('cart_page')
 
-    # 2) Create Razorpay order
-    cart_item_ids = [item.id for item in cart_items]
-    client = get_razorpay_client()
-    rzp_order = client.order.create({
-        "amount": final_amount_paise,
-        "currency": "INR",
-        "receipt": order.receipt,
-        "payment_capture": "1",
-        "notes": {"order_number": order_number,
-                    "cart_item_ids": cart_item_ids,},
-        "partial_payment": False,
-    })
-    order.razorpay_order_id = rzp_order["id"]
-    order.save(update_fields=["razorpay_order_id"])
-    
+    if not order.razorpay_order_id:
+        messages.error(request, "Could not start the payment, please try again.")
+        return redirect('cart_page')
 
     request.session['razorpay_key'] = settings.RAZORPAY_KEY_ID
-    request.session['razorpay_order_id'] = rzp_order["id"]
+    request.session['razorpay_order_id'] = order.razorpay_order_id
     request.session['autopopup'] = True
     request.session['order_pk'] = order.pk
 
@@ -723,13 +791,9 @@ def initiate_payment(request,cart_item_id=None):
 @csrf_exempt
 def verify_payment(request):
     """
-    Razorpay sends POST here after payment.
-    1. Verify signature
-    2. Fetch payment details from Razorpay
-    3. Save payment record
-    4. Update order status
-    5. Clear purchased cart items
-    6. Redirect to payment_success page
+    Razorpay checkout posts here after payment. Only the signature is checked: a genuine
+    signature means Razorpay took the payment. The order is marked paid by the payment.captured /
+    order.paid webhook (razorpay_webhook), so the customer is not kept waiting on a gateway call.
     """
 
     rzp_payment_id = request.POST.get("razorpay_payment_id")
@@ -739,113 +803,38 @@ def verify_payment(request):
     if not (rzp_payment_id and rzp_order_id and rzp_signature):
 
         order_pk = request.session.pop('order_pk', None)
+        order = Order.objects.filter(pk=order_pk, user=request.user).first() if order_pk else None
+        if order is None:
+            return redirect('cart_page')
 
-        if order_pk:
-            order = Order.objects.filter(pk=order_pk, status="created").first()
-
-            order.update(status="failed")
-            order.order_payment_status = "failed"
-            order.delivery_status = "failed"
-            order.save(update_fields=["order_payment_status","delivery_status"])
-            
-            for oi in order.orderitem.all():
-                
-                # Restore stock
-                oi.product.available_stock += oi.quantity
-                oi.product.save(update_fields=["available_stock"])
-            
+        # Release the held stock
+        release_order(order)
         return redirect("payment_failed_page", order_id=order.id)
-    
-    client = get_razorpay_client()
 
     # Verify signature
-    try:
-        client.utility.verify_payment_signature({
-            "razorpay_order_id": rzp_order_id,
-            "razorpay_payment_id": rzp_payment_id,
-            "razorpay_signature": rzp_signature,
-        })
-    except razorpay.errors.SignatureVerificationError:
-        order = Order.objects.filter(razorpay_order_id=rzp_order_id, status="created").first()
+    if not get_gateway().verify_payment_signature(rzp_order_id, rzp_payment_id, rzp_signature):
+        order = Order.objects.filter(razorpay_order_id=rzp_order_id, user=request.user).first()
+        if order is None:
+            return redirect('cart_page')
 
-        order.update(status="failed")
-        order.order_payment_status = "failed"
-        order.delivery_status = "failed"
-        order.save(update_fields=["order_payment_status","delivery_status"])
-        
-        for oi in order.orderitem.all():
-                
-                # Restore stock
-            oi.product.available_stock += oi.quantity
-            oi.product.save(update_fields=["available_stock"])
-        
-            
+        # Release the held stock
+        release_order(order)
         return redirect("payment_failed_page", order_id=order.id)
 
-    # Fetch order & payment details
-    order = Order.objects.filter(razorpay_order_id=rzp_order_id, status="created").first()
-
-    payment_data = client.payment.fetch(rzp_payment_id)
+    # (also an order expired meanwhile, the payment still counts)
+    order = Order.objects.filter(razorpay_order_id=rzp_order_id).first()
+    if order is None:
+        return redirect('cart_page')
 
-    # Save payment (or update)
+    # Keep the signature, the webhook fills in the payment details
     Payment.objects.update_or_create(
         order=order,
-        defaults={
-            "razorpay_payment_id": rzp_payment_id,
-            "razorpay_signature": rzp_signature,
-            "method": payment_data.get("method"),
-            "email": payment_data.get("email"),
-            "contact": payment_data.get("contact"),
-            "bank": payment_data.get("bank"),
-            "wallet": payment_data.get("wallet"),
-            "vpa": payment_data.get("vpa"),
-            "international": payment_data.get("international", False),
-            "amount": payment_data.get("amount", 0),
-            "currency": payment_data.get("currency", "INR"),
-            "status": payment_data.get("status"),
-            "captured": payment_data.get("captured", False),
-            "fee": payment_data.get("fee") or 0,
-            "tax": payment_data.get("tax") or 0,
-            "error_code": payment_data.get("error_code"),
-            "error_description": payment_data.get("error_description"),
-            "raw_response": payment_data,
-        },
+        defaults={"razorpay_payment_id": rzp_payment_id, "razorpay_signature": rzp_signature},
     )
+    clear_ordered_items(order)
+    return redirect("payment_success_page", order_id=order.id )
 
-    # Mark order as paid (captured means money received)
-    order.status = "paid" if payment_data.get("status") == "captured" else "failed"
-    order.save(update_fields=["status"])
-
-    # Clear purchased cart items (respect single vs full cart)
-    if order.status == "paid":
-   
-        order.order_payment_status = "paid"
-        order.delivery_status = "confirmed"
-
-        order.save(update_fields=["order_payment_status","delivery_status"])
-
-        cart_item_ids = order.cart_item_ids or []
-        if cart_item_ids:
-            Cart_Item.objects.filter(id__in=cart_item_ids).delete()
-            return redirect("payment_success_page", order_id=order.id )
-            
-       
-
-    elif order.status == "failed":
-
-        order.order_payment_status = "failed"
-        order.delivery_status = "failed"
-        order.save(update_fields=["order_payment_status","delivery_status"])
-
-        for oi in order.orderitem.all():
-            
-            # Restore stock
-            oi.product.available_stock += oi.quantity
-            oi.product.save(update_fields=["available_stock"])
-
-        return redirect("payment_failed_page", order_id=order.id)
 
-    
 
 
 @login_required
@@ -855,16 +844,8 @@ def payment_cancel(request, razorpay_order_id):
     order = Order.objects.filter(razorpay_order_id=razorpay_order_id, status="created").first()
 
     if order:
-        order.status = "cancelled"
-        order.save(update_fields=["status"])
-        order.order_payment_status = "failed"
-        order.delivery_status = "failed"
-        order.save(update_fields=["order_payment_status","delivery_status"])
-
-        for oi in order.orderitem.all():
-             # Restore stock
-            oi.product.available_stock += oi.quantity
-            oi.product.save(update_fields=["available_stock"])
+        # Release the held stock
+        release_order(order, status="cancelled")
 
     return JsonResponse({"ok": True})
 
@@ -873,16 +854,24 @@ def payment_cancel(request, razorpay_order_id):
 
 
 
-def verify_signature(payload, signature):
-    expected = hmac.new(
-        settings.RAZORPAY_KEY_SECRET.encode(),
-        payload,
-        hashlib.sha256
-    ).hexdigest()
-    return hmac.compare_digest(expected, signature)
+@csrf_exempt
+@require_POST
+def razorpay_webhook(request):
+    """
+    Razorpay webhook (payment.captured, payment.failed, order.paid, refund.*). The event is
+    stored and answered at once, a celery task applies it (see webhook_utils).
+    """
+    if not verify_webhook_signature(request.body, request.headers.get('X-Razorpay-Signature')):
+        return JsonResponse({"ok": False}, status=400)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({"ok": False}, status=400)
+
+    record_event(event_id_for(request.headers, request.body), payload)
+    return JsonResponse({"ok": True})
 
 
-    
 
 
 @login_required
@@ -912,8 +901,7 @@ def payment_failed_page(request,order_id):
 @login_required
 def wishlist_page(request):
     wishlist_items=Wishlist_Cart_Item.objects.select_related('wishlistcart','product').filter(wishlistcart__user=request.user)
-    cart_items = Cart_Item.objects.filter(cart__user=request.user) if request.user.is_authenticated else []
-    cart_dict = {item.product_id for item in cart_items}
+    cart_dict = get_shopping_state(request).cart_product_ids
     context = {
         'wishlist_items':wishlist_items,
         'cart_dict':cart_dict,
@@ -929,11 +917,15 @@ def add_to_wishlistcart(request, product_id):
 
     selected_product = Product.objects.filter(id=product_id).first()
     wishlistcart, _ = Wishlist_Cart.objects.get_or_create(user=request.user)
-    wishlistcart_item = Wishlist_Cart_Item.objects.create(
-                wishlistcart=wishlistcart,
-                product=selected_product,
-            )
-    wishlistcart_item.save()
+    # a repeated click (or a retried request) must not add the product twice
+    if not Wishlist_Cart_Item.objects.filter(wishlistcart=wishlistcart, product=selected_product).exists():
+        Wishlist_Cart_Item.objects.create(
+                    wishlistcart=wishlistcart,
+                    product=selected_product,
+                )
+        invalidate_header_counts(request.user.pk)
+    if is_ajax(request):
+        return wishlist_toggle_json(request, product_id)
     return redirect(next_url)
 
 
@@ -943,8 +935,10 @@ def add_to_wishlistcart(request, product_id):
 def remove_from_wishlistcart(request, product_id):
     next_url = request.GET.get('next')
 
-    selected_wishlist_item = Wishlist_Cart_Item.objects.filter(wishlistcart__user=request.user, product__id=product_id).first()
-    selected_wishlist_item.delete()
+    Wishlist_Cart_Item.objects.filter(wishlistcart__user=request.user, product__id=product_id).delete()
+    invalidate_header_counts(request.user.pk)
+    if is_ajax(request):
+        return wishlist_toggle_json(request, product_id)
     return redirect(next_url)
 
 
@@ -956,6 +950,7 @@ def clearwishlist(request):
     wishlistcart = Wishlist_Cart.objects.filter(user=request.user).first()
     if wishlistcart:
         wishlistcart.delete()
+        invalidate_header_counts(request.user.pk)
         messages.success(request, f"'{request.user.name}' wishlist cart cleared successfully.")
         return redirect('wishlist_page')
         
@@ -1361,4 +1356,61 @@ class CustomPasswordResetView(PasswordResetView):
 def user_logout(request):
     logout(request)  
     messages.success(request, "Signed out successfully. Bye...")
-    return redirect('home_page')
\ No newline at end of file
+    return redirect('home_page')
+
+
+
+@catalog_api
+def api_categories(request):
+    categories = get_or_build('api_categories', lambda: [
+        category_data(row) for row in Category.objects.order_by('category_name').values(*CATEGORY_FIELDS)
+    ])
+    return JsonResponse({'results': categories})
+
+
+
+@catalog_api
+def api_products(request):
+    """
+    Product listing, streamed. Query: category, featured, in_stock=1, sort, cursor, limit.
+    Follow next_cursor for the following page.
+    """
+    sort_option = request.GET.get('sort', 'recommended')
+    if sort_option not in SORT_KEYS:
+        return api_error(f"Unknown sort, use one of: {', '.join(SORT_KEYS)}.")
+    limit = parse_limit(request.GET.get('limit'))
+    if limit is None:
+        return api_error("limit must be a number.")
+
+    products = Product.objects.all()
+    category_id = request.GET.get('category')
+    if category_id:
+        if not category_id.isdigit():
+            return api_error("category must be a category id.")
+        products = products.filter(category_id=category_id)
+    featured = request.GET.get('featured')
+    if featured:
+        products = products.filter(featured_option=featured)
+    if request.GET.get('in_stock') == '1':
+        products = products.filter(available_stock__gt=0)
+
+    return product_listing_response(products, sort_option, request.GET.get('cursor'), limit)
+
+
+
+@catalog_api
+def api_product_detail(request, product_id):
+    row = Product.objects.filter(id=product_id).values(*PRODUCT_DETAIL_FIELDS).first()
+    if row is None:
+        return api_error("Product not found.", status=404)
+    return JsonResponse(product_detail_data(row))
+
+
+
+@catalog_api
+def api_product_ratings(request, product_id):
+    row = Product.objects.filter(id=product_id).values(*(f'ratingsummary__{field}' for field in RATING_FIELDS)).first()
+    if row is None:
+        return api_error("Product not found.", status=404)
+    counts = {field: row[f'ratingsummary__{field}'] for field in RATING_FIELDS}
+    return JsonResponse({'product_id': product_id, **rating_data(counts)})
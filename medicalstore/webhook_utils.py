@@ -0,0 +1,150 @@
+import hashlib
+import hmac
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .checkout_utils import capture_order, clear_ordered_items, save_payment
+from .models import Order, WebhookEvent
+
+
+# Razorpay webhooks are the source of truth for payments. The endpoint only checks the
+# signature and stores the event (unique on Razorpay's event id, so a redelivery is a no-op),
+# then answers 200 at once. A celery task applies the event; events the task never got to
+# or that failed are picked up again by the process_webhook_events command.
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_BATCH_SIZE = 100
+
+
+
+def verify_webhook_signature(body, signature):
+    """X-Razorpay-Signature is the HMAC-SHA256 of the raw body with the webhook secret."""
+    expected = hmac.new(settings.RAZORPAY_REFUND_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+
+def event_id_for(headers, body):
+    # Razorpay sends the id in a header only, hash the body if a proxy dropped it
+    return headers.get('X-Razorpay-Event-Id') or 'sha256:' + hashlib.sha256(body).hexdigest()
+
+
+
+def record_event(event_id, payload):
+    """Store the event once and queue it once committed. Returns (event, created)."""
+    event, created = WebhookEvent.objects.get_or_create(
+        event_id=event_id, defaults={'event': str(payload.get('event', ''))[:50], 'payload': payload},
+    )
+    if created:
+        transaction.on_commit(lambda: queue_event(event.pk))
+    return event, created
+
+
+
+def queue_event(event_pk):
+    from .task import process_webhook_event_task
+    try:
+        process_webhook_event_task.delay(event_pk)
+    except Exception:
+        # the broker is down: the event stays "received" for the sweep
+        logger.exception("Could not queue webhook event %s", event_pk)
+
+
+
+def _entity(payload, name):
+    return ((payload.get('payload') or {}).get(name) or {}).get('entity') or {}
+
+
+
+def _order_for(payment):
+    if not payment.get('id') or not payment.get('order_id'):
+        return None
+    return Order.objects.filter(razorpay_order_id=payment['order_id']).first()
+
+
+
+def payment_captured(payload):
+    """payment.captured and order.paid: the money is in, the order is paid."""
+    payment = _entity(payload, 'payment')
+    order = _order_for(payment)
+    if order is None or payment.get('status') != 'captured':
+        return False
+    save_payment(order, payment)
+    if capture_order(order):
+        clear_ordered_items(order)
+    return True
+
+
+
+def payment_failed(payload):
+    """
+    Only the attempt is stored: the customer may retry on the same order in the checkout
+    popup, so its stock stays held. The hold expiry sweep or reconcile_payments (after
+    its grace period) releases the order if no retry succeeds.
+    """
+    payment = _entity(payload, 'payment')
+    order = _order_for(payment)
+    if order is None:
+        return False
+    save_payment(order, payment)
+    return True
+
+
+
+def refund_changed(payload):
+    """refund.*: the event carries the payment as it is after the refund."""
+    payment = _entity(payload, 'payment')
+    order = _order_for(payment)
+    if order is None:
+        return False
+    return save_payment(order, payment) is not None
+
+
+
+EVENT_HANDLERS = {
+    'payment.captured': payment_captured,
+    'order.paid': payment_captured,
+    'payment.failed': payment_failed,
+    'refund.created': refund_changed,
+    'refund.processed': refund_changed,
+    'refund.failed': refund_changed,
+}
+
+
+
+def process_event(event_pk):
+    """
+    Apply a stored event. The row is locked for the duration, so a task and the sweep
+    never apply the same event twice. Returns the new status, or None when the event
+    was already done.
+    """
+    with transaction.atomic():
+        event = WebhookEvent.objects.select_for_update().filter(pk=event_pk, status__in=("received", "failed")).first()
+        if event is None:
+            return None
+        handler = EVENT_HANDLERS.get(event.event)
+        event.attempts += 1
+        event.error = None
+        try:
+            with transaction.atomic():
+                handled = handler(event.payload) if handler else False
+            event.status = "processed" if handled else "ignored"
+        except Exception as error:
+            logger.exception("Webhook event %s failed", event.event_id)
+            event.status, event.error = "failed", repr(error)
+        event.processed_at = timezone.now()
+        event.save(update_fields=['status', 'attempts', 'error', 'processed_at'])
+    return event.status
+
+
+
+def pending_events(max_attempts=WEBHOOK_MAX_ATTEMPTS, older_than=60):
+    """Events no task applied within older_than seconds, and failed ones worth another try."""
+    return WebhookEvent.objects.filter(
+        status__in=("received", "failed"), attempts__lt=max_attempts,
+        created_at__lte=timezone.now() - timedelta(seconds=older_than),
+    ).order_by('created_at')